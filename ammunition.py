@@ -1,12 +1,19 @@
 """Class description of a ground vehicle armament ammunition from WarThunder
 """
 
+from modes import ModeField, PenetrationDistance, RicochetChance, SlottedModel
 from typing import Dict
 
 
-class Ammunition():
+class Ammunition(SlottedModel):
     """Class that represents a firable round from WarThunder
     """
+    __slots__ = (
+        "name", "ammo_type", "_pen_at_distance", "_ricochet", "velocity", "explosive_mass", "projectile_mass", "fuse_delay",
+        "fuse_sensitivity", "range"
+    )
+    pen_at_distance = ModeField(PenetrationDistance, -1)
+    ricochet = ModeField(RicochetChance, -1)
 
     def __init__(self, name: str, ammo_type: str, pen_at_distance: Dict[int, int]) -> None:
         """_summary_
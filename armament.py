@@ -3,6 +3,7 @@
 
 from enum import Enum
 from ammunition import Ammunition
+from modes import RELOAD_SKILLS, CrewSkill, Guidance, ModeField, SlottedModel
 from typing import List, Dict
 
 class Stabilizer(Enum):
@@ -14,9 +15,17 @@ class Stabilizer(Enum):
     TWOPLANE = 4
 
 
-class Armament():
+class Armament(SlottedModel):
     """Class that represents a WarThunder Ground Vehicle Armament (Waepon)
     """
+    __slots__ = (
+        "name", "ammo_types", "_vertical_guidance", "_reload_time", "_rotation_speed_arcade", "_rotation_speed_realistic", "diameter",
+        "fire_rate", "fire_while_moving", "first_stowage", "capacity", "belt_capacity", "stabilizer", "autoloader"
+    )
+    vertical_guidance = ModeField(Guidance, 0)
+    reload_time = ModeField(RELOAD_SKILLS, 0.0)
+    rotation_speed_arcade = ModeField(CrewSkill, 0.0)
+    rotation_speed_realistic = ModeField(CrewSkill, 0.0)
 
     def __init__(self, name: str) -> None:
         """ init
@@ -0,0 +1,113 @@
+"""Checks that every HTML backend parses the stored pages into identical vehicles
+
+python backend_parity.py [--store page_store] [page.html ...]
+
+Exits with 1 if any backend disagrees with html.parser, so a faster backend can be switched on safely.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+from typing import Dict, List
+
+from html_backend import HTML_PARSER, available_backends
+from page_store import DEFAULT_STORE_DIR, PageStore
+from serialization import tank_to_dict
+from terrain import TerrainType
+from wt_wiki_ground_parser import parse_ground_vehicle
+
+
+def parse_with(content: str, backend: str) -> str:
+    """parses a page with a specific backend
+
+    Parameters
+    ----------
+    content : str
+        html of the vehicles wiki page
+    backend : str
+        the HTML backend
+
+    Returns
+    -------
+    str
+        the parsed vehicle as canonical JSON, or the error it raised
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()): # the parser still prints its warnings
+            tank = parse_ground_vehicle(response_content=content, backend=backend)
+        return json.dumps(tank_to_dict(tank), sort_keys=True)
+    except Exception as excp:
+        return f"error: {excp!r}"
+
+
+def load_stored_pages(store_root: str = DEFAULT_STORE_DIR) -> Dict[str, str]:
+    """reads every stored ground vehicle page
+
+    Parameters
+    ----------
+    store_root : str, optional
+        directory of the page store
+
+    Returns
+    -------
+    Dict[str, str]
+        vehicle name -> html
+    """
+    store = PageStore(root=store_root)
+    try:
+        return {vehicle: store.get(vehicle) for vehicle in store.vehicles(terrain=TerrainType.GROUND)}
+    finally:
+        store.close()
+
+
+def check_parity(pages: Dict[str, str], backends: List[str]) -> List[str]:
+    """compares the parsed vehicles of every backend against html.parser
+
+    Parameters
+    ----------
+    pages : Dict[str, str]
+        vehicle name -> html
+    backends : List[str]
+        the backends to compare
+
+    Returns
+    -------
+    List[str]
+        one message per mismatch
+    """
+    mismatches = []
+    for vehicle, content in pages.items():
+        reference = parse_with(content=content, backend=HTML_PARSER)
+        for backend in backends:
+            if backend != HTML_PARSER and parse_with(content=content, backend=backend) != reference:
+                mismatches.append(f"{vehicle}: {backend} differs from {HTML_PARSER}")
+    return mismatches
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Checks that every HTML backend parses the stored pages into identical vehicles")
+    parser.add_argument("pages", nargs="*", help="html files to parse, defaults to every stored ground vehicle")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    args = parser.parse_args()
+
+    pages: Dict[str, str] = {}
+    if args.pages:
+        for filename in args.pages:
+            with open(filename, "r", encoding="utf-8") as page:
+                pages[filename] = page.read()
+    else:
+        pages = load_stored_pages(store_root=args.store)
+
+    backends = available_backends()
+    mismatches = check_parity(pages=pages, backends=backends)
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"Compared {len(pages)} pages across {', '.join(backends)}: {len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    __main__()
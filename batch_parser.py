@@ -0,0 +1,152 @@
+"""Parses the stored ground vehicle pages in parallel
+
+BeautifulSoup parsing is CPU-bound, so the vehicles are split into chunks and fanned out over a process pool.
+Results are streamed back in the order the chunks complete and a vehicle that fails to parse is reported
+instead of aborting the whole batch.
+"""
+
+import argparse
+import math
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from html_backend import available_backends, get_backend, set_backend
+from metrics import PROFILERS, configure_logging, get_metrics, get_profiling, set_profiling
+from page_store import DEFAULT_STORE_DIR, PageStore
+from tanks import Tank
+from terrain import TerrainType
+from text_normalization import get_normalization_table, load_normalization_table, set_normalization_table
+from wt_wiki_ground_parser import parse_ground_vehicle
+
+CHUNKS_PER_WORKER = 4 # more chunks than workers keeps every worker busy until the very end
+
+
+class BatchResult(NamedTuple):
+    """Outcome of parsing a single vehicle
+    """
+    vehicle: str
+    tank: Optional[Tank]
+    error: Optional[str] # formatted traceback if the parsing failed
+
+
+_WORKER_STORE: Optional[PageStore] = None
+
+def _init_worker(store_root: str, backend: str, profiling: Tuple[Optional[str], str], normalization: Optional[Dict[str, str]]) -> None:
+    """opens the page store and selects the HTML backend and the normalization table once per worker process
+
+    Parameters
+    ----------
+    store_root : str
+        directory of the page store
+    backend : str
+        the HTML backend used for parsing
+    profiling : Tuple[Optional[str], str]
+        the profiling settings of the parent, see metrics.get_profiling
+    normalization : Optional[Dict[str, str]]
+        the normalization table of the parent, see text_normalization.get_normalization_table
+    """
+    global _WORKER_STORE
+    _WORKER_STORE = PageStore(root=store_root)
+    set_backend(backend)
+    set_profiling(*profiling)
+    set_normalization_table(normalization)
+
+
+def _parse_chunk(vehicles: List[str]) -> Tuple[List[BatchResult], Dict[str, Any]]:
+    """parses a chunk of vehicles inside a worker process
+
+    Parameters
+    ----------
+    vehicles : List[str]
+        names of the vehicles to parse
+
+    Returns
+    -------
+    Tuple[List[BatchResult], Dict[str, Any]]
+        one result per vehicle and the metrics collected while parsing them
+    """
+    results = []
+    for vehicle in vehicles:
+        try:
+            content = _WORKER_STORE.get(vehicle)
+            if content is None:
+                raise KeyError(f"{vehicle} is not stored")
+            results.append(BatchResult(vehicle=vehicle, tank=parse_ground_vehicle(response_content=content), error=None))
+        except Exception:
+            results.append(BatchResult(vehicle=vehicle, tank=None, error=traceback.format_exc()))
+    return results, get_metrics().drain()
+
+
+def parse_batch(vehicles: Sequence[str], store_root: str = DEFAULT_STORE_DIR, workers: Optional[int] = None,
+                chunk_size: Optional[int] = None, backend: Optional[str] = None) -> Iterator[BatchResult]:
+    """parses many stored ground vehicles using a process pool
+
+    Parameters
+    ----------
+    vehicles : Sequence[str]
+        names of the vehicles to parse
+    store_root : str, optional
+        directory of the page store
+    workers : Optional[int], optional
+        amount of worker processes, defaults to the amount of CPUs
+    chunk_size : Optional[int], optional
+        amount of vehicles handed to a worker at once, by default the vehicles are split into CHUNKS_PER_WORKER chunks per worker
+    backend : Optional[str], optional
+        the HTML backend used for parsing, defaults to the process-wide one
+
+    Yields
+    ------
+    Iterator[BatchResult]
+        the results in the order of completion
+    """
+    if not vehicles:
+        return
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, math.ceil(len(vehicles) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [list(vehicles[start:start + chunk_size]) for start in range(0, len(vehicles), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker, initargs=(store_root, backend or get_backend(), get_profiling(), get_normalization_table())) as executor:
+        for future in as_completed([executor.submit(_parse_chunk, chunk) for chunk in chunks]):
+            results, worker_metrics = future.result()
+            get_metrics().merge(worker_metrics)
+            yield from results
+
+
+def __main__():
+    """parses every stored (or the given) ground vehicle and reports the failures
+    """
+    parser = argparse.ArgumentParser(description="Parses the stored ground vehicle pages in parallel")
+    parser.add_argument("vehicles", nargs="*", help="vehicles to parse, defaults to every stored ground vehicle")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--workers", type=int, help="amount of worker processes, defaults to the amount of CPUs")
+    parser.add_argument("--chunk-size", type=int, help="amount of vehicles handed to a worker at once")
+    parser.add_argument("--html-backend", choices=available_backends(), default=get_backend(), help="HTML parser used for the pages")
+    parser.add_argument("--normalize", metavar="TABLE", help="apply the normalization table written by unicode_checker.py --table")
+    parser.add_argument("--log-level", default="WARNING", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--metrics", metavar="FILE", help="export the parse timings and warnings, *.prom as Prometheus text, else JSON")
+    parser.add_argument("--profile", metavar="DIRECTORY", help="write a profile per vehicle into DIRECTORY")
+    parser.add_argument("--profiler", choices=PROFILERS, default=PROFILERS[0], help="profiler used by --profile")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    if args.profile:
+        set_profiling(args.profile, args.profiler)
+    if args.normalize:
+        set_normalization_table(load_normalization_table(args.normalize))
+
+    vehicles = args.vehicles or PageStore(root=args.store).vehicles(terrain=TerrainType.GROUND)
+    failures: List[BatchResult] = []
+    for result in parse_batch(vehicles=vehicles, store_root=args.store, workers=args.workers, chunk_size=args.chunk_size,
+                              backend=args.html_backend):
+        if result.error:
+            failures.append(result)
+        else:
+            print(result.tank.__str__())
+    for failure in failures:
+        print(f"\n\nParsing failed: {failure.vehicle}\n{failure.error}")
+    print(f"Parsed {len(vehicles) - len(failures)}/{len(vehicles)} vehicles")
+    if args.metrics:
+        get_metrics().export(args.metrics)
+
+if __name__ == "__main__":
+    __main__()
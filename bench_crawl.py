@@ -0,0 +1,151 @@
+"""Load test of the whole crawl against a local fixture wiki
+
+python bench_crawl.py [--vehicles 10000] [--store page_store] [--concurrency 16] [--latency 0.02] [--error-rate 0.01]
+python bench_crawl.py --url http://127.0.0.1:8090            # crawls an already running fixture_wiki instead
+
+Starts a fixture_wiki built from the stored pages, points scrape_wt_wiki.BASE_URL at it and runs the crawl pipeline
+from the tech tree pages down to the page storage (into a temporary page store, without the revalidation cache).
+Reports the end-to-end throughput in pages/s and bytes/s and the p50/p99 request latency, the latter estimated from
+the buckets of the http_request histogram.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import NamedTuple, Optional
+
+import scrape_wt_wiki
+from crawl_pipeline import run_crawl
+from fetch_policy import FetchPolicy
+from fetcher import DEFAULT_CONCURRENCY, configure_fetcher
+from fixture_wiki import DEFAULT_NATIONS, DEFAULT_VEHICLES, FixtureWiki, SyntheticWiki
+from metrics import configure_logging, get_logger, get_metrics
+from page_store import DEFAULT_STORE_DIR, PageStore, open_page_store
+from terrain import TerrainType
+
+logger = get_logger(__name__)
+
+
+class LoadTestResult(NamedTuple):
+    """Throughput and latency of a crawl
+    """
+    pages: int # stored pages
+    requests: int
+    errors: int # vehicles that failed after every retry
+    seconds: float
+    received: int # bytes
+    p50: Optional[float] # seconds per request
+    p99: Optional[float]
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.received / self.seconds if self.seconds else 0.0
+
+
+def run_load_test(base_url: str, concurrency: int = DEFAULT_CONCURRENCY, rate_limit: float = 0.0,
+                  policy: Optional[FetchPolicy] = None) -> LoadTestResult:
+    """crawls a wiki into a temporary page store and measures it
+
+    Parameters
+    ----------
+    base_url : str
+        the wiki to crawl, e.g. FixtureWiki.url
+    concurrency : int, optional
+        maximum amount of requests in flight
+    rate_limit : float, optional
+        requests per second of the fetcher, 0 disables the limit
+    policy : Optional[FetchPolicy], optional
+        timeouts and retries of the fetcher
+
+    Returns
+    -------
+    LoadTestResult
+        the measured crawl
+    """
+    scrape_wt_wiki.BASE_URL = base_url.rstrip("/")
+    fetcher = configure_fetcher(concurrency=concurrency, rate_limit=rate_limit, policy=policy)
+    metrics = get_metrics()
+    metrics.drain() # only this crawl counts
+    with tempfile.TemporaryDirectory(prefix="bench_crawl_") as store_dir:
+        store = open_page_store(store_dir)
+        start = time.perf_counter()
+        try:
+            stats = run_crawl(terrains=list(TerrainType))
+        finally:
+            seconds = time.perf_counter() - start
+            fetcher.close()
+            store.close()
+    counters = metrics.snapshot()["counters"]
+    return LoadTestResult(
+        pages=stats.stored,
+        requests=int(sum(value for name, _, value in counters if name == "http_requests")),
+        errors=len(stats.errors),
+        seconds=seconds,
+        received=int(sum(value for name, _, value in counters if name == "http_bytes")),
+        p50=metrics.quantile("http_request", 0.5),
+        p99=metrics.quantile("http_request", 0.99),
+    )
+
+
+def print_result(result: LoadTestResult) -> None:
+    """prints the result as a short table
+
+    Parameters
+    ----------
+    result : LoadTestResult
+        the measured crawl
+    """
+    milliseconds = lambda seconds: f"{seconds * 1000:.1f}ms" if seconds is not None else "-"
+    print(f"Stored {result.pages} pages with {result.requests} requests and {result.errors} errors in {result.seconds:.1f}s")
+    print(f"{'pages/s':<12}{result.pages_per_second:>12.1f}")
+    print(f"{'MiB/s':<12}{result.bytes_per_second / 2 ** 20:>12.2f}")
+    print(f"{'p50':<12}{milliseconds(result.p50):>12}")
+    print(f"{'p99':<12}{milliseconds(result.p99):>12}")
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Measures the crawl throughput against a local synthetic wiki")
+    parser.add_argument("--url", help="crawl this (fixture) wiki instead of starting one")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store holding the template pages")
+    parser.add_argument("--vehicles", type=int, default=DEFAULT_VEHICLES, help="amount of synthetic vehicles")
+    parser.add_argument("--nations", type=int, default=DEFAULT_NATIONS, help="amount of nations per terrain")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds the fixture adds to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests the fixture answers with 503")
+    parser.add_argument("--server-rate-limit", type=float, default=0.0, help="requests per second before the fixture answers with 429")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the injected latency and errors")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="maximum amount of requests in flight")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second of the crawler, 0 disables the limit")
+    parser.add_argument("--json", metavar="FILE", help="also write the result as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    fixture = None
+    base_url = args.url
+    if base_url is None:
+        store = PageStore(root=args.store) if os.path.isdir(args.store) else None
+        wiki = SyntheticWiki(store=store, vehicles=args.vehicles, nations=args.nations)
+        fixture = FixtureWiki(wiki=wiki, latency=args.latency, error_rate=args.error_rate, rate_limit=args.server_rate_limit, seed=args.seed)
+        base_url = fixture.start()
+        logger.info("serving %d vehicles at %s", len(wiki.vehicles), base_url)
+    try:
+        result = run_load_test(base_url=base_url, concurrency=args.concurrency, rate_limit=args.rate_limit)
+    finally:
+        if fixture is not None:
+            fixture.stop()
+    print_result(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump({**result._asdict(), "pages_per_second": result.pages_per_second, "bytes_per_second": result.bytes_per_second},
+                      json_file, indent=2)
+
+if __name__ == "__main__":
+    __main__()
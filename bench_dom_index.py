@@ -0,0 +1,77 @@
+"""Benchmarks the per-page parse time of parse_ground_vehicle with and without the single-pass class index
+
+python bench_dom_index.py [--store page_store] [--repeat 5] [page.html ...]
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import time
+from typing import Dict, List
+
+from page_store import DEFAULT_STORE_DIR, PageStore
+from terrain import TerrainType
+from wt_wiki_ground_parser import parse_ground_vehicle
+
+
+def time_pages(pages: Dict[str, str], index_dom: bool, repeat: int) -> List[float]:
+    """parses every page repeat times
+
+    Parameters
+    ----------
+    pages : Dict[str, str]
+        vehicle name -> html
+    index_dom : bool
+        passed on to parse_ground_vehicle
+    repeat : int
+        amount of runs per page
+
+    Returns
+    -------
+    List[float]
+        the best run of every page in seconds
+    """
+    timings = []
+    for content in pages.values():
+        runs = []
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()): # the parser still prints its warnings
+                start = time.perf_counter()
+                parse_ground_vehicle(response_content=content, index_dom=index_dom)
+                runs.append(time.perf_counter() - start)
+        timings.append(min(runs))
+    return timings
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks parse_ground_vehicle with and without the class index")
+    parser.add_argument("pages", nargs="*", help="html files to parse, defaults to every stored ground vehicle")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per page, the fastest one counts")
+    args = parser.parse_args()
+
+    pages: Dict[str, str] = {}
+    if args.pages:
+        for filename in args.pages:
+            with open(filename, "r", encoding="utf-8") as page:
+                pages[filename] = page.read()
+    else:
+        store = PageStore(root=args.store)
+        pages = {vehicle: store.get(vehicle) for vehicle in store.vehicles(terrain=TerrainType.GROUND)}
+    if not pages:
+        print("Nothing to benchmark, store some ground vehicles first")
+        return
+
+    before = time_pages(pages=pages, index_dom=False, repeat=args.repeat)
+    after = time_pages(pages=pages, index_dom=True, repeat=args.repeat)
+    print(f"{len(pages)} pages, best of {args.repeat} runs each")
+    print(f"{'':<22}{'mean':>10}{'median':>10}{'max':>10}")
+    for label, timings in (("before (tree scans)", before), ("after (class index)", after)):
+        print(f"{label:<22}{statistics.mean(timings) * 1000:>8.2f}ms{statistics.median(timings) * 1000:>8.2f}ms{max(timings) * 1000:>8.2f}ms")
+    print(f"speedup: {sum(before) / sum(after):.2f}x")
+
+if __name__ == "__main__":
+    __main__()
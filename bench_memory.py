@@ -0,0 +1,53 @@
+"""Measures how much memory the parsed vehicle catalog takes
+
+python bench_memory.py [--store page_store] [--copies 1] [--workers N]
+
+Parses every stored ground vehicle (through the batch parser), keeps all of them alive like a query service would
+and reports the traced allocations per vehicle, armament and round.
+"""
+
+import argparse
+import gc
+import tracemalloc
+from typing import List
+
+from batch_parser import parse_batch
+from page_store import DEFAULT_STORE_DIR, PageStore
+from tanks import Tank
+from terrain import TerrainType
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Measures how much memory the parsed vehicle catalog takes")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--copies", type=int, default=1, help="load the catalog this many times to simulate a larger one")
+    parser.add_argument("--workers", type=int, help="amount of parser processes, defaults to the amount of CPUs")
+    args = parser.parse_args()
+
+    vehicles = PageStore(root=args.store).vehicles(terrain=TerrainType.GROUND) * args.copies
+    if not vehicles:
+        print("Nothing to measure, store some ground vehicles first")
+        return
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    catalog: List[Tank] = [] # the parsed vehicles are unpickled here, so all their allocations are traced
+    for result in parse_batch(vehicles=vehicles, store_root=args.store, workers=args.workers):
+        if result.tank is not None:
+            catalog.append(result.tank)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    armaments = sum(len(tank.armaments) for tank in catalog)
+    rounds = sum(len(armament.ammo_types) for tank in catalog for armament in tank.armaments)
+    print(f"{len(catalog)} vehicles, {armaments} armaments, {rounds} rounds")
+    print(f"total: {used / 1024:.1f} KiB")
+    if catalog:
+        print(f"per vehicle (incl. armaments and rounds): {used / len(catalog):.0f} bytes")
+
+if __name__ == "__main__":
+    __main__()
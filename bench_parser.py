@@ -0,0 +1,416 @@
+"""Benchmarks the ground parser per sub-parser over a fixed corpus and guards its output
+
+python bench_parser.py [--corpus bench_corpus] [--repeat 5] [--tolerance 0.2]
+python bench_parser.py --export [--store page_store] [vehicle ...]   # (re)creates the corpus from the page store
+python bench_parser.py --update-baseline                            # accepts the current timings
+python bench_parser.py --update-golden                              # accepts the current parsed values
+
+The corpus directory holds
+
+pages/<vehicle>.html   : the pages, file names as encoded by filename_encoding
+golden/<vehicle>.json  : tank_to_dict of every page, the parsed values have to stay exactly the same
+names.json             : vehicle of every file name filename_encoding had to shorten
+baseline.json          : latency percentiles of the accepted state
+
+Every page is parsed repeat times. The fastest run of each function per page is reported as p50/p90/p99/max
+over all pages. The run fails (exit code 1) if a parsed vehicle differs from its golden JSON or a percentile
+got slower than the baseline by more than the tolerance. The baseline is scaled by a fixed calibration workload
+timed in the same run, so a busier or slower machine doesn't fail the check on its own.
+The golden check also runs with the tests, see tests/test_bench_parser.py.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from filename_encoding import decode_name, encode_name, is_shortened
+from metrics import configure_logging, get_logger
+from page_store import DEFAULT_STORE_DIR, PageStore
+from serialization import tank_to_dict
+from tanks import Tank
+from terrain import TerrainType
+from wt_wiki_ground_parser import SUB_PARSERS, index_ground_page, parse_ground_vehicle
+
+DEFAULT_CORPUS_DIR = "bench_corpus"
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.2
+NOISE_FLOOR = 0.05 # ms, differences below this are timer noise
+PERCENTILES = (50, 90, 99)
+TOTAL = "total"
+INDEX = "index_ground_page"
+CALIBRATION = "calibration"
+CALIBRATION_PAGE = "<div class=\"mw-parser-output\">" + "<table class=\"wikitable\"><tr><th>a</th><td>1</td></tr></table>" * 200 + "</div>"
+
+logger = get_logger(__name__)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """nearest-rank percentile
+
+    Parameters
+    ----------
+    values : List[float]
+        the samples
+    q : float
+        percentile between 0 and 100
+
+    Returns
+    -------
+    float
+        the smallest sample with at least q percent of the samples at or below it
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, str]:
+    """reads the pages of the corpus
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+
+    Returns
+    -------
+    Dict[str, str]
+        vehicle -> html, sorted by vehicle
+    """
+    pages_dir = os.path.join(corpus_dir, "pages")
+    names = load_names(corpus_dir)
+    pages = {}
+    for filename in sorted(os.listdir(pages_dir)) if os.path.isdir(pages_dir) else []:
+        if filename.endswith(".html"):
+            stem = filename[:-len(".html")]
+            if is_shortened(stem) and stem not in names:
+                logger.error("%s is missing in names.json", filename)
+                continue
+            with open(os.path.join(pages_dir, filename), "r", encoding="utf-8") as page:
+                pages[names[stem] if is_shortened(stem) else decode_name(stem)] = page.read()
+    return pages
+
+
+def load_names(corpus_dir: str) -> Dict[str, str]:
+    """reads the vehicles of the shortened file names
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+
+    Returns
+    -------
+    Dict[str, str]
+        shortened file name (without suffix) -> vehicle
+    """
+    try:
+        with open(os.path.join(corpus_dir, "names.json"), "r", encoding="utf-8") as names_file:
+            return json.load(names_file)
+    except FileNotFoundError:
+        return {}
+
+
+def golden_filename(corpus_dir: str, vehicle: str) -> str:
+    """builds the path of a vehicles golden JSON
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+    vehicle : str
+        name of the vehicle
+
+    Returns
+    -------
+    str
+        path of the JSON file
+    """
+    return os.path.join(corpus_dir, "golden", f"{encode_name(vehicle)}.json")
+
+
+def write_golden(corpus_dir: str, vehicle: str, content: str) -> None:
+    """parses a page and stores the result as its golden JSON
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+    vehicle : str
+        name of the vehicle
+    content : str
+        html of the page
+    """
+    os.makedirs(os.path.join(corpus_dir, "golden"), exist_ok=True)
+    tank = parse_ground_vehicle(response_content=content)
+    with open(golden_filename(corpus_dir, vehicle), "w", encoding="utf-8", newline="\n") as golden:
+        json.dump(tank_to_dict(tank), golden, indent=2, sort_keys=True, ensure_ascii=False)
+        golden.write("\n")
+
+
+def export_corpus(corpus_dir: str, store_root: str, vehicles: Optional[List[str]] = None) -> int:
+    """copies stored ground vehicle pages into the corpus and writes their golden JSON
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+    store_root : str
+        directory of the page store
+    vehicles : Optional[List[str]], optional
+        the vehicles to export, None exports every stored ground vehicle
+
+    Returns
+    -------
+    int
+        amount of exported pages
+    """
+    store = PageStore(root=store_root)
+    os.makedirs(os.path.join(corpus_dir, "pages"), exist_ok=True)
+    names = load_names(corpus_dir)
+    exported = 0
+    for vehicle in vehicles or store.vehicles(terrain=TerrainType.GROUND):
+        content = store.get(vehicle)
+        if content is None:
+            logger.error("%s isn't stored", vehicle)
+            continue
+        try:
+            write_golden(corpus_dir=corpus_dir, vehicle=vehicle, content=content)
+        except Exception as error: # a page the parser can't handle yet has no golden output to guard
+            logger.error("%s failed to parse: %r", vehicle, error)
+            continue
+        filename = encode_name(vehicle)
+        with open(os.path.join(corpus_dir, "pages", f"{filename}.html"), "w", encoding="utf-8", newline="") as page:
+            page.write(content)
+        if is_shortened(filename):
+            names[filename] = vehicle
+        exported += 1
+    if names:
+        with open(os.path.join(corpus_dir, "names.json"), "w", encoding="utf-8", newline="\n") as names_file:
+            json.dump(names, names_file, indent=2, sort_keys=True, ensure_ascii=False)
+            names_file.write("\n")
+    return exported
+
+
+def time_page(content: str, repeat: int) -> Dict[str, float]:
+    """times the steps of parse_ground_vehicle on a single page
+
+    Parameters
+    ----------
+    content : str
+        html of the page
+    repeat : int
+        amount of runs, the fastest one counts
+
+    Returns
+    -------
+    Dict[str, float]
+        function name (and TOTAL) -> milliseconds
+    """
+    runs: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        index = index_ground_page(response_content=content) # rebuilt every run, the sub-parsers modify the tree
+        timings = {INDEX: time.perf_counter() - start}
+        tank = Tank(name=index.find("general_info_name").text.strip())
+        for sub_parser in SUB_PARSERS:
+            start = time.perf_counter()
+            sub_parser(tank=tank, index=index)
+            timings[sub_parser.__name__] = time.perf_counter() - start
+        timings[TOTAL] = sum(timings.values())
+        for name, seconds in timings.items():
+            runs.setdefault(name, []).append(seconds * 1000)
+    return {name: min(samples) for name, samples in runs.items()}
+
+
+def calibrate(repeat: int) -> float:
+    """times a fixed parsing workload to measure how fast the machine currently is
+
+    Parameters
+    ----------
+    repeat : int
+        amount of runs, the fastest one counts
+
+    Returns
+    -------
+    float
+        milliseconds
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        index_ground_page(response_content=CALIBRATION_PAGE).find_all("wikitable")
+        runs.append((time.perf_counter() - start) * 1000)
+    return min(runs)
+
+
+def summarize(page_timings: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """computes the latency percentiles of every function over all pages
+
+    Parameters
+    ----------
+    page_timings : Dict[str, Dict[str, float]]
+        vehicle -> function -> milliseconds
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        function -> {"p50": ..., "p90": ..., "p99": ..., "max": ...} in milliseconds
+    """
+    by_function: Dict[str, List[float]] = {}
+    for timings in page_timings.values():
+        for name, milliseconds in timings.items():
+            by_function.setdefault(name, []).append(milliseconds)
+    summary = {}
+    for name, samples in by_function.items():
+        summary[name] = {f"p{q}": percentile(samples, q) for q in PERCENTILES}
+        summary[name]["max"] = max(samples)
+    return summary
+
+
+def check_golden(corpus_dir: str, pages: Dict[str, str]) -> List[str]:
+    """compares the parsed vehicles with their golden JSON
+
+    Parameters
+    ----------
+    corpus_dir : str
+        the corpus directory
+    pages : Dict[str, str]
+        vehicle -> html
+
+    Returns
+    -------
+    List[str]
+        a description of every difference
+    """
+    failures = []
+    for vehicle, content in pages.items():
+        try:
+            with open(golden_filename(corpus_dir, vehicle), "r", encoding="utf-8") as golden:
+                expected = json.load(golden)
+        except FileNotFoundError:
+            failures.append(f"{vehicle}: no golden JSON, run with --update-golden")
+            continue
+        try:
+            parsed = json.loads(json.dumps(tank_to_dict(parse_ground_vehicle(response_content=content))))
+        except Exception as error:
+            failures.append(f"{vehicle}: parsing failed with {error!r}")
+            continue
+        for key in sorted(expected.keys() | parsed.keys()):
+            if expected.get(key) != parsed.get(key):
+                failures.append(f"{vehicle}: {key} is {parsed.get(key)!r}, expected {expected.get(key)!r}")
+    return failures
+
+
+def check_baseline(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """compares the percentiles with the baseline
+
+    Parameters
+    ----------
+    summary : Dict[str, Dict[str, float]]
+        see summarize
+    baseline : Dict[str, Dict[str, float]]
+        the accepted summary
+    tolerance : float
+        allowed slowdown, 0.2 accepts up to 20% slower
+
+    Returns
+    -------
+    List[str]
+        a description of every regression
+    """
+    regressions = []
+    # the accepted timings are scaled by how much faster or slower the machine is right now than back then
+    speed = summary[CALIBRATION]["p50"] / baseline[CALIBRATION]["p50"] if CALIBRATION in baseline else 1.0
+    for name, percentiles in summary.items():
+        if name == CALIBRATION:
+            continue
+        for key in (f"p{q}" for q in PERCENTILES[:2]): # p99 and max of a small corpus are single pages, too noisy
+            accepted = baseline.get(name, {}).get(key)
+            if accepted is None:
+                continue
+            accepted *= speed
+            current = percentiles[key]
+            if current > accepted * (1 + tolerance) and current - accepted > NOISE_FLOOR:
+                regressions.append(f"{name} {key}: {current:.2f}ms, baseline {accepted:.2f}ms (+{(current / accepted - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    """prints the percentiles as a table
+
+    Parameters
+    ----------
+    summary : Dict[str, Dict[str, float]]
+        see summarize
+    baseline : Dict[str, Dict[str, float]]
+        the accepted summary, its p50 is printed alongside
+    """
+    columns = [f"p{q}" for q in PERCENTILES] + ["max"]
+    print(f"{'':<40}" + "".join(f"{column:>10}" for column in columns) + f"{'base p50':>10}")
+    for name, percentiles in summary.items():
+        base = baseline.get(name, {}).get("p50")
+        print(f"{name:<40}" + "".join(f"{percentiles[column]:>8.2f}ms" for column in columns) + (f"{base:>8.2f}ms" if base is not None else f"{'-':>10}"))
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the ground parser per sub-parser and checks its output against golden JSON")
+    parser.add_argument("vehicles", nargs="*", help="vehicles to export with --export, defaults to every stored ground vehicle")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="directory of the corpus")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per page, the fastest one counts")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown against the baseline, 0.2 is 20%%")
+    parser.add_argument("--export", action="store_true", help="copy pages from the page store into the corpus and write their golden JSON")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store, used by --export")
+    parser.add_argument("--update-baseline", action="store_true", help="store the current timings as the new baseline")
+    parser.add_argument("--update-golden", action="store_true", help="store the current parsed values as the new golden JSON")
+    parser.add_argument("--log-level", default="ERROR", help="DEBUG, INFO, WARNING or ERROR, the parser warnings are hidden by default")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    if args.export:
+        print(f"Exported {export_corpus(corpus_dir=args.corpus, store_root=args.store, vehicles=args.vehicles)} pages into {args.corpus}")
+        return
+    pages = load_corpus(corpus_dir=args.corpus)
+    if not pages:
+        print(f"The corpus {args.corpus} is empty, create it with --export")
+        sys.exit(1)
+
+    if args.update_golden:
+        for vehicle, content in pages.items():
+            write_golden(corpus_dir=args.corpus, vehicle=vehicle, content=content)
+        print(f"Updated the golden JSON of {len(pages)} pages")
+    failures = check_golden(corpus_dir=args.corpus, pages=pages)
+
+    page_timings = {vehicle: time_page(content=content, repeat=args.repeat) for vehicle, content in pages.items()}
+    summary = summarize(page_timings)
+    calibration = calibrate(repeat=args.repeat * 10)
+    summary[CALIBRATION] = {key: calibration for key in [f"p{q}" for q in PERCENTILES] + ["max"]}
+    baseline_filename = os.path.join(args.corpus, "baseline.json")
+    baseline = {}
+    if os.path.exists(baseline_filename):
+        with open(baseline_filename, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    print(f"{len(pages)} pages, best of {args.repeat} runs each")
+    print_summary(summary=summary, baseline=baseline)
+    slowest = sorted(page_timings.items(), key=lambda item: item[1][TOTAL], reverse=True)[:5]
+    print("slowest pages: " + ", ".join(f"{vehicle} ({timings[TOTAL]:.2f}ms)" for vehicle, timings in slowest))
+
+    if args.update_baseline:
+        with open(baseline_filename, "w", encoding="utf-8", newline="\n") as baseline_file:
+            json.dump(summary, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Updated the baseline {baseline_filename}")
+    else:
+        failures += check_baseline(summary=summary, baseline=baseline, tolerance=args.tolerance)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,253 @@
+"""Flattens the parsed vehicles into columnar tables for vectorized analytics
+
+Three NumPy structured arrays are built, one row per vehicle, armament and round:
+
+vehicles   : id, name, nation, rank, battle_rating_arcade, ..., armour_hull_front, ..., engine_power_stock_realistic, ...
+armaments  : id, vehicle_id, name, capacity, reload_time_stock, ...
+ammunition : id, armament_id, vehicle_id, name, ammo_type, pen_at_distance_1000, ...
+
+Every id equals the row index, so joins are plain fancy indexing, e.g. the realistic BR of every round:
+
+    catalog.vehicles["battle_rating_realistic"][catalog.ammunition["vehicle_id"]]
+
+The per-mode groups of the models are expanded into one column per key, enums are stored by name and unset values
+become -1 (integers), NaN (floats) or "" (strings). The tables are written to a compressed .npz, or to Parquet files
+if pyarrow is installed.
+"""
+
+import argparse
+import math
+import os
+from enum import Enum
+from typing import Any, Dict, Iterable, List, NamedTuple, Type
+
+import numpy as np
+
+from ammunition import Ammunition
+from armament import Armament
+from modes import ModeField, SlottedModel
+from tanks import Tank
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+TABLES = ("vehicles", "armaments", "ammunition")
+
+
+class Catalog(NamedTuple):
+    """The columnar vehicle catalog
+    """
+    vehicles: np.ndarray
+    armaments: np.ndarray
+    ammunition: np.ndarray
+
+
+def _column_names(model: Type[SlottedModel]) -> Dict[str, List[str]]:
+    """lists the columns of a models fields, per-mode groups are expanded into one column per key
+
+    Parameters
+    ----------
+    model : Type[SlottedModel]
+        Tank, Armament or Ammunition
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        field name -> column names, nested models (armaments, ammo_types) are left out
+    """
+    columns = {}
+    for name in model.fields():
+        field = getattr(model, name, None)
+        if isinstance(field, ModeField):
+            columns[name] = [f"{name}_{key.value.lower().rstrip('%')}" for key in field.keys]
+        elif name not in ("armaments", "ammo_types"):
+            columns[name] = [name]
+    return columns
+
+
+def _flatten(obj: SlottedModel, columns: Dict[str, List[str]], row: Dict[str, List[Any]]) -> None:
+    """appends the values of a model object to the column lists
+
+    Parameters
+    ----------
+    obj : SlottedModel
+        the vehicle, armament or round
+    columns : Dict[str, List[str]]
+        see _column_names
+    row : Dict[str, List[Any]]
+        column name -> values so far
+    """
+    for name, column_names in columns.items():
+        value = getattr(obj, name, None) # slots that were never set are missing values
+        if len(column_names) > 1:
+            for column_name, item in zip(column_names, value.values_tuple()):
+                row[column_name].append(item)
+        else:
+            row[column_names[0]].append(value.name if isinstance(value, Enum) else value)
+
+
+def _to_array(column: List[Any]) -> np.ndarray:
+    """converts a column list into a typed array, filling in missing values
+
+    Parameters
+    ----------
+    column : List[Any]
+        the values of a single column
+
+    Returns
+    -------
+    np.ndarray
+        int64, float64, bool or unicode array
+    """
+    present = [value for value in column if value is not None]
+    if any(isinstance(value, str) for value in present):
+        return np.array(["" if value is None else value for value in column], dtype=str)
+    if any(isinstance(value, float) for value in present):
+        return np.array([math.nan if value is None else value for value in column], dtype=np.float64)
+    if present and all(isinstance(value, bool) for value in present) and len(present) == len(column):
+        return np.array(column, dtype=bool)
+    return np.array([-1 if value is None else value for value in column], dtype=np.int64)
+
+
+def _to_structured(row: Dict[str, List[Any]]) -> np.ndarray:
+    """combines the column lists into a structured array
+
+    Parameters
+    ----------
+    row : Dict[str, List[Any]]
+        column name -> values
+
+    Returns
+    -------
+    np.ndarray
+        the structured array, one record per object
+    """
+    arrays = [_to_array(column) for column in row.values()]
+    dtype = [(name, array.dtype) for name, array in zip(row.keys(), arrays)]
+    table = np.empty(len(arrays[0]) if arrays else 0, dtype=dtype)
+    for name, array in zip(row.keys(), arrays):
+        table[name] = array
+    return table
+
+
+def build_catalog(tanks: Iterable[Tank]) -> Catalog:
+    """flattens parsed vehicles into the three catalog tables
+
+    Parameters
+    ----------
+    tanks : Iterable[Tank]
+        the parsed ground vehicles
+
+    Returns
+    -------
+    Catalog
+        vehicles, armaments and ammunition with foreign keys between them
+    """
+    tank_columns = _column_names(Tank)
+    armament_columns = _column_names(Armament)
+    ammo_columns = _column_names(Ammunition)
+    vehicles: Dict[str, List[Any]] = {"id": []}
+    armaments: Dict[str, List[Any]] = {"id": [], "vehicle_id": []}
+    ammunition: Dict[str, List[Any]] = {"id": [], "armament_id": [], "vehicle_id": []}
+    for table, columns in ((vehicles, tank_columns), (armaments, armament_columns), (ammunition, ammo_columns)):
+        for column_names in columns.values():
+            for column_name in column_names:
+                table[column_name] = []
+
+    for tank in tanks:
+        vehicle_id = len(vehicles["id"])
+        vehicles["id"].append(vehicle_id)
+        _flatten(tank, tank_columns, vehicles)
+        for armament in tank.armaments:
+            armament_id = len(armaments["id"])
+            armaments["id"].append(armament_id)
+            armaments["vehicle_id"].append(vehicle_id)
+            _flatten(armament, armament_columns, armaments)
+            for ammo in armament.ammo_types:
+                ammunition["id"].append(len(ammunition["id"]))
+                ammunition["armament_id"].append(armament_id)
+                ammunition["vehicle_id"].append(vehicle_id)
+                _flatten(ammo, ammo_columns, ammunition)
+    return Catalog(vehicles=_to_structured(vehicles), armaments=_to_structured(armaments), ammunition=_to_structured(ammunition))
+
+
+def write_npz(catalog: Catalog, filename: str) -> None:
+    """writes the catalog into a single compressed .npz
+
+    Parameters
+    ----------
+    catalog : Catalog
+        the catalog to write
+    filename : str
+        path of the .npz
+    """
+    np.savez_compressed(filename, **catalog._asdict())
+
+
+def load_npz(filename: str) -> Catalog:
+    """loads a catalog written by write_npz
+
+    Parameters
+    ----------
+    filename : str
+        path of the .npz
+
+    Returns
+    -------
+    Catalog
+        the loaded catalog
+    """
+    with np.load(filename) as data:
+        return Catalog(**{table: data[table] for table in TABLES})
+
+
+def write_parquet(catalog: Catalog, directory: str) -> None:
+    """writes every catalog table as <directory>/<table>.parquet
+
+    Parameters
+    ----------
+    catalog : Catalog
+        the catalog to write
+    directory : str
+        target directory, created if missing
+
+    Raises
+    ------
+    ImportError
+        pyarrow isn't installed
+    """
+    if pyarrow is None:
+        raise ImportError("writing Parquet needs pyarrow, use write_npz instead")
+    os.makedirs(directory, exist_ok=True)
+    for table_name, table in catalog._asdict().items():
+        arrow_table = pyarrow.table({column: table[column] for column in table.dtype.names})
+        pyarrow.parquet.write_table(arrow_table, os.path.join(directory, f"{table_name}.parquet"))
+
+
+def __main__():
+    """builds the catalog of every stored ground vehicle
+    """
+    from batch_parser import parse_batch # pulls in the whole parser, only needed for the CLI
+    from page_store import DEFAULT_STORE_DIR, PageStore
+    from terrain import TerrainType
+
+    parser = argparse.ArgumentParser(description="Exports the parsed ground vehicles as columnar tables")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--npz", default="catalog.npz", help="path of the .npz to write")
+    parser.add_argument("--parquet", metavar="DIRECTORY", help="also write Parquet files into DIRECTORY (needs pyarrow)")
+    parser.add_argument("--workers", type=int, help="amount of parser processes, defaults to the amount of CPUs")
+    args = parser.parse_args()
+
+    vehicles = PageStore(root=args.store).vehicles(terrain=TerrainType.GROUND)
+    tanks = [result.tank for result in parse_batch(vehicles=vehicles, store_root=args.store, workers=args.workers) if result.tank]
+    catalog = build_catalog(tanks=sorted(tanks, key=lambda tank: tank.name))
+    write_npz(catalog=catalog, filename=args.npz)
+    if args.parquet:
+        write_parquet(catalog=catalog, directory=args.parquet)
+    print(f"Exported {len(catalog.vehicles)} vehicles, {len(catalog.armaments)} armaments and {len(catalog.ammunition)} rounds")
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,343 @@
+"""Keeps the page store and the vehicle database up to date using the wikis recent changes
+
+python changelog_updater.py [--checkpoint changelog_checkpoint.json] [--db vehicles.sqlite] [--changelog FILE] [--dry-run] [--lock FILE]
+
+Instead of re-crawling the whole wiki, only the changes since the last checkpoint are read. Changed titles that
+belong to stored vehicles are downloaded again, stored and (for ground vehicles) parsed into the database.
+Only the page sections that changed since the last parse are parsed again, see page_sections. Whether a ground
+vehicle needs parsing is decided by the section hashes in the database, not by the revalidation cache: a page the
+wiki answers as unchanged is read from the page store, since a crawl may have stored it without parsing it.
+The checkpoint only moves forward once every changed vehicle was processed, so a failed run is simply repeated.
+Each run reads the changes again from CHANGELOG_OVERLAP seconds before the checkpoint, so changes within the same
+second or showing up late aren't lost. The checkpoint keeps the revids of that overlap to skip what was processed;
+changes without a revid are processed twice, which the section hashes turn into a no-op.
+If the checkpoint is older than the wiki keeps its changes, every stored vehicle is updated instead.
+"""
+
+import argparse
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set
+
+from fetcher import configure_fetcher, get_fetcher
+from metrics import configure_logging, get_logger, get_metrics
+from page_store import get_page_store
+from response_cache import ResponseCache
+from scrape_wt_wiki import (CHANGELOG_TIME_FORMAT, ChangelogEntry, ChangelogGapError, changelog_start, get_vehicle_url, get_wiki_changelog,
+                            parse_changelog, store_or_forget, vehicle_from_title)
+from terrain import TerrainType
+
+DEFAULT_CHECKPOINT_FILE = "changelog_checkpoint.json"
+DEFAULT_LOCK_FILE = "wtscraper_update.lock" # shared with the update service, see cron_thang
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class UpdateStats():
+    """Counters of an update run
+    """
+    changes: int = 0
+    vehicles: int = 0
+    unchanged: int = 0
+    stored: int = 0
+    parsed: int = 0
+    partial: int = 0
+    irrelevant: int = 0
+    checkpoint: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+
+def load_checkpoint(filename: str = DEFAULT_CHECKPOINT_FILE) -> Optional[str]:
+    """reads the timestamp of the last processed change
+
+    Parameters
+    ----------
+    filename : str, optional
+        path of the checkpoint file
+
+    Returns
+    -------
+    Optional[str]
+        timestamp (YYYYMMDDHHMMSS, UTC), None if there was no update yet
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as checkpoint_file:
+            return json.load(checkpoint_file)["timestamp"]
+    except FileNotFoundError:
+        return None
+
+
+def load_processed(filename: str = DEFAULT_CHECKPOINT_FILE) -> Set[int]:
+    """reads the revids of the processed changes within CHANGELOG_OVERLAP seconds of the checkpoint
+
+    Parameters
+    ----------
+    filename : str, optional
+        path of the checkpoint file
+
+    Returns
+    -------
+    Set[int]
+        the revids, empty if there was no update yet
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as checkpoint_file:
+            return set(json.load(checkpoint_file).get("revids", []))
+    except FileNotFoundError:
+        return set()
+
+
+def save_checkpoint(timestamp: str, filename: str = DEFAULT_CHECKPOINT_FILE, revids: Iterable[int] = ()) -> None:
+    """writes the timestamp of the last processed change, atomically replacing the previous checkpoint
+
+    Parameters
+    ----------
+    timestamp : str
+        timestamp (YYYYMMDDHHMMSS, UTC)
+    filename : str, optional
+        path of the checkpoint file
+    revids : Iterable[int], optional
+        revids of the processed changes within CHANGELOG_OVERLAP seconds of the timestamp, see load_processed
+    """
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as checkpoint_file:
+        json.dump({"timestamp": timestamp, "revids": sorted(revids)}, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def unprocessed(entries: Iterable[ChangelogEntry], since: Optional[str], processed: Set[int]) -> List[ChangelogEntry]:
+    """filters the changes the last run didn't process
+
+    Parameters
+    ----------
+    entries : Iterable[ChangelogEntry]
+        the changes, see scrape_wt_wiki.parse_changelog
+    since : Optional[str]
+        timestamp of the checkpoint, None keeps every change
+    processed : Set[int]
+        revids of the processed changes of the overlap, see load_processed
+
+    Returns
+    -------
+    List[ChangelogEntry]
+        the changes from changelog_start(since) on, without the processed ones
+    """
+    start = changelog_start(since) if since is not None else None
+    return [entry for entry in entries if (start is None or entry.timestamp >= start) and entry.revid not in processed]
+
+
+def changed_vehicles(entries: Iterable[ChangelogEntry], stored: Iterable[str]) -> List[str]:
+    """maps changed pages to the stored vehicles
+
+    Parameters
+    ----------
+    entries : Iterable[ChangelogEntry]
+        the changes, see scrape_wt_wiki.parse_changelog
+    stored : Iterable[str]
+        names of the stored vehicles
+
+    Returns
+    -------
+    List[str]
+        every changed vehicle once, in the order of the changelog
+    """
+    stored = set(stored)
+    vehicles = {}
+    for entry in entries:
+        vehicle = vehicle_from_title(entry.title)
+        if vehicle in stored:
+            vehicles[vehicle] = None
+    return list(vehicles)
+
+
+def full_refresh_entries() -> List[ChangelogEntry]:
+    """lists every stored vehicle as changed right now, for when the changes since the checkpoint aren't known
+
+    Returns
+    -------
+    List[ChangelogEntry]
+        a change per stored vehicle, the checkpoint moves to the start of the refresh
+    """
+    now = datetime.now(timezone.utc).strftime(CHANGELOG_TIME_FORMAT)
+    return [ChangelogEntry(title=vehicle, timestamp=now) for vehicle in get_page_store().vehicles()]
+
+
+def forget(vehicle_url: str) -> None:
+    """drops a page from the revalidation cache, so the next run downloads it again
+
+    Parameters
+    ----------
+    vehicle_url : str
+        URL of the vehicles wiki page
+    """
+    if get_fetcher().cache is not None:
+        get_fetcher().cache.forget(vehicle_url)
+
+
+def apply_changes(entries: List[ChangelogEntry], database=None, checkpoint_file: str = DEFAULT_CHECKPOINT_FILE, dry_run: bool = False) -> UpdateStats:
+    """downloads, stores and parses the vehicles affected by the changes, then moves the checkpoint forward
+
+    Parameters
+    ----------
+    entries : List[ChangelogEntry]
+        the changes read from changelog_start(checkpoint) on, the ones processed by the last run are skipped
+    database : Optional[VehicleDB], optional
+        receives the parsed ground vehicles, None only refreshes the page store
+    checkpoint_file : str, optional
+        path of the checkpoint file
+    dry_run : bool, optional
+        only determine the changed vehicles
+
+    Returns
+    -------
+    UpdateStats
+        what was done
+    """
+    since = load_checkpoint(filename=checkpoint_file)
+    changes = unprocessed(entries=entries, since=since, processed=load_processed(filename=checkpoint_file))
+    stats = UpdateStats(changes=len(changes), checkpoint=since)
+    vehicles = changed_vehicles(entries=changes, stored=get_page_store().vehicles())
+    stats.vehicles = len(vehicles)
+    if dry_run:
+        return stats
+
+    from page_sections import GROUPS, reparse_vehicle # pulls in the whole parser, not needed for dry runs
+    vehicle_by_url = {get_vehicle_url(vehicle): vehicle for vehicle in vehicles}
+    tanks = []
+    sections = []
+    renamed = []
+    parsed_urls = []
+    for vehicle_url, content, error in get_fetcher().fetch_all(vehicle_by_url, if_changed=True):
+        vehicle = vehicle_by_url[vehicle_url]
+        if error is not None: # the other vehicles are processed anyway, the next run retries from the same checkpoint
+            stats.errors.append(f"{vehicle}: download failed: {error!r}")
+            continue
+        downloaded = content is not None
+        try:
+            if not downloaded:
+                get_page_store().touch(vehicle)
+                stats.unchanged += 1
+            else:
+                store_or_forget(vehicle_url=vehicle_url, vehicle=vehicle, content=content)
+                stats.stored += 1
+            entry = get_page_store().lookup(vehicle)
+            if database is None or entry is None or entry.terrain != TerrainType.GROUND:
+                continue
+            if not downloaded: # the section hashes tell if the stored page made it into the database yet
+                content = get_page_store().get(vehicle)
+                if content is None:
+                    continue
+            known = database.get_ground_sections(vehicle)
+            stored = database.load_ground_vehicle(known[0]) if known else None
+            tank, hashes, groups = reparse_vehicle(content=content, stored=stored, old_hashes=known[1] if known else None)
+            if not groups:
+                stats.irrelevant += downloaded # nothing the parser reads changed
+                continue
+            stats.parsed += 1
+            stats.partial += len(groups) < len(GROUPS)
+            if stored is not None and stored.name != tank.name:
+                renamed.append(stored.name)
+            tanks.append(tank)
+            sections.append((vehicle, tank.name, hashes))
+            parsed_urls.append(vehicle_url)
+        except Exception as error:
+            stats.errors.append(f"{vehicle}: {error!r}")
+            forget(vehicle_url)
+    try:
+        if renamed:
+            database.delete_ground_vehicles(renamed)
+        if tanks:
+            database.upsert_ground_vehicles(tanks)
+            database.set_ground_sections(sections)
+    except Exception as error:
+        stats.errors.append(f"database update failed: {error!r}")
+        for vehicle_url in parsed_urls:
+            forget(vehicle_url)
+
+    if changes and not stats.errors:
+        stats.checkpoint = max([entry.timestamp for entry in changes] + ([since] if since is not None else [])) # late changes can be older
+        start = changelog_start(stats.checkpoint)
+        revids = {entry.revid for entry in entries if entry.revid is not None and entry.timestamp >= start} # processed now or by the last run
+        save_checkpoint(timestamp=stats.checkpoint, filename=checkpoint_file, revids=revids)
+        if database is not None:
+            database.set_metadata({"last_changelog_update": stats.checkpoint})
+    return stats
+
+
+def run_update(changelog_content: Optional[str] = None, database=None, checkpoint_file: str = DEFAULT_CHECKPOINT_FILE, dry_run: bool = False) -> UpdateStats:
+    """applies the changes since the last checkpoint
+
+    Parameters
+    ----------
+    changelog_content : Optional[str], optional
+        html of a saved Special:RecentChanges page to use instead of requesting the wiki
+    database : Optional[VehicleDB], optional
+        receives the parsed ground vehicles, None only refreshes the page store
+    checkpoint_file : str, optional
+        path of the checkpoint file
+    dry_run : bool, optional
+        only determine the changed vehicles
+
+    Returns
+    -------
+    UpdateStats
+        what was done
+    """
+    if changelog_content is None:
+        try:
+            entries = get_wiki_changelog(since=load_checkpoint(filename=checkpoint_file))
+        except ChangelogGapError as error:
+            logger.warning("%s, updating every stored vehicle", error)
+            entries = full_refresh_entries()
+    else:
+        entries = parse_changelog(content=changelog_content)
+    return apply_changes(entries=entries, database=database, checkpoint_file=checkpoint_file, dry_run=dry_run)
+
+
+def __main__():
+    """Main
+    """
+    from scheduler import LockFile
+    from vehicle_db import DEFAULT_DB_FILE, VehicleDB
+
+    parser = argparse.ArgumentParser(description="Updates the stored vehicles that changed on the wiki since the last run")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_FILE, help="file holding the timestamp of the last processed change")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="path of the SQLite database")
+    parser.add_argument("--changelog", metavar="FILE", help="read the changes from a saved Special:RecentChanges page")
+    parser.add_argument("--dry-run", action="store_true", help="only list the changed vehicles")
+    parser.add_argument("--lock", default=DEFAULT_LOCK_FILE, help="lock file preventing overlapping updates")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--metrics", metavar="FILE", help="export the request and parse metrics, *.prom as Prometheus text, else JSON")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    lock = LockFile(filename=args.lock)
+    if not args.dry_run and not lock.acquire(): # the update service or another manual run is updating right now
+        logger.error("%s is held by another process, try again later", args.lock)
+        return
+    configure_fetcher(cache=ResponseCache()) # edits that don't change the rendered page aren't parsed again
+
+    changelog_content = None
+    if args.changelog:
+        with open(args.changelog, "r", encoding="utf-8") as changelog_file:
+            changelog_content = changelog_file.read()
+    database = None if args.dry_run else VehicleDB(filename=args.db)
+    with lock:
+        stats = run_update(changelog_content=changelog_content, database=database, checkpoint_file=args.checkpoint, dry_run=args.dry_run)
+    print(f"{stats.changes} changes, {stats.vehicles} stored vehicles affected ({stats.unchanged} unchanged), stored {stats.stored} and parsed {stats.parsed} pages "
+          f"({stats.partial} partially, {stats.irrelevant} without relevant changes)")
+    for error in stats.errors:
+        logger.warning(error)
+    print(f"Checkpoint: {stats.checkpoint}")
+    if database is not None:
+        database.close()
+    get_fetcher().close()
+    if args.metrics:
+        get_metrics().export(args.metrics)
+
+if __name__ == "__main__":
+    __main__()
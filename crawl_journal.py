@@ -0,0 +1,220 @@
+"""Write-ahead journal of a crawl, so an interrupted crawl resumes where it stopped
+
+Every step of the crawl appends a JSON line to the journal:
+
+{"key": "terrain:GROUND", "kind": "terrain", "state": "listed"}
+{"key": "<nation URL>", "kind": "nation", "state": "listed", "parent": "terrain:GROUND"}
+{"key": "<vehicle URL>", "kind": "vehicle", "state": "queued" | "fetched" | "stored" | "failed", "parent": "<nation URL>"}
+
+The lines are buffered and written (and fsynced) in batches, a crash loses at most the last batch which only means
+that its steps are done again. The records are written in the order they happened, so a listed nation is never
+on disk without the vehicles it queued. A torn last line is ignored.
+
+Opening an existing journal replays it, CrawlPipeline then skips the listed terrains and nations and only queues
+the vehicles that weren't stored yet. The replayed state is compacted into a fresh journal right away.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from metrics import get_logger
+
+DEFAULT_JOURNAL_FILE = "crawl_journal.jsonl"
+DEFAULT_BATCH_SIZE = 100 # records per write
+DEFAULT_FLUSH_INTERVAL = 2.0 # seconds, pending records are written at least this often while the crawl progresses
+
+TERRAIN = "terrain"
+NATION = "nation"
+VEHICLE = "vehicle"
+
+LISTED = "listed" # terrains and nations
+QUEUED = "queued"
+FETCHED = "fetched"
+STORED = "stored" # also for pages that didn't change, the stored page is current
+FAILED = "failed"
+DONE_STATES = (LISTED, STORED)
+
+logger = get_logger(__name__)
+
+
+class JournalEntry(NamedTuple):
+    """Latest state of a journaled key
+    """
+    kind: str
+    state: str
+    parent: Optional[str]
+    error: Optional[str]
+
+
+class CrawlJournal():
+    """Append-only journal of the crawl steps, see the module description
+    """
+
+    def __init__(self, filename: str = DEFAULT_JOURNAL_FILE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> None:
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            path of the journal, an existing one is resumed
+        batch_size : int, optional
+            amount of records buffered before they are written
+        flush_interval : float, optional
+            maximum amount of seconds records stay buffered
+        """
+        self.filename: str = filename
+        self.batch_size: int = max(1, batch_size)
+        self.flush_interval: float = flush_interval
+        self._entries: Dict[str, JournalEntry] = {}
+        self._pending: List[str] = []
+        self._last_flush: float = time.monotonic()
+        self._lock = threading.Lock()
+        if os.path.exists(filename):
+            self._replay()
+        self.resumed: bool = bool(self._entries)
+        self._compact()
+        self._file = open(filename, "a", encoding="utf-8")
+
+    def _replay(self) -> None:
+        """loads the latest state of every key from the journal file
+        """
+        with open(self.filename, "r", encoding="utf-8") as journal:
+            lines = journal.read().split("\n")
+        for number, line in enumerate(lines, start=1):
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if number < len(lines): # only the last line can be torn by a crash
+                    logger.warning("%s:%d is corrupt, skipped", self.filename, number)
+                continue
+            self._entries[record["key"]] = JournalEntry(record["kind"], record["state"], record.get("parent"), record.get("error"))
+
+    def _compact(self) -> None:
+        """rewrites the journal with one record per key, atomically replacing the old one
+        """
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as journal:
+            for key, entry in self._entries.items():
+                journal.write(_format_record(key, entry) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_filename, self.filename)
+
+    def record(self, key: str, kind: str, state: str, parent: Optional[str] = None, error: Optional[str] = None) -> None:
+        """journals a step, it is written with the next batch
+
+        Parameters
+        ----------
+        key : str
+            the terrain key or the nations/vehicles URL
+        kind : str
+            TERRAIN, NATION or VEHICLE
+        state : str
+            the reached state
+        parent : Optional[str], optional
+            key that listed this one, by default the previously journaled parent is kept
+        error : Optional[str], optional
+            what went wrong, for FAILED
+        """
+        with self._lock:
+            previous = self._entries.get(key)
+            if parent is None and previous is not None:
+                parent = previous.parent
+            entry = JournalEntry(kind, state, parent, error)
+            self._entries[key] = entry
+            self._pending.append(_format_record(key, entry))
+            due = len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """writes the buffered records and syncs them to disk
+        """
+        with self._lock:
+            if self._pending:
+                self._file.write("\n".join(self._pending) + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    def state(self, key: str) -> Optional[str]:
+        """returns the latest state of a key
+
+        Parameters
+        ----------
+        key : str
+            the terrain key or the nations/vehicles URL
+
+        Returns
+        -------
+        Optional[str]
+            the state, None if the key wasn't journaled
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.state if entry is not None else None
+
+    def keys(self, kind: str, parent: Optional[str] = None, done: Optional[bool] = None) -> List[str]:
+        """lists the journaled keys of a kind in the order they were first journaled
+
+        Parameters
+        ----------
+        kind : str
+            TERRAIN, NATION or VEHICLE
+        parent : Optional[str], optional
+            only the keys listed by this parent
+        done : Optional[bool], optional
+            only the finished (True) or unfinished (False) keys, None lists both
+
+        Returns
+        -------
+        List[str]
+            the matching keys
+        """
+        with self._lock:
+            return [
+                key for key, entry in self._entries.items()
+                if entry.kind == kind and (parent is None or entry.parent == parent) and (done is None or (entry.state in DONE_STATES) == done)
+            ]
+
+    def counts(self) -> Dict[str, int]:
+        """counts the vehicles per state
+
+        Returns
+        -------
+        Dict[str, int]
+            state -> amount of vehicles
+        """
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.kind == VEHICLE:
+                    counts[entry.state] = counts.get(entry.state, 0) + 1
+        return counts
+
+    def close(self) -> None:
+        """writes the buffered records and closes the journal, it is resumed the next time it is opened
+        """
+        self.flush()
+        self._file.close()
+
+    def finish(self) -> None:
+        """closes and deletes the journal of a completed crawl, the next crawl starts from scratch
+        """
+        self.close()
+        os.remove(self.filename)
+
+
+def _format_record(key: str, entry: JournalEntry) -> str:
+    record = {"key": key, "kind": entry.kind, "state": entry.state}
+    if entry.parent is not None:
+        record["parent"] = entry.parent
+    if entry.error is not None:
+        record["error"] = entry.error
+    return json.dumps(record, ensure_ascii=False)
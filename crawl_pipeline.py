@@ -0,0 +1,301 @@
+"""Crawls the WarThunder Wiki as a streaming producer/consumer pipeline
+
+nations -> category pages -> vehicle pages -> storage
+
+Every stage is connected to the next one by a bounded asyncio.Queue, so the first vehicle pages get downloaded
+while later nations are still being listed and the amount of pages held in memory never exceeds the queue sizes.
+The blocking HTTP requests are handed to the shared fetcher running inside a thread pool.
+
+With a CrawlJournal every step is journaled, a restarted crawl skips the terrains and nations that were already
+listed and only queues the vehicles that weren't stored yet.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from crawl_journal import FAILED, FETCHED, LISTED, NATION, QUEUED, STORED, TERRAIN, VEHICLE, CrawlJournal
+from fetcher import get_fetcher
+from page_store import get_page_store
+from scrape_wt_wiki import (TerrainType, get_aviation_nations, get_fleet_nations, get_ground_nations, get_vehicles_by_nation,
+                            get_vehicle_page, store_vehicle_page, vehicle_from_url)
+
+DEFAULT_QUEUE_SIZE = 64
+NATION_GETTERS: Dict[TerrainType, Callable[[], Dict[str, str]]] = {
+    TerrainType.GROUND: get_ground_nations,
+    TerrainType.AVIATION: get_aviation_nations,
+    TerrainType.NAVAL: get_fleet_nations,
+}
+_DONE = None # sentinel that tells a stage that its producers are finished
+
+
+@dataclass
+class CrawlStats():
+    """Counters of a finished (or running) crawl
+    """
+    nations: int = 0
+    vehicles: int = 0
+    skipped: int = 0
+    pages: int = 0
+    unchanged: int = 0
+    stored: int = 0
+    resumed: int = 0 # unfinished vehicles taken from the journal
+    errors: List[str] = field(default_factory=list)
+
+
+class CrawlPipeline():
+    """Async producer/consumer pipeline from nation discovery down to the page storage
+    """
+
+    def __init__(self, terrains: Iterable[TerrainType], workers: Optional[int] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 store: Callable[[str, str, Optional[TerrainType]], None] = store_vehicle_page, max_age: Optional[float] = None,
+                 journal: Optional[CrawlJournal] = None) -> None:
+        """
+        Parameters
+        ----------
+        terrains : Iterable[TerrainType]
+            the environments to crawl
+        workers : Optional[int], optional
+            amount of concurrent downloads, defaults to the fetchers concurrency
+        queue_size : int, optional
+            capacity of every queue between two stages
+        store : Callable[[str, str, Optional[TerrainType]], None], optional
+            called with the vehicles name, the page content and its terrain for every downloaded page
+        max_age : Optional[float], optional
+            vehicles stored less than max_age seconds ago aren't requested again, None requests every vehicle
+        journal : Optional[CrawlJournal], optional
+            journals the progress and resumes the crawl it belongs to, None crawls from scratch
+        """
+        self.terrains: List[TerrainType] = list(terrains)
+        self.workers: int = workers or get_fetcher().concurrency
+        self.queue_size: int = queue_size
+        self.store = store
+        self.max_age: Optional[float] = max_age
+        self.journal: Optional[CrawlJournal] = journal
+        self.stats = CrawlStats()
+        self._seen: Set[str] = set(journal.keys(VEHICLE)) if journal is not None else set() # queued by the interrupted crawl
+
+    async def _run_blocking(self, func: Callable, *args):
+        """runs a blocking function inside the pipelines thread pool
+
+        Parameters
+        ----------
+        func : Callable
+            the blocking function
+
+        Returns
+        -------
+        Any
+            whatever func returns
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _discover_nations(self, nation_queue: asyncio.Queue) -> None:
+        """stage 1: lists the nations of every terrain and feeds their category URLs
+
+        Parameters
+        ----------
+        nation_queue : asyncio.Queue
+            receives the nations category URLs
+        """
+        for terrain in self.terrains:
+            terrain_key = f"{TERRAIN}:{terrain.name}"
+            if self.journal is not None and self.journal.state(terrain_key) == LISTED:
+                self.stats.nations += len(self.journal.keys(NATION, parent=terrain_key))
+                for nation_url in self.journal.keys(NATION, parent=terrain_key, done=False):
+                    await nation_queue.put(nation_url)
+                continue
+            try:
+                nations = await self._run_blocking(NATION_GETTERS[terrain])
+            except Exception as excp:
+                self.stats.errors.append(f"{terrain.name}: {excp!r}")
+                continue
+            if self.journal is not None:
+                for nation_url in nations.values():
+                    if self.journal.state(nation_url) != LISTED:
+                        self.journal.record(nation_url, NATION, QUEUED, parent=terrain_key)
+                self.journal.record(terrain_key, TERRAIN, LISTED)
+            for nation_url in nations.values():
+                self.stats.nations += 1
+                if self.journal is None or self.journal.state(nation_url) != LISTED:
+                    await nation_queue.put(nation_url)
+
+    async def _list_vehicles(self, nation_queue: asyncio.Queue, vehicle_queue: asyncio.Queue) -> None:
+        """stage 2: requests the category pages and feeds every (new) vehicle
+
+        Parameters
+        ----------
+        nation_queue : asyncio.Queue
+            provides the nations category URLs
+        vehicle_queue : asyncio.Queue
+            receives the vehicles URLs
+        """
+        while (nation_url := await nation_queue.get()) is not _DONE:
+            try:
+                vehicles = await self._run_blocking(get_vehicles_by_nation, nation_url) # streamed, see scrape_wt_wiki.get_discovery_element
+            except Exception as excp:
+                self.stats.errors.append(f"{nation_url}: {excp!r}")
+                continue
+            for vehicle_url in vehicles.values():
+                if vehicle_url in self._seen: # vehicles can be listed by several nations
+                    continue
+                self._seen.add(vehicle_url)
+                self.stats.vehicles += 1
+                if self.max_age is not None and get_page_store().has(vehicle_from_url(vehicle_url), max_age=self.max_age):
+                    self.stats.skipped += 1
+                    continue
+                if self.journal is not None:
+                    self.journal.record(vehicle_url, VEHICLE, QUEUED, parent=nation_url)
+                await vehicle_queue.put(vehicle_url)
+            if self.journal is not None: # after its vehicles, a resumed crawl won't list it again
+                self.journal.record(nation_url, NATION, LISTED)
+
+    async def _resume_vehicles(self, vehicle_queue: asyncio.Queue) -> None:
+        """stage 2 of a resumed crawl: feeds the vehicles the interrupted crawl didn't store
+
+        Parameters
+        ----------
+        vehicle_queue : asyncio.Queue
+            receives the vehicles URLs
+        """
+        cache = get_fetcher().cache
+        for vehicle_url in self.journal.keys(VEHICLE, done=False):
+            if cache is not None: # the validators may have been saved before the crash while the page wasn't
+                cache.forget(vehicle_url)
+            self.stats.vehicles += 1
+            self.stats.resumed += 1
+            await vehicle_queue.put(vehicle_url)
+
+    async def _download_pages(self, vehicle_queue: asyncio.Queue, page_queue: asyncio.Queue) -> None:
+        """stage 3: downloads the vehicle pages
+
+        Parameters
+        ----------
+        vehicle_queue : asyncio.Queue
+            provides the vehicles URLs
+        page_queue : asyncio.Queue
+            receives tuples of (vehicle URL, vehicle, content, terrain)
+        """
+        while (vehicle_url := await vehicle_queue.get()) is not _DONE:
+            try:
+                content, terrain = await self._run_blocking(get_vehicle_page, vehicle_url) # classified by the download workers
+            except Exception as excp:
+                self.stats.errors.append(f"{vehicle_url}: {excp!r}")
+                self._journal(vehicle_url, FAILED, error=repr(excp))
+                continue
+            if content is None: # revalidated, the stored page is still up to date
+                await self._run_blocking(get_page_store().touch, vehicle_from_url(vehicle_url)) # restarts its max_age
+                self.stats.unchanged += 1
+                self._journal(vehicle_url, STORED)
+                continue
+            self.stats.pages += 1
+            self._journal(vehicle_url, FETCHED)
+            await page_queue.put((vehicle_url, vehicle_from_url(vehicle_url), content, terrain))
+
+    async def _store_pages(self, page_queue: asyncio.Queue) -> None:
+        """stage 4: hands the pages to the storage, a single consumer keeps the writes ordered
+
+        Parameters
+        ----------
+        page_queue : asyncio.Queue
+            provides tuples of (vehicle URL, vehicle, content, terrain)
+        """
+        while (page := await page_queue.get()) is not _DONE:
+            vehicle_url, vehicle, content, terrain = page
+            try:
+                await self._run_blocking(self.store, vehicle, content, terrain)
+            except Exception as excp:
+                self.stats.errors.append(f"{vehicle}: {excp!r}")
+                if get_fetcher().cache is not None: # otherwise the next crawl would consider the missing page unchanged
+                    get_fetcher().cache.forget(vehicle_url)
+                self._journal(vehicle_url, FAILED, error=repr(excp))
+                continue
+            self.stats.stored += 1
+            self._journal(vehicle_url, STORED)
+
+    def _journal(self, vehicle_url: str, state: str, error: Optional[str] = None) -> None:
+        """journals the state of a vehicle if the crawl is journaled
+
+        Parameters
+        ----------
+        vehicle_url : str
+            URL of the vehicles wiki page
+        state : str
+            the reached state, see crawl_journal
+        error : Optional[str], optional
+            what went wrong, for FAILED
+        """
+        if self.journal is not None:
+            self.journal.record(vehicle_url, VEHICLE, state, error=error)
+
+    async def _close_stage(self, workers: List[asyncio.Task], queue: asyncio.Queue, consumers: int) -> None:
+        """waits for a stage to finish and tells every consumer of its output queue to stop
+
+        Parameters
+        ----------
+        workers : List[asyncio.Task]
+            the tasks of the finishing stage
+        queue : asyncio.Queue
+            the stages output queue
+        consumers : int
+            amount of tasks reading the queue
+        """
+        await asyncio.gather(*workers)
+        for _ in range(consumers):
+            await queue.put(_DONE)
+
+    async def run(self) -> CrawlStats:
+        """runs the whole pipeline until every discovered vehicle is stored
+
+        Returns
+        -------
+        CrawlStats
+            counters of the crawl
+        """
+        nation_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        vehicle_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        page_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        listers = max(1, self.workers // 4) # category pages are few but large, vehicle pages are many
+        # the storage gets its own thread so it never has to wait behind a queue of downloads
+        with ThreadPoolExecutor(max_workers=self.workers + listers + 2, thread_name_prefix="crawl") as self._executor:
+            discovery = [asyncio.create_task(self._discover_nations(nation_queue))]
+            listing = [asyncio.create_task(self._list_vehicles(nation_queue, vehicle_queue)) for _ in range(listers)]
+            if self.journal is not None and self.journal.resumed:
+                listing.append(asyncio.create_task(self._resume_vehicles(vehicle_queue)))
+            downloading = [asyncio.create_task(self._download_pages(vehicle_queue, page_queue)) for _ in range(self.workers)]
+            storing = [asyncio.create_task(self._store_pages(page_queue))]
+            await asyncio.gather(
+                self._close_stage(discovery, nation_queue, listers),
+                self._close_stage(listing, vehicle_queue, len(downloading)),
+                self._close_stage(downloading, page_queue, len(storing)),
+                *storing
+            )
+        if self.journal is not None:
+            self.journal.flush()
+        return self.stats
+
+
+def run_crawl(terrains: Iterable[TerrainType], workers: Optional[int] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+              max_age: Optional[float] = None, journal: Optional[CrawlJournal] = None) -> CrawlStats:
+    """crawls every vehicle of the given terrains and stores their pages
+
+    Parameters
+    ----------
+    terrains : Iterable[TerrainType]
+        the environments to crawl
+    workers : Optional[int], optional
+        amount of concurrent downloads, defaults to the fetchers concurrency
+    queue_size : int, optional
+        capacity of every queue between two stages
+    max_age : Optional[float], optional
+        vehicles stored less than max_age seconds ago aren't requested again, None requests every vehicle
+    journal : Optional[CrawlJournal], optional
+        journals the progress and resumes the crawl it belongs to, None crawls from scratch
+
+    Returns
+    -------
+    CrawlStats
+        counters of the crawl
+    """
+    return asyncio.run(CrawlPipeline(terrains=terrains, workers=workers, queue_size=queue_size, max_age=max_age, journal=journal).run())
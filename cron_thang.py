@@ -1,18 +1,81 @@
+"""Update service, applies the wikis recent changes to the page store and the vehicle DB on a schedule
+
+python cron_thang.py [--cron "0 */6 * * *"] [--run-now] [--once]
+"""
+
+import argparse
 import datetime
-from time import sleep
+from typing import Any, Dict, Optional
+
+from metrics import configure_logging, get_logger, get_metrics
+from scheduler import CronSchedule, run_scheduler
+
+DEFAULT_CRON = "0 4 * * *" # once a day, like the old loop
+DEFAULT_METRICS_FILE = "update_runs.jsonl"
+
+logger = get_logger(__name__)
+
+
+def update_job(db_file: str, checkpoint_file: str, export_file: Optional[str] = None) -> Dict[str, Any]:
+    """applies the changes since the last update and writes them to the DB
+
+    Parameters
+    ----------
+    db_file : str
+        path of the SQLite database
+    checkpoint_file : str
+        file holding the timestamp of the last processed change
+    export_file : Optional[str], optional
+        receives the request and parse metrics (accumulated over every run) afterwards, see metrics.Metrics.export
+
+    Returns
+    -------
+    Dict[str, Any]
+        counters of the update
+    """
+    # imported per run, the daemon itself stays small while it sleeps
+    from changelog_updater import run_update
+    from fetcher import configure_fetcher
+    from response_cache import ResponseCache
+    from vehicle_db import VehicleDB
 
-from scrape_wt_wiki import get_wiki_changelog
+    fetcher = configure_fetcher(cache=ResponseCache())
+    database = VehicleDB(filename=db_file)
+    try:
+        stats = run_update(database=database, checkpoint_file=checkpoint_file)
+    finally:
+        database.close()
+        fetcher.close()
+        if export_file:
+            get_metrics().export(export_file)
+    if stats.errors:
+        raise RuntimeError(f"{len(stats.errors)} vehicles failed, first: {stats.errors[0]}")
+    return {"changes": stats.changes, "vehicles": stats.vehicles, "stored": stats.stored, "parsed": stats.parsed, "checkpoint": stats.checkpoint}
 
-dt0 = datetime.datetime.now()
-while True:
-    if (datetime.datetime.now() - dt0).days >= 1:
-        dt0 = datetime.datetime.now()
-        # call function to both update based on changelog
-        # and also put update the DB
-        pass
-    else:
-        sleep(60)
 
+def __main__():
+    """Main
+    """
+    from changelog_updater import DEFAULT_CHECKPOINT_FILE, DEFAULT_LOCK_FILE
+    from vehicle_db import DEFAULT_DB_FILE
 
+    parser = argparse.ArgumentParser(description="Keeps the vehicle DB up to date with the wiki")
+    parser.add_argument("--cron", default=DEFAULT_CRON, help="when to update, as cron expression or @hourly/@daily/@weekly/@monthly")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="path of the SQLite database")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_FILE, help="file holding the timestamp of the last processed change")
+    parser.add_argument("--lock", default=DEFAULT_LOCK_FILE, help="lock file preventing overlapping updates")
+    parser.add_argument("--metrics", default=DEFAULT_METRICS_FILE, help="JSON lines file receiving the timing of every update")
+    parser.add_argument("--run-now", action="store_true", help="update right away instead of waiting for the first due time")
+    parser.add_argument("--once", action="store_true", help="stop after a single update")
+    parser.add_argument("--export-metrics", metavar="FILE", help="export the request and parse metrics after every update, *.prom as Prometheus text, else JSON")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
 
+    schedule = CronSchedule(args.cron)
+    logger.info(f"next update: {schedule.next_run(datetime.datetime.now()):%Y-%m-%d %H:%M}" if not args.run_now else "updating now")
+    run_scheduler(schedule=schedule, job=lambda: update_job(db_file=args.db, checkpoint_file=args.checkpoint, export_file=args.export_metrics), lock_file=args.lock,
+                  metrics_file=args.metrics, run_now=args.run_now, max_runs=1 if args.once else None)
 
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,104 @@
+"""Class name index over a parsed wiki page
+
+Every soup.find(class_=...) walks the whole tree again. The ground parser looks up about 20 classes per page,
+so the index collects all elements by their classes in a single traversal and answers every further lookup
+from a dict.
+"""
+
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from bs4 import Tag
+
+
+class ClassIndex():
+    """class name -> elements (in document order) of a soup
+    """
+
+    def __init__(self, soup: Tag, scan: bool = False) -> None:
+        """
+        Parameters
+        ----------
+        soup : Tag
+            the parsed page
+        scan : bool, optional
+            don't build the index but scan the tree on every lookup like soup.find_all does (used for benchmarking)
+        """
+        self.soup: Tag = soup
+        self.scan: bool = scan
+        self._elements: Dict[str, List[Tag]] = defaultdict(list)
+        if not scan:
+            for element in soup.descendants:
+                if isinstance(element, Tag):
+                    for class_name in element.get("class", []):
+                        self._elements[class_name].append(element)
+
+    def find_all(self, class_name: str) -> List[Tag]:
+        """returns every element with the given class
+
+        Parameters
+        ----------
+        class_name : str
+            a single class name
+
+        Returns
+        -------
+        List[Tag]
+            the matching elements in document order
+        """
+        if self.scan:
+            return list(self.soup.find_all(class_=class_name))
+        return list(self._elements.get(class_name, []))
+
+    def find(self, class_name: str) -> Optional[Tag]:
+        """returns the first element with the given class
+
+        Parameters
+        ----------
+        class_name : str
+            a single class name
+
+        Returns
+        -------
+        Optional[Tag]
+            the first matching element, None if there is none
+        """
+        if self.scan:
+            return self.soup.find(class_=class_name)
+        elements = self._elements.get(class_name)
+        return elements[0] if elements else None
+
+    def class_names(self, prefix: str = "") -> List[str]:
+        """lists the class names present on the page
+
+        Parameters
+        ----------
+        prefix : str, optional
+            only list class names starting with it
+
+        Returns
+        -------
+        List[str]
+            the sorted class names
+        """
+        if self.scan:
+            names = {name for element in self.soup.find_all(class_=True) for name in element.get("class", [])}
+        else:
+            names = {name for name, elements in self._elements.items() if elements}
+        return sorted(name for name in names if name.startswith(prefix))
+
+    def extract(self, element: Tag) -> None:
+        """removes an element from the tree and the index
+
+        Parameters
+        ----------
+        element : Tag
+            the element to remove
+        """
+        element.extract()
+        if self.scan:
+            return
+        removed = [element] + [child for child in element.descendants if isinstance(child, Tag)]
+        for child in removed:
+            for class_name in child.get("class", []):
+                self._elements[class_name] = [other for other in self._elements[class_name] if other is not child]
@@ -0,0 +1,246 @@
+"""How the fetcher treats a slow or failing wiki
+
+Every request gets a timeout. Connection errors, timeouts and the statuses of RETRY_STATUSES are retried with full
+jitter exponential backoff, a Retry-After of the wiki is respected (and pauses the whole host). Any other error status
+is returned to the caller, the fetchers text methods raise it instead of handing an error page to the parser.
+
+Per host the fetcher keeps
+AimdLimiter    : the amount of requests in flight, increased by one per window of successful requests and halved
+                 on a failure or a latency far above the usual one (additive increase, multiplicative decrease)
+CircuitBreaker : pauses every request towards the host once too many of the recent ones failed, then lets a single
+                 probe through; a host that keeps failing its probes is given up with HostUnavailableError for a while
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Deque, Optional, Tuple
+
+import requests
+
+from metrics import get_logger, get_metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+logger = get_logger(__name__)
+
+
+class HostUnavailableError(requests.ConnectionError):
+    """The circuit breaker gave up on a host
+    """
+
+
+@dataclass
+class FetchPolicy():
+    """Timeouts, retries and the adaptive limits of the fetcher
+    """
+    timeout: Tuple[float, float] = (5.0, 30.0) # seconds to connect and between two received bytes
+    retries: int = 4 # after the first attempt
+    backoff_base: float = 0.5 # seconds, the delay before retry n is random between 0 and base * 2 ** n
+    backoff_max: float = 30.0
+    max_retry_after: float = 300.0 # longer Retry-After headers are cut to this
+    min_concurrency: int = 1
+    latency_factor: float = 3.0 # a request this many times slower than the usual ones counts as congestion
+    decrease_cooldown: float = 1.0 # seconds, the in-flight requests of a burst of failures only halve the limit once
+    breaker_window: int = 20 # recent requests the failure ratio is computed over
+    breaker_min_requests: int = 10
+    breaker_failure_ratio: float = 0.5
+    breaker_cooldown: float = 30.0 # seconds the first opening lasts, doubled per failed probe
+    breaker_max_cooldown: float = 600.0
+    breaker_max_trips: int = 5 # failed probes in a row before the host is given up
+
+
+def backoff_delay(attempt: int, policy: FetchPolicy) -> float:
+    """returns the full jitter delay before a retry
+
+    Parameters
+    ----------
+    attempt : int
+        0 for the first retry
+    policy : FetchPolicy
+        the backoff settings
+
+    Returns
+    -------
+    float
+        seconds to wait
+    """
+    return random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** attempt))
+
+
+def retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    """reads the Retry-After header of a response
+
+    Parameters
+    ----------
+    response : Optional[requests.Response]
+        the response, None after a connection error
+
+    Returns
+    -------
+    Optional[float]
+        seconds to wait, None without (or with an unreadable) header
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AimdLimiter():
+    """Adaptive limit of the requests in flight towards a single host
+    """
+
+    def __init__(self, maximum: int, policy: FetchPolicy) -> None:
+        """
+        Parameters
+        ----------
+        maximum : int
+            the limit never grows beyond this
+        policy : FetchPolicy
+            minimum, latency factor and decrease cooldown
+        """
+        self.maximum: int = max(1, maximum)
+        self.minimum: int = max(1, min(policy.min_concurrency, self.maximum))
+        self.policy: FetchPolicy = policy
+        self.limit: float = max(self.minimum, self.maximum / 2) # grows towards the maximum while the host keeps up
+        self.in_flight: int = 0
+        self._latency: Optional[float] = None # moving average of the successful requests
+        self._last_decrease: float = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """blocks until the request fits into the current limit
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, failed: bool) -> None:
+        """frees the slot of a finished request and adapts the limit
+
+        Parameters
+        ----------
+        latency : float
+            seconds the request took
+        failed : bool
+            the request failed in a way that hints at an overloaded host
+        """
+        with self._condition:
+            self.in_flight -= 1
+            congested = failed or (self._latency is not None and latency > self.policy.latency_factor * self._latency)
+            if not failed:
+                self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+            now = time.monotonic()
+            if congested and now - self._last_decrease >= self.policy.decrease_cooldown:
+                self._last_decrease = now
+                self.limit = max(self.minimum, self.limit / 2)
+                logger.debug("concurrency limit decreased to %d", int(self.limit))
+            elif not congested and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit) # +1 per limit successful requests
+            self._condition.notify_all()
+
+
+class CircuitBreaker():
+    """Pauses the requests towards a host while it is unhealthy
+    """
+
+    def __init__(self, host: str, policy: FetchPolicy) -> None:
+        """
+        Parameters
+        ----------
+        host : str
+            name of the host, for the log
+        policy : FetchPolicy
+            window, failure ratio and cooldowns
+        """
+        self.host: str = host
+        self.policy: FetchPolicy = policy
+        self.state: str = CLOSED
+        self.trips: int = 0
+        self._results: Deque[bool] = deque(maxlen=policy.breaker_window) # True for failures
+        self._opened_at: float = 0.0
+        self._probing: bool = False
+        self._condition = threading.Condition()
+
+    def _cooldown(self) -> float:
+        return min(self.policy.breaker_max_cooldown, self.policy.breaker_cooldown * 2 ** max(0, self.trips - 1))
+
+    def before_request(self) -> bool:
+        """blocks while the circuit is open
+
+        Returns
+        -------
+        bool
+            the request is the probe of a half-open circuit
+
+        Raises
+        ------
+        HostUnavailableError
+            the host failed too many probes in a row, it gets another probe after breaker_max_cooldown
+        """
+        with self._condition:
+            while True:
+                if self.trips > self.policy.breaker_max_trips and time.monotonic() - self._opened_at < self.policy.breaker_max_cooldown:
+                    raise HostUnavailableError(f"{self.host} failed {self.trips - 1} probes in a row")
+                if self.state == CLOSED:
+                    return False
+                if self.state == OPEN:
+                    remaining = self._opened_at + self._cooldown() - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+                    self.state = HALF_OPEN
+                if not self._probing:
+                    self._probing = True
+                    return True
+                self._condition.wait()
+
+    def record(self, failed: bool, probe: bool) -> None:
+        """records the outcome of a request
+
+        Parameters
+        ----------
+        failed : bool
+            the request failed because of the host (error status, timeout, connection error)
+        probe : bool
+            the request was let through as probe, see before_request
+        """
+        with self._condition:
+            if probe:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    logger.info("%s recovered, resuming", self.host)
+                    self.state = CLOSED
+                    self.trips = 0
+                    self._results.clear()
+                self._condition.notify_all()
+                return
+            if self.state != CLOSED: # finished after the circuit opened, the probe decides
+                return
+            self._results.append(failed)
+            if len(self._results) >= self.policy.breaker_min_requests and sum(self._results) / len(self._results) >= self.policy.breaker_failure_ratio:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        get_metrics().increment("circuit_opened", host=self.host)
+        logger.warning("%s is failing, pausing its requests for %.1fs", self.host, self._cooldown())
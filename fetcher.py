@@ -0,0 +1,345 @@
+"""Shared HTTP fetching for the WarThunder Wiki scraper
+
+All network access goes through a single pooled requests.Session, so connections (and their TLS handshakes)
+are reused instead of being re-opened for every page. Requests can be run concurrently up to a configurable
+limit while a per-host rate limit keeps us polite towards the wiki. Timeouts, retries, the adaptive concurrency per
+host and the circuit breaker follow a FetchPolicy, see fetch_policy.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_policy import RETRY_STATUSES, AimdLimiter, CircuitBreaker, FetchPolicy, backoff_delay, retry_after
+from metrics import get_logger, get_metrics
+from response_cache import ResponseCache
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE_LIMIT = 10.0 # requests per second and host, 0 disables the limit
+USER_AGENT = "WTScraper (+https://github.com/WhosMyName/WTScraper)"
+
+logger = get_logger(__name__)
+
+
+class HostRateLimiter():
+    """Spaces out the start of requests towards a single host
+    """
+
+    def __init__(self, rate_limit: float) -> None:
+        """
+        Parameters
+        ----------
+        rate_limit : float
+            maximum amount of requests per second, 0 or less disables the limit
+        """
+        self.interval: float = 1.0 / rate_limit if rate_limit > 0 else 0.0
+        self._next_slot: float = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """blocks until the next request slot for this host is due
+        """
+        with self._lock: # only reserve the slot while locked, the actual waiting happens outside
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if self.interval:
+                self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """delays every further request towards this host, e.g. for a Retry-After
+
+        Parameters
+        ----------
+        seconds : float
+            length of the pause, starting now
+        """
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class Fetcher():
+    """Pooled and concurrent HTTP client used by every scraper entry point
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, concurrency: int = DEFAULT_CONCURRENCY, rate_limit: float = DEFAULT_RATE_LIMIT,
+                 cache: Optional[ResponseCache] = None, policy: Optional[FetchPolicy] = None) -> None:
+        """
+        Parameters
+        ----------
+        pool_size : int, optional
+            amount of keep-alive connections held per host
+        concurrency : int, optional
+            maximum amount of requests in flight at the same time, the adaptive limit per host stays below it
+        rate_limit : float, optional
+            maximum amount of requests per second and host, 0 disables the limit
+        cache : Optional[ResponseCache], optional
+            revalidation cache used by get_if_changed, None always fetches the full page
+        policy : Optional[FetchPolicy], optional
+            timeouts, retries and the adaptive limits, defaults to FetchPolicy()
+        """
+        self.cache: Optional[ResponseCache] = cache
+        self.policy: FetchPolicy = policy or FetchPolicy()
+        self.concurrency: int = max(1, concurrency)
+        self.rate_limit: float = rate_limit
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max(pool_size, self.concurrency), pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self._concurrency_limits: Dict[str, AimdLimiter] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._limiters_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _limiter(self, url: str) -> HostRateLimiter:
+        """returns the rate limiter of the URLs host
+
+        Parameters
+        ----------
+        url : str
+            the URL that is about to be requested
+
+        Returns
+        -------
+        HostRateLimiter
+            the hosts (shared) rate limiter
+        """
+        host = urlsplit(url).netloc
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostRateLimiter(rate_limit=self.rate_limit)
+                self._concurrency_limits[host] = AimdLimiter(maximum=self.concurrency, policy=self.policy)
+                self._breakers[host] = CircuitBreaker(host=host, policy=self.policy)
+            return self._limiters[host]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """requests an URL through the pooled session, retrying the failed attempts
+
+        Parameters
+        ----------
+        url : str
+            the URL to request
+        **kwargs
+            passed on to requests.Session.get, the timeout defaults to the one of the policy
+
+        Returns
+        -------
+        requests.Response
+            the response of the wiki, it still has an error status if the last retry failed as well
+
+        Raises
+        ------
+        requests.RequestException
+            the last retry failed without a response (connection error, timeout) or the host was given up
+        """
+        kwargs.setdefault("timeout", self.policy.timeout)
+        limiter = self._limiter(url)
+        host = urlsplit(url).netloc
+        concurrency_limit, breaker = self._concurrency_limits[host], self._breakers[host]
+        metrics = get_metrics()
+        for attempt in range(self.policy.retries + 1):
+            probe = breaker.before_request()
+            concurrency_limit.acquire()
+            limiter.acquire()
+            response, error = None, None
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, **kwargs) # with stream=True only the headers have arrived here
+                if not kwargs.get("stream"): # streamed bodies are counted by their reader, see stream_extract
+                    metrics.increment("http_bytes", len(response.content))
+            except (requests.ConnectionError, requests.Timeout) as excp:
+                error = excp
+            except BaseException: # not the wikis fault, but the slot must not leak
+                concurrency_limit.release(latency=time.perf_counter() - start, failed=False)
+                breaker.record(failed=False, probe=probe)
+                raise
+            latency = time.perf_counter() - start
+            outcome = response.status_code if response is not None else type(error).__name__
+            failed = error is not None or response.status_code in RETRY_STATUSES
+            concurrency_limit.release(latency=latency, failed=failed)
+            breaker.record(failed=failed, probe=probe)
+            metrics.observe("http_request", latency)
+            metrics.increment("http_requests", status=outcome)
+            logger.debug("GET %s: %s in %.3fs", url, outcome, latency)
+            if not failed or attempt == self.policy.retries:
+                break
+            delay = backoff_delay(attempt, self.policy)
+            wait_for = retry_after(response)
+            if wait_for is not None: # the wiki asked for a break, that holds for every request towards it
+                wait_for = min(wait_for, self.policy.max_retry_after)
+                limiter.pause(wait_for)
+                delay = max(delay, wait_for)
+            if response is not None:
+                response.close()
+            metrics.increment("http_retries", reason=outcome)
+            logger.info("GET %s failed (%s), retrying in %.1fs", url, outcome, delay)
+            time.sleep(delay)
+        if error is not None:
+            raise error
+        return response
+
+    def get_text(self, url: str) -> str:
+        """requests an URL and returns the decoded body
+
+        Parameters
+        ----------
+        url : str
+            the URL to request
+
+        Returns
+        -------
+        str
+            the response body as text
+
+        Raises
+        ------
+        requests.HTTPError
+            the wiki answered with an error status
+        """
+        response = self.get(url)
+        response.raise_for_status()
+        return response.text
+
+    def get_if_changed(self, url: str) -> Optional[str]:
+        """requests an URL conditionally using the revalidation cache
+
+        Parameters
+        ----------
+        url : str
+            the URL to request
+
+        Returns
+        -------
+        Optional[str]
+            the response body, None if the page did not change since it was last fetched
+
+        Raises
+        ------
+        requests.HTTPError
+            the wiki answered with an error status
+        """
+        if self.cache is None:
+            return self.get_text(url)
+        response = self.get(url, headers=self.cache.request_headers(url))
+        if response.status_code == 304: # Not Modified
+            return None
+        response.raise_for_status() # an error page must neither be stored nor remembered as the current version
+        if not self.cache.update(url, response): # the server doesn't do validators, but the body is the same
+            return None
+        return response.text
+
+    def fetch_all(self, urls: Iterable[str], if_changed: bool = False,
+                  fetch: Optional[Callable[[str], Optional[str]]] = None) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """requests many URLs concurrently
+
+        The URLs are consumed lazily and only `concurrency * 2` requests are queued at any time,
+        so even huge generators of URLs don't pile up in memory. A failed URL is yielded with its error
+        instead of raising, so one 404 or timeout doesn't end the whole batch.
+
+        Parameters
+        ----------
+        urls : Iterable[str]
+            the URLs to request
+        if_changed : bool, optional
+            request conditionally, see get_if_changed
+        fetch : Optional[Callable[[str], Optional[str]]], optional
+            requests a single URL instead of get_text/get_if_changed, e.g. stream_extract.stream_element
+
+        Yields
+        ------
+        Iterator[Tuple[str, Optional[str], Optional[Exception]]]
+            tuples of (URL, response body, error) in the order of completion, the body is None for unchanged
+            and failed pages, the error is None unless the request failed (after every retry)
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetcher")
+        pending: Set[Future] = set()
+        url_by_future: Dict[Future, str] = {}
+        url_iter = iter(urls)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.concurrency * 2:
+                url = next(url_iter, None)
+                if url is None:
+                    exhausted = True
+                    break
+                future = self._executor.submit(fetch or (self.get_if_changed if if_changed else self.get_text), url)
+                url_by_future[future] = url
+                pending.add(future)
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = url_by_future.pop(future)
+                try:
+                    content = future.result()
+                except Exception as error:
+                    yield url, None, error
+                else:
+                    yield url, content, None
+
+    def close(self) -> None:
+        """shuts down the worker threads and the connection pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.cache is not None:
+            self.cache.save()
+        self.session.close()
+
+
+_FETCHER: Optional[Fetcher] = None
+_FETCHER_LOCK = threading.Lock()
+
+def get_fetcher() -> Fetcher:
+    """returns the shared fetcher, creating it with the default settings if needed
+
+    Returns
+    -------
+    Fetcher
+        the process-wide fetcher
+    """
+    global _FETCHER
+    with _FETCHER_LOCK:
+        if _FETCHER is None:
+            _FETCHER = Fetcher()
+        return _FETCHER
+
+def configure_fetcher(pool_size: int = DEFAULT_POOL_SIZE, concurrency: int = DEFAULT_CONCURRENCY, rate_limit: float = DEFAULT_RATE_LIMIT,
+                      cache: Optional[ResponseCache] = None, policy: Optional[FetchPolicy] = None) -> Fetcher:
+    """replaces the shared fetcher with a newly configured one
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        amount of keep-alive connections held per host
+    concurrency : int, optional
+        maximum amount of requests in flight at the same time
+    rate_limit : float, optional
+        maximum amount of requests per second and host, 0 disables the limit
+    cache : Optional[ResponseCache], optional
+        revalidation cache used by get_if_changed, None always fetches the full page
+    policy : Optional[FetchPolicy], optional
+        timeouts, retries and the adaptive limits, defaults to FetchPolicy()
+
+    Returns
+    -------
+    Fetcher
+        the new process-wide fetcher
+    """
+    global _FETCHER
+    with _FETCHER_LOCK:
+        if _FETCHER is not None:
+            _FETCHER.close()
+        _FETCHER = Fetcher(pool_size=pool_size, concurrency=concurrency, rate_limit=rate_limit, cache=cache, policy=policy)
+        return _FETCHER
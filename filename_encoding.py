@@ -0,0 +1,179 @@
+"""Reversible encoding of wiki titles into safe filenames
+
+Titles like `M60A1_"D.C.Ariete"`, `AUBL/74_HVG` or `Sho't_Kal_Dalet_(Great_Britain)` contain characters that are
+either forbidden or meaningful on some filesystem. Instead of spelling out every character as its ordinal
+(`77-97-117-115` for `Maus`, 3-4 times the length of the title) every character outside a small safe set is
+percent-encoded, which keeps the common titles readable and unchanged. Both directions run in linear time.
+
+Percent-encoding grows a CJK or Cyrillic character to 6-9 bytes, so names longer than MAX_NAME_BYTES are cut and
+get a hash of the full title appended after a "+" (which quote() always encodes, so it only shows up in shortened
+names). Those can't be decoded any more, the caller has to keep their title, see is_shortened.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import Dict, List, Tuple
+from urllib.parse import quote, unquote
+
+from terrain import TerrainType
+
+SAFE_CHARS = "-_.()!,'" # quote() never encodes ASCII letters and digits
+LEGACY_NAME_PATTERN = re.compile(r"^\d+(-\d+)*$") # 77-97-117-115
+HTML_SUFFIX = ".html"
+MAX_NAME_BYTES = 200 # most filesystems allow 255, this leaves room for suffixes like .html.tmp
+HASH_MARKER = "+"
+HASH_LENGTH = 16
+
+
+def encode_name(title: str) -> str:
+    """encodes a wiki title into a filename (without suffix)
+
+    Parameters
+    ----------
+    title : str
+        the wiki title, any unicode is allowed
+
+    Returns
+    -------
+    str
+        the safe filename, at most MAX_NAME_BYTES long
+    """
+    encoded = quote(title, safe=SAFE_CHARS)
+    # leading dots hide files on unix and trailing dots get stripped by windows, so both are encoded as well
+    if encoded.startswith("."):
+        encoded = f"%2E{encoded[1:]}"
+    if encoded.endswith("."):
+        encoded = f"{encoded[:-1]}%2E"
+    if len(encoded) > MAX_NAME_BYTES: # the encoded name is plain ASCII, its length is its size in bytes
+        prefix = encoded[:MAX_NAME_BYTES - len(HASH_MARKER) - HASH_LENGTH]
+        escape = prefix.find("%", len(prefix) - 2)
+        if escape != -1: # don't cut an escape in half
+            prefix = prefix[:escape]
+        encoded = f"{prefix}{HASH_MARKER}{hashlib.sha256(title.encode('utf-8')).hexdigest()[:HASH_LENGTH]}"
+    return encoded
+
+
+def is_shortened(filename: str) -> bool:
+    """checks if encode_name had to shorten a title
+
+    Parameters
+    ----------
+    filename : str
+        the encoded filename (without suffix)
+
+    Returns
+    -------
+    bool
+        the filename ends with a hash instead of the rest of the title and can't be decoded
+    """
+    return HASH_MARKER in filename
+
+
+def decode_name(filename: str) -> str:
+    """decodes a filename (without suffix) created by encode_name
+
+    Parameters
+    ----------
+    filename : str
+        the encoded filename
+
+    Returns
+    -------
+    str
+        the original wiki title
+
+    Raises
+    ------
+    ValueError
+        the filename was shortened, see is_shortened
+    """
+    if is_shortened(filename):
+        raise ValueError(f"{filename} is shortened, the title can't be recovered from it")
+    return unquote(filename)
+
+
+def decode_legacy_name(filename: str, delimiter: str = "-") -> str:
+    """decodes the old ordinal filenames (`77-97-117-115` -> `Maus`)
+
+    Parameters
+    ----------
+    filename : str
+        the ordinal filename without suffix
+    delimiter : str, optional
+        delimiter between two ordinals
+
+    Returns
+    -------
+    str
+        the original wiki title
+    """
+    return "".join(chr(int(ordinal)) for ordinal in filename.split(delimiter))
+
+
+def migrate_legacy_files(naming_file: str = "naming.lst") -> Dict[str, str]:
+    """renames the ordinal-named html files of every terrain directory and rewrites naming.lst in one pass
+
+    naming.lst entries are deduplicated on the way, files that naming.lst doesn't know of are added to it.
+
+    Parameters
+    ----------
+    naming_file : str, optional
+        path of the naming.lst
+
+    Returns
+    -------
+    Dict[str, str]
+        the renamed files as old path -> new path
+    """
+    renamed: Dict[str, str] = {}
+    new_name_by_old: Dict[Tuple[str, str], str] = {} # (directory, old filename) -> new filename
+    found: List[Tuple[str, str, str]] = [] # (title, directory, new filename) of every file found on disk
+    for terrain in TerrainType:
+        if not os.path.isdir(terrain.value):
+            continue
+        for filename in os.listdir(terrain.value):
+            stem = filename[:-len(HTML_SUFFIX)]
+            if not filename.endswith(HTML_SUFFIX) or not LEGACY_NAME_PATTERN.match(stem):
+                continue
+            title = decode_legacy_name(stem)
+            new_filename = f"{encode_name(title)}{HTML_SUFFIX}"
+            old_path = os.path.join(terrain.value, filename)
+            new_path = os.path.join(terrain.value, new_filename)
+            os.replace(old_path, new_path)
+            renamed[old_path] = new_path
+            new_name_by_old[(terrain.value, filename)] = new_filename
+            found.append((title, terrain.value, new_filename))
+
+    entries: Dict[Tuple[str, str], str] = {} # (title, directory) -> filename, insertion ordered and deduplicated
+    if os.path.exists(naming_file):
+        with open(naming_file, "r", encoding="utf-8") as naming:
+            for line in naming:
+                if not line.strip():
+                    continue
+                title, directory, filename = line.rstrip("\n").split(" -> ")
+                stem = filename[:-len(HTML_SUFFIX)]
+                if LEGACY_NAME_PATTERN.match(stem): # also covers entries whose file is gone already
+                    filename = new_name_by_old.get((directory, filename), f"{encode_name(decode_legacy_name(stem))}{HTML_SUFFIX}")
+                entries[(title, directory)] = filename
+    for title, directory, filename in found:
+        entries.setdefault((title, directory), filename)
+
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(naming_file)), suffix=".tmp")
+    with os.fdopen(tmp_fd, "w", encoding="utf-8") as naming:
+        naming.writelines(f"{title} -> {directory} -> {filename}\n" for (title, directory), filename in entries.items())
+    os.replace(tmp_path, naming_file)
+    return renamed
+
+
+def __main__():
+    """migrates the legacy files in the current working directory
+    """
+    renamed = migrate_legacy_files()
+    for old_path, new_path in renamed.items():
+        print(f"{old_path} -> {new_path}")
+    print(f"Renamed {len(renamed)} files")
+
+if __name__ == "__main__":
+    __main__()
@@ -0,0 +1,333 @@
+"""Local stand-in for the WarThunder Wiki, so the crawl can be run and load tested without the real one
+
+The synthetic wiki is built from the stored vehicle pages: every terrain that has stored pages gets its tech tree page
+(Ground_vehicles, Aviation, Fleet), a few nation category pages and any amount of made-up vehicles, each served
+with one of the stored pages of its terrain. Without any stored pages every vehicle is a ground vehicle with a
+minimal page.
+
+python fixture_wiki.py [--store page_store] [--vehicles 10000] [--port 8090] [--latency 0.02] [--error-rate 0.01] [--rate-limit 200]
+WTSCRAPER_BASE_URL=http://127.0.0.1:8090 python scrape_wt_wiki.py --crawl
+
+The served pages carry an ETag, so conditional requests get their 304 like on the wiki. Latency (exponentially
+distributed around the mean), errors (503) and a rate limit (429 with Retry-After) are injected on request.
+See bench_crawl for the load test running the crawl against it.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote, urlsplit
+
+from metrics import configure_logging, get_logger, get_metrics
+from page_store import DEFAULT_STORE_DIR, PageStore
+from terrain import TerrainType
+from wiki_api import TECH_TREE_PAGES
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8090
+DEFAULT_VEHICLES = 10000
+DEFAULT_NATIONS = 10 # per terrain
+TEMPLATES_PER_TERRAIN = 50 # stored pages read into memory, the vehicles take turns using them
+CATEGORY_NAMES = {TerrainType.GROUND: "Ground vehicles", TerrainType.AVIATION: "Aviation", TerrainType.NAVAL: "Fleet"}
+MINIMAL_PAGE = (
+    '<html><body><div class="mw-parser-output"><div class="general_info_name">{name}</div></div>'
+    '<div id="catlinks"><div class="mw-normal-catlinks"><a>Categories</a>: <ul><li><a>{category}</a></li></ul></div></div>'
+    '</body></html>'
+)
+
+logger = get_logger(__name__)
+
+
+class FixturePage():
+    """Body and validator of a served page
+    """
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes) -> None:
+        """
+        Parameters
+        ----------
+        body : bytes
+            the utf-8 encoded html
+        """
+        self.body: bytes = body
+        self.etag: str = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class SyntheticWiki():
+    """The pages of a made-up wiki, see the module description
+    """
+
+    def __init__(self, store: Optional[PageStore] = None, vehicles: int = DEFAULT_VEHICLES, nations: int = DEFAULT_NATIONS) -> None:
+        """
+        Parameters
+        ----------
+        store : Optional[PageStore], optional
+            page store holding the template pages, None uses the minimal page
+        vehicles : int, optional
+            amount of vehicles, spread evenly over the terrains and their nations
+        nations : int, optional
+            amount of nations per terrain
+        """
+        templates = _load_templates(store)
+        self.pages: Dict[str, FixturePage] = {} # path below the base URL -> page
+        self.vehicles: List[str] = []
+        terrains = list(templates)
+        for terrain_number, terrain in enumerate(terrains):
+            tech_tree = TECH_TREE_PAGES[terrain]
+            categories = [f"Category:Nation_{nation:02d}_{tech_tree}" for nation in range(1, nations + 1)]
+            category_members: Dict[str, List[str]] = {category: [] for category in categories}
+            for number in range(terrain_number, vehicles, len(terrains)):
+                vehicle = f"Synthetic_{terrain.name.lower()}_{number:05d}"
+                self.pages[vehicle] = templates[terrain][number % len(templates[terrain])]
+                category_members[categories[number % nations]].append(vehicle)
+                self.vehicles.append(vehicle)
+            self.pages[tech_tree] = FixturePage(_tech_tree_page(categories).encode("utf-8"))
+            for category, members in category_members.items():
+                self.pages[category] = FixturePage(_category_page(members).encode("utf-8"))
+        for terrain, tech_tree in TECH_TREE_PAGES.items(): # the crawl asks for every terrain, the empty ones list no nations
+            if terrain not in templates:
+                self.pages[tech_tree] = FixturePage(_tech_tree_page([]).encode("utf-8"))
+
+    def page(self, path: str) -> Optional[FixturePage]:
+        """looks up a page by its URL path
+
+        Parameters
+        ----------
+        path : str
+            path of the requested URL, e.g. /Category:Nation_01_Ground_vehicles
+
+        Returns
+        -------
+        Optional[FixturePage]
+            the page, None if the wiki doesn't have it
+        """
+        return self.pages.get(unquote(urlsplit(path).path).lstrip("/"))
+
+
+def _load_templates(store: Optional[PageStore]) -> Dict[TerrainType, List[FixturePage]]:
+    """reads up to TEMPLATES_PER_TERRAIN stored pages per terrain
+
+    Parameters
+    ----------
+    store : Optional[PageStore]
+        the page store, None or an empty one gives the minimal page for the ground vehicles only
+
+    Returns
+    -------
+    Dict[TerrainType, List[FixturePage]]
+        the template pages of every terrain that has stored pages
+    """
+    templates: Dict[TerrainType, List[FixturePage]] = {}
+    if store is not None:
+        for terrain in TerrainType:
+            for vehicle in store.vehicles(terrain=terrain)[:TEMPLATES_PER_TERRAIN]:
+                content = store.get(vehicle)
+                if content is not None:
+                    templates.setdefault(terrain, []).append(FixturePage(content.encode("utf-8")))
+    if not templates:
+        logger.warning("no stored pages, serving a minimal page for every vehicle")
+        page = MINIMAL_PAGE.format(name="Synthetic vehicle", category=CATEGORY_NAMES[TerrainType.GROUND])
+        templates[TerrainType.GROUND] = [FixturePage(page.encode("utf-8"))]
+    return templates
+
+
+def _tech_tree_page(categories: List[str]) -> str:
+    # like the wiki: per nation a flag link and a name link in the first row of the table
+    cells = "".join(f'<td><a href="/{quote(category)}"><img alt=""/></a><a href="/{quote(category)}">{" ".join(category[len("Category:"):].split("_")[:2])}</a></td>'
+                    for category in categories)
+    return f'<html><body><div class="mw-parser-output"><table class="wt-class-table"><tr>{cells}</tr></table></div></body></html>'
+
+
+def _category_page(vehicles: List[str]) -> str:
+    items = "".join(f'<li><a href="/{quote(vehicle)}" title="{vehicle}">{vehicle}</a></li>' for vehicle in vehicles)
+    return f'<html><body><div class="mw-category"><div class="mw-category-group"><h3>S</h3><ul>{items}</ul></div></div></body></html>'
+
+
+class TokenBucket():
+    """Admits requests up to a rate, with bursts of up to one second worth of requests
+    """
+
+    def __init__(self, rate: float) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            requests per second
+        """
+        self.rate: float = rate
+        self.capacity: float = max(1.0, rate)
+        self._tokens: float = self.capacity
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """takes a token if there is one
+
+        Returns
+        -------
+        bool
+            the request is admitted
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class FixtureWikiHandler(BaseHTTPRequestHandler):
+    """Serves the pages of the servers SyntheticWiki
+    """
+    protocol_version = "HTTP/1.1" # keep-alive, like the wiki, so the fetchers connection pool is exercised
+    server: "FixtureWiki"
+
+    def log_message(self, format, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _respond(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        if body:
+            self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+        metrics = get_metrics()
+        metrics.increment("fixture_requests", status=status)
+        metrics.increment("fixture_bytes", len(body))
+
+    def do_GET(self) -> None:
+        fixture = self.server
+        if fixture.limiter is not None and not fixture.limiter.take():
+            self._respond(429, headers={"Retry-After": "1"})
+            return
+        if fixture.latency:
+            time.sleep(fixture.random.expovariate(1 / fixture.latency))
+        if fixture.error_rate and fixture.random.random() < fixture.error_rate:
+            self._respond(503)
+            return
+        page = fixture.wiki.page(self.path)
+        if page is None:
+            self._respond(404)
+        elif self.headers.get("If-None-Match") == page.etag:
+            self._respond(304, headers={"ETag": page.etag})
+        else:
+            self._respond(200, body=page.body, headers={"ETag": page.etag})
+
+    do_HEAD = do_GET
+
+
+class FixtureWiki(ThreadingHTTPServer):
+    """HTTP server of a SyntheticWiki with optional latency, errors and rate limit
+
+    with FixtureWiki(SyntheticWiki(store)) as fixture:
+        scrape_wt_wiki.BASE_URL = fixture.url
+    """
+    daemon_threads = True
+
+    def __init__(self, wiki: SyntheticWiki, host: str = DEFAULT_HOST, port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: float = 0.0, seed: Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        wiki : SyntheticWiki
+            the served pages
+        host : str, optional
+            address to listen on
+        port : int, optional
+            port to listen on, 0 picks a free one
+        latency : float, optional
+            mean seconds added to every request, 0 answers right away
+        error_rate : float, optional
+            share of the requests answered with 503
+        rate_limit : float, optional
+            requests per second, more are answered with 429, 0 disables the limit
+        seed : Optional[int], optional
+            seed of the injected latency and errors
+        """
+        super().__init__((host, port), FixtureWikiHandler)
+        self.wiki: SyntheticWiki = wiki
+        self.latency: float = latency
+        self.error_rate: float = error_rate
+        self.limiter: Optional[TokenBucket] = TokenBucket(rate_limit) if rate_limit else None
+        self.random = random.Random(seed)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """the base URL of the fixture, the stand-in for scrape_wt_wiki.BASE_URL
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """serves in a background thread
+
+        Returns
+        -------
+        str
+            the base URL
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name="fixture-wiki", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """stops serving and closes the socket
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "FixtureWiki":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def __main__():
+    """serves a synthetic wiki until interrupted
+    """
+    parser = argparse.ArgumentParser(description="Serves a synthetic WarThunder Wiki built from the stored pages")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store holding the template pages")
+    parser.add_argument("--vehicles", type=int, default=DEFAULT_VEHICLES, help="amount of synthetic vehicles")
+    parser.add_argument("--nations", type=int, default=DEFAULT_NATIONS, help="amount of nations per terrain")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before answering with 429, 0 disables the limit")
+    parser.add_argument("--seed", type=int, help="seed of the injected latency and errors")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    store = PageStore(root=args.store) if os.path.isdir(args.store) else None
+    wiki = SyntheticWiki(store=store, vehicles=args.vehicles, nations=args.nations)
+    fixture = FixtureWiki(wiki=wiki, host=args.host, port=args.port, latency=args.latency, error_rate=args.error_rate,
+                          rate_limit=args.rate_limit, seed=args.seed)
+    print(f"Serving {len(wiki.vehicles)} vehicles at {fixture.url}, crawl it with WTSCRAPER_BASE_URL={fixture.url}")
+    try:
+        fixture.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fixture.server_close()
+
+if __name__ == "__main__":
+    __main__()
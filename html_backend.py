@@ -0,0 +1,140 @@
+"""Selects the HTML parser used by the scraper and the ground parser
+
+html.parser : BeautifulSoup's pure Python tree builder, always available (default)
+lxml        : BeautifulSoup on top of lxml's C parser, several times faster
+selectolax  : lxml for the BeautifulSoup based parsing, plus selectolax CSS selectors for the hot extraction
+              functions of the scraper (nations, category listings, terrain)
+
+The backend can be set with set_backend() or the WTSCRAPER_HTML_BACKEND environment variable.
+"""
+
+import os
+from typing import List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml # noqa: F401 # only checked for availability, BeautifulSoup imports it itself
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser # selectolax < 1.0 only ships the modest engine
+    except ImportError:
+        SelectolaxParser = None
+
+HTML_PARSER = "html.parser"
+LXML = "lxml"
+SELECTOLAX = "selectolax"
+BACKENDS = (HTML_PARSER, LXML, SELECTOLAX)
+
+_backend: str = HTML_PARSER
+
+
+def available_backends() -> List[str]:
+    """lists the backends that can be used with the installed packages
+
+    Returns
+    -------
+    List[str]
+        names of the usable backends
+    """
+    backends = [HTML_PARSER]
+    if HAS_LXML:
+        backends.append(LXML)
+        if SelectolaxParser is not None:
+            backends.append(SELECTOLAX)
+    return backends
+
+
+def set_backend(backend: str) -> None:
+    """sets the process-wide backend
+
+    Parameters
+    ----------
+    backend : str
+        one of BACKENDS
+
+    Raises
+    ------
+    ValueError
+        the backend is unknown or its package isn't installed
+    """
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown HTML backend {backend}, expected one of {', '.join(BACKENDS)}")
+    if backend not in available_backends():
+        raise ValueError(f"HTML backend {backend} isn't installed")
+    _backend = backend
+
+
+def get_backend() -> str:
+    """returns the process-wide backend
+
+    Returns
+    -------
+    str
+        one of BACKENDS
+    """
+    return _backend
+
+
+def use_selectolax(backend: Optional[str] = None) -> bool:
+    """checks if the hot extraction functions should use selectolax
+
+    Parameters
+    ----------
+    backend : Optional[str], optional
+        overrides the process-wide backend
+
+    Returns
+    -------
+    bool
+        selectolax is selected
+    """
+    return (backend or _backend) == SELECTOLAX
+
+
+def make_soup(content: str, parse_only: Optional[SoupStrainer] = None, backend: Optional[str] = None) -> BeautifulSoup:
+    """parses html with the BeautifulSoup tree builder of the selected backend
+
+    Parameters
+    ----------
+    content : str
+        the html to parse
+    parse_only : Optional[SoupStrainer], optional
+        only keep the matching parts of the document
+    backend : Optional[str], optional
+        overrides the process-wide backend
+
+    Returns
+    -------
+    BeautifulSoup
+        the parsed document
+    """
+    features = HTML_PARSER if (backend or _backend) == HTML_PARSER else LXML # selectolax has no BeautifulSoup tree builder
+    return BeautifulSoup(content, features, parse_only=parse_only)
+
+
+def selectolax_tree(content: str):
+    """parses html with selectolax
+
+    Parameters
+    ----------
+    content : str
+        the html to parse
+
+    Returns
+    -------
+    selectolax.lexbor.LexborHTMLParser
+        the parsed document
+    """
+    return SelectolaxParser(content)
+
+
+if os.environ.get("WTSCRAPER_HTML_BACKEND"):
+    set_backend(os.environ["WTSCRAPER_HTML_BACKEND"])
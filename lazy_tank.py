@@ -0,0 +1,196 @@
+"""Lazily parsed ground vehicles
+
+parse_ground_vehicle runs every sub-parser, including the armament and ammunition tables, even if the caller only
+needs a few general values. A LazyTank keeps a reference to the stored page instead and runs a sub-parser (see the
+groups of page_sections) the first time one of its attributes is read, the result is cached on the vehicle:
+
+tank = LazyTank("Maus")
+tank.battle_rating  # parses the general info only
+tank.armaments      # parses the page and the armaments, the general info is already there
+
+The general info is read from a small index of its own elements, so listings over the whole store (name, nation,
+rank, battle rating, class) never build the full page or touch the tables. The first access to another group indexes
+the full page and replays the general info on it first, that way every group sees the same tree as in a full parse
+and the values are identical to parse_ground_vehicle.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from bs4 import SoupStrainer
+from dom_index import ClassIndex
+from html_backend import make_soup
+from metrics import configure_logging, get_metrics
+from page_sections import GROUPS
+from page_store import DEFAULT_STORE_DIR, PageStore, get_page_store
+from serialization import to_primitive
+from tanks import Tank
+from terrain import TerrainType
+from text_normalization import normalize_page
+from wt_wiki_ground_parser import index_ground_page
+
+GENERAL = "general"
+GENERAL_CLASS_PREFIX = "general_info_"
+GENERAL_MARKERS = ("premium", "squadron")
+ATTRIBUTE_GROUPS: Dict[str, str] = {attribute: group for group, (_, attributes) in GROUPS.items() for attribute in attributes}
+DEFAULT_FIELDS = ("name", "nation", "rank", "battle_rating", "vehicle_class", "is_premium", "is_squadron")
+
+
+def _is_general_class(class_name: Optional[str]) -> bool:
+    return class_name is not None and (class_name.startswith(GENERAL_CLASS_PREFIX) or class_name in GENERAL_MARKERS)
+
+
+class LazyTank():
+    """A ground vehicle whose sections are parsed on first access
+
+    Reads like a Tank, but is read-only. to_tank() parses the rest of the page and returns the plain Tank.
+    """
+    __slots__ = ("vehicle", "_content", "_store", "_backend", "_tank", "_index", "_parsed")
+
+    def __init__(self, vehicle: str, content: Optional[str] = None, store: Optional[PageStore] = None, backend: Optional[str] = None) -> None:
+        """
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle in the page store
+        content : Optional[str], optional
+            html of the page, by default it is read from the store on first access
+        store : Optional[PageStore], optional
+            the page store holding the page, defaults to the shared one
+        backend : Optional[str], optional
+            HTML parser to use, defaults to the process-wide one of html_backend
+        """
+        self.vehicle: str = vehicle
+        self._content: Optional[str] = content
+        self._store: Optional[PageStore] = store
+        self._backend: Optional[str] = backend
+        self._tank: Optional[Tank] = None
+        self._index: Optional[ClassIndex] = None # the full page, only built once a group besides the general info is needed
+        self._parsed: List[str] = []
+
+    @property
+    def parsed_groups(self) -> List[str]:
+        """the groups parsed so far, in parsing order
+
+        Returns
+        -------
+        List[str]
+            group names, see page_sections.GROUPS
+        """
+        return [group for group in GROUPS if group in self._parsed]
+
+    def _page(self) -> str:
+        if self._content is None:
+            self._content = (self._store or get_page_store()).get(self.vehicle)
+            if self._content is None:
+                raise KeyError(f"{self.vehicle} is not stored")
+        return self._content
+
+    def _parse(self, group: str) -> None:
+        """runs the sub-parser of a group, unless it already ran
+
+        Parameters
+        ----------
+        group : str
+            one of page_sections.GROUPS
+        """
+        if group in self._parsed:
+            return
+        metrics = get_metrics()
+        if group == GENERAL and self._index is None:
+            with metrics.timer("parse", stage="index_general"):
+                index = ClassIndex(make_soup(normalize_page(self._page()), parse_only=SoupStrainer(class_=_is_general_class), backend=self._backend))
+        else:
+            if self._index is None:
+                with metrics.timer("parse", stage="index"):
+                    self._index = index_ground_page(response_content=self._page(), backend=self._backend)
+                self._parsed.clear() # replays the general info, it removes the premium and squadron markers from the tree
+            index = self._index
+            if group != GENERAL:
+                self._parse(GENERAL)
+        if not self._parsed: # a fresh vehicle, or the general info is replayed on the full page
+            self._tank = Tank(name=index.find("general_info_name").text.strip())
+        sub_parser = GROUPS[group][0]
+        with metrics.timer("parse", stage=sub_parser.__name__):
+            sub_parser(tank=self._tank, index=index)
+        self._parsed.append(group)
+        if len(self._parsed) == len(GROUPS): # nothing left to parse, let go of the page
+            self._content = None
+            self._index = None
+
+    def __getattr__(self, name: str) -> Any:
+        group = ATTRIBUTE_GROUPS.get(name)
+        if group is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        self._parse(group)
+        return getattr(self._tank, name)
+
+    def to_tank(self) -> Tank:
+        """parses the remaining groups
+
+        Returns
+        -------
+        Tank
+            the fully parsed vehicle
+        """
+        for group in GROUPS:
+            self._parse(group)
+        return self._tank
+
+    def __str__(self) -> str:
+        return self.to_tank().__str__()
+
+    def __repr__(self) -> str:
+        return f"LazyTank({self.vehicle!r}, parsed={self.parsed_groups})"
+
+
+def lazy_ground_vehicles(vehicles: Optional[Iterable[str]] = None, store: Optional[PageStore] = None,
+                         backend: Optional[str] = None) -> Iterator[LazyTank]:
+    """wraps stored ground vehicles without parsing anything yet
+
+    Parameters
+    ----------
+    vehicles : Optional[Iterable[str]], optional
+        names of the vehicles, defaults to every stored ground vehicle
+    store : Optional[PageStore], optional
+        the page store holding the pages, defaults to the shared one
+    backend : Optional[str], optional
+        HTML parser to use, defaults to the process-wide one of html_backend
+
+    Yields
+    ------
+    Iterator[LazyTank]
+        one lazy vehicle per name
+    """
+    store = store or get_page_store()
+    for vehicle in vehicles if vehicles is not None else store.vehicles(terrain=TerrainType.GROUND):
+        yield LazyTank(vehicle=vehicle, store=store, backend=backend)
+
+
+def __main__():
+    """lists some values of every stored (or the given) ground vehicle as CSV
+    """
+    parser = argparse.ArgumentParser(description="Lists stored ground vehicles, only the sections holding the requested fields are parsed")
+    parser.add_argument("vehicles", nargs="*", help="vehicles to list, defaults to every stored ground vehicle")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--fields", nargs="+", choices=list(ATTRIBUTE_GROUPS), default=list(DEFAULT_FIELDS), metavar="FIELD",
+                        help=f"fields to list, defaults to {' '.join(DEFAULT_FIELDS)}")
+    parser.add_argument("--log-level", default="WARNING", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["vehicle", *args.fields])
+    for tank in lazy_ground_vehicles(vehicles=args.vehicles or None, store=PageStore(root=args.store)):
+        try:
+            values = [to_primitive(getattr(tank, field)) for field in args.fields]
+        except Exception as error:
+            print(f"Parsing failed: {tank.vehicle}: {error!r}", file=sys.stderr)
+            continue
+        writer.writerow([tank.vehicle, *(json.dumps(value) if isinstance(value, (dict, list)) else value for value in values)])
+
+if __name__ == "__main__":
+    __main__()
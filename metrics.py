@@ -0,0 +1,405 @@
+"""Logging, counters and timers of the scraper and the parser
+
+Every module logs through get_logger(__name__) (below the "wtscraper" logger) instead of printing, the CLIs pick
+the level with configure_logging. Counters and timers are collected by the process-wide Metrics of get_metrics():
+
+increment("http_requests", status=...)      : requests sent to the wiki
+increment("http_bytes")                     : bytes received
+observe("http_request", seconds)            : latency of the requests
+observe("parse", seconds, stage=...)        : time per parser stage
+increment("parser_warnings", kind=..., text=...) : unknown features, stabilizers, vehicle classes, ...
+
+Metrics.export writes them as Prometheus text (*.prom, counters as wtscraper_<name>_total and timers as histograms
+wtscraper_<name>_seconds) or as JSON (anything else). Worker processes send theirs to the parent with drain()/merge().
+
+Profiling is opt-in, set_profiling(directory) writes one cProfile (.prof) or pyinstrument (.html) profile per
+parsed vehicle, see profile_vehicle.
+"""
+
+import contextlib
+import cProfile
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+ROOT_LOGGER = "wtscraper"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf) # seconds
+CPROFILE = "cprofile"
+PYINSTRUMENT = "pyinstrument"
+PROFILERS = (CPROFILE, PYINSTRUMENT)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def get_logger(name: str) -> logging.Logger:
+    """returns the logger of a module
+
+    Parameters
+    ----------
+    name : str
+        the modules __name__
+
+    Returns
+    -------
+    logging.Logger
+        child of the "wtscraper" logger
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """sets up logging to stderr for the CLIs
+
+    Parameters
+    ----------
+    level : str, optional
+        DEBUG, INFO, WARNING or ERROR
+    """
+    logging.basicConfig(format="%(asctime)s %(levelname)-7s %(name)s: %(message)s", level=logging.WARNING)
+    logging.getLogger(ROOT_LOGGER).setLevel(level.upper())
+
+
+class Metrics():
+    """Thread-safe counters and histograms, identified by name and labels
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {} # bucket counts followed by sum and count
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """adds to a counter
+
+        Parameters
+        ----------
+        name : str
+            name of the counter
+        value : float, optional
+            amount to add
+        **labels
+            e.g. status=200
+        """
+        key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """records a duration in a histogram
+
+        Parameters
+        ----------
+        name : str
+            name of the histogram
+        seconds : float
+            the duration
+        **labels
+            e.g. stage="parse_vehicle_specs"
+        """
+        key = (name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0.0] * (len(BUCKETS) + 2)
+            for position, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[position] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """times the enclosed block into a histogram
+
+        Parameters
+        ----------
+        name : str
+            name of the histogram
+        **labels
+            e.g. stage="index"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, List[List[Any]]]:
+        """returns a JSON compatible copy of every counter and histogram
+
+        Returns
+        -------
+        Dict[str, List[List[Any]]]
+            {"counters": [[name, labels, value], ...], "histograms": [[name, labels, [bucket counts..., sum, count]], ...]}
+        """
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in sorted(self._counters.items())],
+                "histograms": [[name, dict(labels), list(values)] for (name, labels), values in sorted(self._histograms.items())],
+            }
+
+    def quantile(self, name: str, q: float, **labels: Any) -> Optional[float]:
+        """estimates a quantile of a histogram from its buckets, like histogram_quantile of Prometheus
+
+        Parameters
+        ----------
+        name : str
+            name of the histogram
+        q : float
+            the quantile, between 0 and 1
+        **labels
+            only the histogram with these labels, by default the histograms of every label are added up
+
+        Returns
+        -------
+        Optional[float]
+            seconds, interpolated within the bucket holding the quantile, None without any observations
+        """
+        wanted = tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+        buckets = [0.0] * len(BUCKETS)
+        with self._lock:
+            for (histogram_name, histogram_labels), values in self._histograms.items():
+                if histogram_name == name and (not labels or histogram_labels == wanted):
+                    buckets = [total + count for total, count in zip(buckets, values)]
+        rank = q * sum(buckets)
+        if not rank:
+            return None
+        cumulative, lower = 0.0, 0.0
+        for bound, count in zip(BUCKETS, buckets):
+            if cumulative + count >= rank and count:
+                if bound == math.inf: # above the largest bucket, that bound is all we know
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return lower
+
+    def drain(self) -> Dict[str, List[List[Any]]]:
+        """returns the snapshot and starts over, used by worker processes reporting to their parent
+
+        Returns
+        -------
+        Dict[str, List[List[Any]]]
+            see snapshot
+        """
+        with self._lock:
+            snapshot = {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, dict(labels), list(values)] for (name, labels), values in self._histograms.items()],
+            }
+            self._counters.clear()
+            self._histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, List[List[Any]]]) -> None:
+        """adds the values of another snapshot, e.g. of a worker process
+
+        Parameters
+        ----------
+        snapshot : Dict[str, List[List[Any]]]
+            see snapshot
+        """
+        with self._lock:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                self._counters[key] = self._counters.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                histogram = self._histograms.setdefault(key, [0.0] * len(values))
+                for position, value in enumerate(values):
+                    histogram[position] += value
+
+    def to_prometheus(self) -> str:
+        """formats the metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        str
+            counters as <name>_total, histograms as <name>_seconds_bucket/_sum/_count
+        """
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for name, labels, value in snapshot["counters"]:
+            metric = f"{ROOT_LOGGER}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        for name, labels, values in snapshot["histograms"]:
+            metric = f"{ROOT_LOGGER}_{name}_seconds"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0.0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf' if bound == math.inf else f'{bound:g}')} {cumulative:g}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, Any]:
+        """formats the metrics as JSON with the usual summary values
+
+        Returns
+        -------
+        Dict[str, Any]
+            {"counters": [{name, labels, value}], "timers": [{name, labels, count, total, mean, buckets}]}
+        """
+        snapshot = self.snapshot()
+        timers = []
+        for name, labels, values in snapshot["histograms"]:
+            count = values[-1]
+            timers.append({
+                "name": name, "labels": labels, "count": count, "total": values[-2], "mean": values[-2] / count if count else 0.0,
+                "buckets": {("+Inf" if bound == math.inf else f"{bound:g}"): bucket for bound, bucket in zip(BUCKETS, values)},
+            })
+        return {
+            "counters": [{"name": name, "labels": labels, "value": value} for name, labels, value in snapshot["counters"]],
+            "timers": timers,
+        }
+
+    def export(self, filename: str) -> None:
+        """writes the metrics to a file, atomically replacing the previous export
+
+        Parameters
+        ----------
+        filename : str
+            *.prom gets the Prometheus text format (e.g. for the node exporters textfile collector), anything else JSON
+        """
+        text = self.to_prometheus() if filename.endswith(".prom") else json.dumps(self.to_json(), indent=2)
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(text)
+        os.replace(tmp_filename, filename)
+
+
+def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+    """formats labels as {name="value",...}
+
+    Parameters
+    ----------
+    labels : Dict[str, str]
+        the labels
+    **extra
+        additional labels, e.g. le for histogram buckets
+
+    Returns
+    -------
+    str
+        the label set, empty without labels
+    """
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    formatted = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        formatted.append(f'{name}="{value}"')
+    return "{" + ",".join(formatted) + "}"
+
+
+_METRICS: Optional[Metrics] = None
+_METRICS_LOCK = threading.Lock()
+
+def get_metrics() -> Metrics:
+    """returns the process-wide metrics
+
+    Returns
+    -------
+    Metrics
+        the shared metrics
+    """
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            _METRICS = Metrics()
+        return _METRICS
+
+
+_profile_dir: Optional[str] = None
+_profiler: str = CPROFILE
+
+def set_profiling(directory: Optional[str], profiler: str = CPROFILE) -> None:
+    """enables (or disables) a profile per parsed vehicle
+
+    Parameters
+    ----------
+    directory : Optional[str]
+        receives the profiles, None disables profiling
+    profiler : str, optional
+        one of PROFILERS, pyinstrument has to be installed
+
+    Raises
+    ------
+    ValueError
+        unknown or uninstalled profiler
+    """
+    global _profile_dir, _profiler
+    if profiler not in PROFILERS:
+        raise ValueError(f"unknown profiler {profiler}, expected one of {', '.join(PROFILERS)}")
+    if profiler == PYINSTRUMENT and pyinstrument is None:
+        raise ValueError("pyinstrument isn't installed")
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    _profile_dir = directory
+    _profiler = profiler
+
+
+def get_profiling() -> Tuple[Optional[str], str]:
+    """returns the profiling settings, e.g. to hand them to worker processes
+
+    Returns
+    -------
+    Tuple[Optional[str], str]
+        the profile directory (None if disabled) and the profiler
+    """
+    return _profile_dir, _profiler
+
+
+@contextlib.contextmanager
+def profile_vehicle(vehicle: str) -> Iterator[None]:
+    """profiles the enclosed block if profiling is enabled, otherwise does nothing
+
+    Parameters
+    ----------
+    vehicle : str
+        name of the vehicle, used for the profiles file name
+    """
+    if _profile_dir is None:
+        yield
+        return
+    from filename_encoding import encode_name # keeps the import out of the unprofiled path
+    filename = os.path.join(_profile_dir, encode_name(vehicle))
+    if _profiler == PYINSTRUMENT:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{filename}.html", "w", encoding="utf-8") as profile_file:
+                profile_file.write(profiler.output_html())
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{filename}.prof")
+
+
+if os.environ.get("WTSCRAPER_PROFILE_DIR"):
+    set_profiling(os.environ["WTSCRAPER_PROFILE_DIR"], os.environ.get("WTSCRAPER_PROFILER", CPROFILE))
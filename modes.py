@@ -0,0 +1,193 @@
+"""Compact storage of per-game-mode values for the vehicle models
+
+The models used to carry a small dict per value group ({"Arcade": ..., "Realistic": ..., "Simulator": ...}),
+15 of them per Tank alone. ModeField stores such a group as a plain tuple in a slot, indexed by a fixed tuple of
+enum keys, and hands out a ModeValues view that still behaves like the old dict (tank.battle_rating["Arcade"]).
+"""
+
+from collections.abc import Mapping
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Union
+
+
+class GameMode(Enum):
+    ARCADE = "Arcade"
+    REALISTIC = "Realistic"
+    SIMULATOR = "Simulator"
+
+
+class ArmourSide(Enum):
+    FRONT = "front"
+    SIDE = "side"
+    BACK = "back"
+
+
+class Gear(Enum):
+    FORWARD = "Forward"
+    BACK = "Back"
+
+
+class CrewSkill(Enum):
+    STOCK = "stock"
+    UPGRADED = "upgraded"
+    FULL = "full"
+    EXPERT = "expert"
+    ACES = "aces"
+
+
+class Guidance(Enum):
+    POSITIVE = "positive"
+    NEGATIVE = "negative"
+
+
+class PenetrationDistance(Enum):
+    M10 = "10"
+    M100 = "100"
+    M500 = "500"
+    M1000 = "1000"
+    M1500 = "1500"
+    M2000 = "2000"
+
+
+class RicochetChance(Enum):
+    NONE = "0%"
+    HALF = "50%"
+    ALWAYS = "100%"
+
+
+ALL_MODES = (GameMode.ARCADE, GameMode.REALISTIC, GameMode.SIMULATOR)
+DRIVING_MODES = (GameMode.REALISTIC, GameMode.ARCADE) # the wiki lists no simulator values for the mobility
+RELOAD_SKILLS = (CrewSkill.STOCK, CrewSkill.FULL, CrewSkill.EXPERT, CrewSkill.ACES) # reloads have no "upgraded" column
+
+Key = Union[Enum, str]
+
+
+class ModeField():
+    """Descriptor that stores a group of per-mode values as a tuple in the slot `_<name>`
+    """
+
+    def __init__(self, keys: Sequence[Enum], default: Any) -> None:
+        """
+        Parameters
+        ----------
+        keys : Sequence[Enum]
+            the keys of the group, their order is the tuples order
+        default : Any
+            initial value of every key
+        """
+        self.keys: Tuple[Enum, ...] = tuple(keys)
+        self.default: Tuple[Any, ...] = (default,) * len(self.keys)
+        self.positions: Dict[Key, int] = {}
+        for position, key in enumerate(self.keys):
+            self.positions[key] = position
+            self.positions[key.value] = position # the old dict keys keep working
+        self.slot: str = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.slot = f"_{name}"
+
+    def __get__(self, obj: Any, objtype: type = None) -> Union["ModeValues", "ModeField"]:
+        if obj is None:
+            return self
+        return ModeValues(field=self, obj=obj)
+
+    def __set__(self, obj: Any, value: Union[Mapping, Sequence]) -> None:
+        setattr(obj, self.slot, self.pack(value))
+
+    def pack(self, value: Union[Mapping, Sequence]) -> Tuple[Any, ...]:
+        """converts a dict (keyed by enum or by the old string keys) or a sequence into the stored tuple
+
+        Parameters
+        ----------
+        value : Union[Mapping, Sequence]
+            the new values, missing keys keep the default
+
+        Returns
+        -------
+        Tuple[Any, ...]
+            the values in key order
+        """
+        if isinstance(value, Mapping):
+            packed = list(self.default)
+            for key, item in value.items():
+                packed[self.positions[key]] = item
+            return tuple(packed)
+        if len(value) != len(self.keys):
+            raise ValueError(f"expected {len(self.keys)} values for {self.slot[1:]}, got {len(value)}")
+        return tuple(value)
+
+
+class ModeValues(Mapping):
+    """dict-like read/write view of a ModeField on an object, iterates over the old string keys
+    """
+    __slots__ = ("_field", "_obj")
+
+    def __init__(self, field: ModeField, obj: Any) -> None:
+        self._field = field
+        self._obj = obj
+
+    def values_tuple(self) -> Tuple[Any, ...]:
+        """returns the stored tuple
+
+        Returns
+        -------
+        Tuple[Any, ...]
+            the values in key order
+        """
+        return getattr(self._obj, self._field.slot)
+
+    def __getitem__(self, key: Key) -> Any:
+        return self.values_tuple()[self._field.positions[key]]
+
+    def __setitem__(self, key: Key, value: Any) -> None:
+        values = list(self.values_tuple())
+        values[self._field.positions[key]] = value
+        setattr(self._obj, self._field.slot, tuple(values))
+
+    def __iter__(self) -> Iterator[str]:
+        return (key.value for key in self._field.keys)
+
+    def __len__(self) -> int:
+        return len(self._field.keys)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class SlottedModel():
+    """Base of the slotted vehicle models, replaces the per-instance __dict__ with a dict-like summary
+    """
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls) -> List[str]:
+        """lists the public attributes of the model
+
+        Returns
+        -------
+        List[str]
+            attribute names in declaration order
+        """
+        names = []
+        for klass in reversed(cls.__mro__):
+            for slot in klass.__dict__.get("__slots__", ()):
+                field = getattr(cls, slot[1:], None) if slot.startswith("_") else None
+                names.append(slot[1:] if isinstance(field, ModeField) else slot)
+        return names
+
+    def as_dict(self) -> Dict[str, Any]:
+        """returns the set attributes, just like __dict__ did before the models got slotted
+
+        Returns
+        -------
+        Dict[str, Any]
+            attribute name -> value, ModeValues are converted into dicts
+        """
+        values = {}
+        for name in self.fields():
+            try:
+                value = getattr(self, name)
+            except AttributeError: # declared but never set, __dict__ didn't list those either
+                continue
+            values[name] = dict(value) if isinstance(value, ModeValues) else value
+        return values
@@ -0,0 +1,165 @@
+"""Splits a ground vehicle page into the sections the parser reads and re-parses only the changed ones
+
+Every section is hashed and keyed by the group of the sub-parser reading it:
+
+general       : every general_info_* block except the prices, the premium and squadron markers
+cost          : general_info_price_*
+specs         : the plain specs_info blocks (armour, repair cost, speed) and the mobility wikitable
+armaments     : the specs_info weapons blocks and every other wikitable
+features      : the feature_name entries
+modifications : the specs_mod_name entries
+
+If a page changed, only the groups with a changed, new or removed section are parsed again, on top of the
+previously stored vehicle. Changes of the general info also re-run the costs and specs, those depend on the
+premium flag. Anything else on the page (navigation, comments, media) doesn't cause any parsing at all.
+"""
+
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from bs4 import Tag
+from dom_index import ClassIndex
+from tanks import Tank
+from wt_wiki_ground_parser import (
+    index_ground_page, parse_vehicle_armaments, parse_vehicle_cost, parse_vehicle_general_info, parse_vehicle_modification_features,
+    parse_vehicle_specs, parse_vehicles_fetures
+)
+
+# group -> (sub-parser, attributes it sets), in parsing order
+GROUPS: Dict[str, Tuple[Callable[..., None], Tuple[str, ...]]] = {
+    "general": (parse_vehicle_general_info, ("name", "vehicle_class", "nation", "is_premium", "is_squadron", "rank", "battle_rating")),
+    "cost": (parse_vehicle_cost, ("cost", "research")),
+    "specs": (parse_vehicle_specs, (
+        "armour_hull", "armour_turret", "crew", "visibility", "repair_cost_stock", "repair_cost_upgraded", "total_cost_modifications_sl",
+        "total_cost_modifications_rp", "talisman_cost", "crew_training", "rewards_sl", "rewards_rp", "gears", "weight",
+        "max_speed_forward", "max_speed_reverse", "power_to_weight_stock", "power_to_weight_upgraded", "engine_power_stock",
+        "engine_power_upgraded"
+    )),
+    "armaments": (parse_vehicle_armaments, ("armaments",)),
+    "features": (parse_vehicles_fetures, ("is_amphibious", "era", "reverse_gearbox", "controlled_suspension")),
+    "modifications": (parse_vehicle_modification_features, (
+        "smokes", "ess", "artillery", "dozer_blade", "scouting", "scout_uav", "night_vision", "thermal_vision", "rangefinder",
+        "laser_rangefinder", "laser_warning_rangefinder"
+    )),
+}
+DEPENDENT_GROUPS = {"general": ("cost", "specs")}
+
+
+def hash_elements(elements: Iterable[Tag]) -> str:
+    """hashes the markup of some elements
+
+    Parameters
+    ----------
+    elements : Iterable[Tag]
+        the elements of a section
+
+    Returns
+    -------
+    str
+        hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for element in elements:
+        digest.update(str(element).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _wikitable_group(table: Tag) -> str:
+    headers = table.find_all("th")
+    if len(headers) > 1 and headers[1].text.strip() == "Max Speed (km/h)": # the only table parse_vehicle_specs reads
+        return "specs"
+    return "armaments"
+
+
+def section_hashes(index: ClassIndex) -> Dict[str, str]:
+    """hashes the sections of a page, has to run before the sub-parsers modify the tree
+
+    Parameters
+    ----------
+    index : ClassIndex
+        the page, see wt_wiki_ground_parser.index_ground_page
+
+    Returns
+    -------
+    Dict[str, str]
+        "<group>:<section>" -> hash
+    """
+    hashes = {}
+    for class_name in index.class_names(prefix="general_info_"):
+        group = "cost" if class_name.startswith("general_info_price_") else "general"
+        hashes[f"{group}:{class_name}"] = hash_elements(index.find_all(class_name))
+    for marker in ("premium", "squadron"):
+        if index.find(marker):
+            hashes[f"general:{marker}"] = marker # only its presence matters
+    for position, spec in enumerate(index.find_all("specs_info")):
+        group = "specs" if len(spec["class"]) == 1 else "armaments" # "specs_info weapons" lists the armaments
+        hashes[f"{group}:specs_info[{position}]"] = hash_elements([spec])
+    for position, table in enumerate(index.find_all("wikitable")):
+        hashes[f"{_wikitable_group(table)}:wikitable[{position}]"] = hash_elements([table])
+    hashes["features:feature_name"] = hash_elements(index.find_all("feature_name"))
+    hashes["modifications:specs_mod_name"] = hash_elements(index.find_all("specs_mod_name"))
+    return hashes
+
+
+def changed_groups(old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> List[str]:
+    """determines which sub-parsers have to run again
+
+    Parameters
+    ----------
+    old_hashes : Dict[str, str]
+        section hashes of the page the stored vehicle was parsed from
+    new_hashes : Dict[str, str]
+        section hashes of the current page
+
+    Returns
+    -------
+    List[str]
+        the groups to re-parse, in parsing order
+    """
+    groups = set()
+    for key in old_hashes.keys() | new_hashes.keys():
+        if old_hashes.get(key) != new_hashes.get(key):
+            group = key.split(":", 1)[0]
+            groups.add(group)
+            groups.update(DEPENDENT_GROUPS.get(group, ()))
+    return [group for group in GROUPS if group in groups]
+
+
+def reparse_vehicle(content: str, stored: Optional[Tank] = None, old_hashes: Optional[Dict[str, str]] = None,
+                    backend: Optional[str] = None) -> Tuple[Tank, Dict[str, str], List[str]]:
+    """parses the changed sections of a page and merges them into the stored vehicle
+
+    Parameters
+    ----------
+    content : str
+        html of the vehicles current wiki page
+    stored : Optional[Tank], optional
+        the vehicle as parsed from the previous page, None parses the whole page
+    old_hashes : Optional[Dict[str, str]], optional
+        section hashes of the previous page, None parses the whole page
+    backend : Optional[str], optional
+        HTML parser to use, defaults to the process-wide one of html_backend
+
+    Returns
+    -------
+    Tuple[Tank, Dict[str, str], List[str]]
+        the updated vehicle (the stored one if nothing relevant changed), the new section hashes and the re-parsed groups
+    """
+    index = index_ground_page(response_content=content, backend=backend)
+    hashes = section_hashes(index)
+    if stored is None or old_hashes is None:
+        groups = list(GROUPS)
+    else:
+        groups = changed_groups(old_hashes=old_hashes, new_hashes=hashes)
+        if not groups:
+            return stored, hashes, groups
+
+    reparsed = {attribute for group in groups for attribute in GROUPS[group][1]}
+    tank = Tank(name=index.find("general_info_name").text.strip())
+    if stored is not None:
+        for attribute in Tank.fields():
+            if attribute not in reparsed: # the re-parsed ones start from the defaults, just like a full parse
+                setattr(tank, attribute, getattr(stored, attribute))
+    for group in groups:
+        GROUPS[group][0](tank=tank, index=index)
+    return tank, hashes, groups
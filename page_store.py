@@ -0,0 +1,430 @@
+"""Compressed, content-addressed storage of the downloaded wiki pages
+
+Pages are saved as gzip compressed blobs named by the sha256 of their content, so identical pages are only stored once.
+A small SQLite index maps every vehicle to its terrain and blob, which replaces both the ordinal-named html files
+and the ever-growing naming.lst. The freshness of a page counts from when it was stored or last revalidated, see touch. The index is loaded into memory once when the store is opened and kept in sync
+on every write, so presence and freshness checks never touch the disk.
+
+page_store/
+    index.sqlite
+    blobs/<first two hex digits>/<sha256>.html.gz
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, TextIO
+
+from terrain import TerrainType
+
+DEFAULT_STORE_DIR = "page_store"
+COMPRESSION_LEVEL = 6 # higher levels barely shrink html any further but take a lot longer
+PRUNE_GRACE = 600 # seconds, younger blobs may belong to a put of another process that didn't commit its index row yet
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    vehicle TEXT PRIMARY KEY,
+    terrain TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_terrain ON pages (terrain);
+CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+"""
+
+
+class PageEntry(NamedTuple):
+    """Index entry of a stored page
+    """
+    terrain: TerrainType
+    sha256: str
+    stored_at: float # unix time the page was stored or last revalidated
+
+
+class PageStore():
+    """Deduplicating page storage with an SQLite index of vehicle -> terrain -> blob
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR) -> None:
+        """
+        Parameters
+        ----------
+        root : str, optional
+            directory holding the index and the blobs, created if missing
+        """
+        self.root: str = root
+        self.blob_dir: str = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock() # the crawl stores pages from several threads
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._entries: Dict[str, PageEntry] = {
+            vehicle: PageEntry(TerrainType(terrain), sha256, stored_at)
+            for vehicle, terrain, sha256, stored_at in self._db.execute("SELECT vehicle, terrain, sha256, stored_at FROM pages")
+        }
+
+    def _blob_path(self, sha256: str) -> str:
+        """returns the path of a blob
+
+        Parameters
+        ----------
+        sha256 : str
+            hash of the pages content
+
+        Returns
+        -------
+        str
+            path of the compressed blob
+        """
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}.html.gz")
+
+    def _write_blob(self, sha256: str, data: bytes) -> None:
+        """writes a blob atomically, existing blobs only get their modification time renewed, see prune
+
+        Parameters
+        ----------
+        sha256 : str
+            hash of the pages content
+        data : bytes
+            the uncompressed page
+        """
+        blob_path = self._blob_path(sha256)
+        try:
+            os.utime(blob_path) # same content, already stored, an unreferenced blob must survive the grace period of prune again
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+        try:
+            with os.fdopen(tmp_fd, "wb") as blob:
+                blob.write(gzip.compress(data, compresslevel=COMPRESSION_LEVEL))
+                blob.flush()
+                os.fsync(blob.fileno())
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, vehicle: str, terrain: TerrainType, content: str) -> str:
+        """stores the page of a vehicle, replacing a previously stored one
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+        terrain : TerrainType
+            terrain of the vehicle
+        content : str
+            html of the vehicles wiki page
+
+        Returns
+        -------
+        str
+            sha256 of the stored content
+        """
+        data = content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self._lock: # a prune must not run between writing the blob and committing the index row
+            self._write_blob(sha256=sha256, data=data) # the blob has to exist before the index points to it
+            entry = PageEntry(terrain, sha256, time.time())
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO pages (vehicle, terrain, sha256, stored_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (vehicle) DO UPDATE SET terrain = excluded.terrain, sha256 = excluded.sha256, stored_at = excluded.stored_at",
+                    (vehicle, terrain.value, entry.sha256, entry.stored_at)
+                )
+            self._entries[vehicle] = entry # only after the commit, so memory never claims more than the disk has
+        return sha256
+
+    def touch(self, vehicle: str) -> bool:
+        """marks the stored page of a vehicle as up to date, for pages the wiki reports as unchanged
+        so a max_age counts from the last revalidation instead of the last change
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+
+        Returns
+        -------
+        bool
+            False if the vehicle isn't stored
+        """
+        with self._lock:
+            entry = self._entries.get(vehicle)
+            if entry is None:
+                return False
+            entry = entry._replace(stored_at=time.time())
+            with self._db:
+                self._db.execute("UPDATE pages SET stored_at = ? WHERE vehicle = ?", (entry.stored_at, vehicle))
+            self._entries[vehicle] = entry
+        return True
+
+    def get(self, vehicle: str) -> Optional[str]:
+        """loads the stored page of a vehicle
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+
+        Returns
+        -------
+        Optional[str]
+            html of the vehicles wiki page, None if the vehicle isn't stored
+        """
+        entry = self.lookup(vehicle)
+        if entry is None:
+            return None
+        return self.read_blob(entry.sha256)
+
+    def read_blob(self, sha256: str) -> str:
+        """loads a page by its hash
+
+        Parameters
+        ----------
+        sha256 : str
+            hash of the pages content
+
+        Returns
+        -------
+        str
+            the uncompressed html
+        """
+        with open(self._blob_path(sha256), "rb") as blob:
+            return gzip.decompress(blob.read()).decode("utf-8")
+
+    def open_blob(self, sha256: str) -> TextIO:
+        """opens a page by its hash for reading it piece by piece
+
+        Parameters
+        ----------
+        sha256 : str
+            hash of the pages content
+
+        Returns
+        -------
+        TextIO
+            the uncompressed html as text stream, to be closed by the caller
+        """
+        return gzip.open(self._blob_path(sha256), "rt", encoding="utf-8")
+
+    def lookup(self, vehicle: str) -> Optional[PageEntry]:
+        """returns the index entry of a vehicle
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+
+        Returns
+        -------
+        Optional[PageEntry]
+            terrain, sha256 and the unix time the page was stored or revalidated at, None if the vehicle isn't stored
+        """
+        return self._entries.get(vehicle)
+
+    def has(self, vehicle: str, max_age: Optional[float] = None) -> bool:
+        """checks if a vehicle is stored (and fresh enough)
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+        max_age : Optional[float], optional
+            maximum age of the stored page in seconds, None accepts any age, see touch
+
+        Returns
+        -------
+        bool
+            vehicle is present or not
+        """
+        entry = self._entries.get(vehicle)
+        if entry is None:
+            return False
+        return max_age is None or time.time() - entry.stored_at <= max_age
+
+    def age(self, vehicle: str) -> Optional[float]:
+        """returns how long ago a vehicle was stored or revalidated
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+
+        Returns
+        -------
+        Optional[float]
+            age of the stored page in seconds, None if the vehicle isn't stored
+        """
+        entry = self._entries.get(vehicle)
+        if entry is None:
+            return None
+        return time.time() - entry.stored_at
+
+    def missing(self, vehicles: Iterable[str], max_age: Optional[float] = None) -> List[str]:
+        """filters the vehicles that aren't stored (or are too old)
+
+        Parameters
+        ----------
+        vehicles : Iterable[str]
+            names of the vehicles as used by the wiki
+        max_age : Optional[float], optional
+            maximum age of the stored pages in seconds, None accepts any age
+
+        Returns
+        -------
+        List[str]
+            the missing vehicles in their given order
+        """
+        return [vehicle for vehicle in vehicles if not self.has(vehicle, max_age=max_age)]
+
+    def vehicles(self, terrain: Optional[TerrainType] = None) -> List[str]:
+        """lists the stored vehicles
+
+        Parameters
+        ----------
+        terrain : Optional[TerrainType], optional
+            only list vehicles of this terrain
+
+        Returns
+        -------
+        List[str]
+            names of the stored vehicles
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        return sorted(vehicle for vehicle, entry in entries if terrain is None or entry.terrain == terrain)
+
+    def delete(self, vehicle: str) -> None:
+        """removes a vehicle from the index, its blob is only removed by prune
+
+        Parameters
+        ----------
+        vehicle : str
+            name of the vehicle as used by the wiki
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM pages WHERE vehicle = ?", (vehicle,))
+            self._entries.pop(vehicle, None)
+
+    def prune(self, grace: float = PRUNE_GRACE) -> int:
+        """deletes every blob no vehicle refers to anymore
+
+        The references are read from the index on disk rather than from memory, so pages other processes
+        stored since this store was opened are kept as well.
+
+        Parameters
+        ----------
+        grace : float, optional
+            blobs written or reused less than grace seconds ago are kept
+
+        Returns
+        -------
+        int
+            amount of deleted blobs
+        """
+        deleted = 0
+        with self._lock:
+            referenced = {sha256 for sha256, in self._db.execute("SELECT DISTINCT sha256 FROM pages")}
+            cutoff = time.time() - grace
+            for directory, _, filenames in os.walk(self.blob_dir):
+                for filename in filenames:
+                    if filename.endswith(".tmp") or filename.split(".")[0] in referenced: # .tmp files are blobs being written
+                        continue
+                    blob_path = os.path.join(directory, filename)
+                    try:
+                        if os.path.getmtime(blob_path) > cutoff:
+                            continue
+                        os.unlink(blob_path)
+                    except FileNotFoundError: # pruned by another process
+                        continue
+                    deleted += 1
+        return deleted
+
+    def import_legacy(self, naming_file: str = "naming.lst") -> Dict[str, str]:
+        """imports the html files listed by the old naming.lst ("name -> directory -> filename" per line)
+
+        Parameters
+        ----------
+        naming_file : str, optional
+            path of the naming.lst
+
+        Returns
+        -------
+        Dict[str, str]
+            imported vehicle names and their sha256, missing files are skipped
+        """
+        imported = {}
+        with open(naming_file, "r", encoding="utf-8") as naming:
+            entries = [line.rstrip("\n").split(" -> ") for line in naming if line.strip()]
+        for name, directory, filename in entries:
+            if directory.startswith("TerrainType."): # older scrapes wrote the enum instead of its value
+                directory = TerrainType[directory.split(".")[-1]].value
+            legacy_file = os.path.join(directory, filename)
+            if not os.path.exists(legacy_file):
+                continue
+            with open(legacy_file, "r", encoding="utf-8") as legacy:
+                imported[name] = self.put(vehicle=name, terrain=TerrainType(directory), content=legacy.read())
+        return imported
+
+    def close(self) -> None:
+        """closes the index
+        """
+        with self._lock:
+            self._db.close()
+
+
+_PAGE_STORE: Optional[PageStore] = None
+_PAGE_STORE_LOCK = threading.Lock()
+
+def get_page_store() -> PageStore:
+    """returns the shared page store, opening the default one if needed
+
+    Returns
+    -------
+    PageStore
+        the process-wide page store
+    """
+    global _PAGE_STORE
+    with _PAGE_STORE_LOCK:
+        if _PAGE_STORE is None:
+            _PAGE_STORE = PageStore()
+        return _PAGE_STORE
+
+def open_page_store(root: str) -> PageStore:
+    """replaces the shared page store with the one at root
+
+    Parameters
+    ----------
+    root : str
+        directory holding the index and the blobs
+
+    Returns
+    -------
+    PageStore
+        the new process-wide page store
+    """
+    global _PAGE_STORE
+    with _PAGE_STORE_LOCK:
+        if _PAGE_STORE is not None:
+            _PAGE_STORE.close()
+        _PAGE_STORE = PageStore(root=root)
+        return _PAGE_STORE
+
+
+def __main__():
+    """imports the legacy html files listed in naming.lst into the page store
+    """
+    imported = get_page_store().import_legacy()
+    print(f"Imported {len(imported)} pages into {get_page_store().root}")
+
+if __name__ == "__main__":
+    __main__()
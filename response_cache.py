@@ -0,0 +1,171 @@
+"""On-disk HTTP revalidation cache for wiki pages
+
+Remembers the ETag, Last-Modified and a content hash of every fetched URL, so the next request can be sent as
+a conditional GET. A "304 Not Modified" or a body with an unchanged hash means the stored page is still up to date
+and neither has to be rewritten nor re-parsed. Pages fetched through the wiki API (see wiki_api) record their
+revision ID instead, an unchanged revision isn't requested at all.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+import requests
+
+DEFAULT_CACHE_FILE = "response_cache.json"
+DEFAULT_AUTOSAVE = 100 # amount of updates after which the cache gets written to disk
+
+
+def content_hash(content: bytes) -> str:
+    """hashes a response body
+
+    Parameters
+    ----------
+    content : bytes
+        the raw response body
+
+    Returns
+    -------
+    str
+        sha256 hex digest of the body
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class ResponseCache():
+    """Thread-safe mapping of URL -> {etag, last_modified, sha256, revid} persisted as JSON
+    """
+
+    def __init__(self, filename: str = DEFAULT_CACHE_FILE, autosave: int = DEFAULT_AUTOSAVE) -> None:
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            path of the JSON file the cache is loaded from and saved to
+        autosave : int, optional
+            amount of updates after which the cache gets saved, 0 disables autosaving
+        """
+        self.filename: str = filename
+        self.autosave: int = autosave
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._dirty: int = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # keeps two autosaving threads from writing the same temp file
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="utf-8") as cache_file:
+                self._entries = json.load(cache_file)
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """builds the conditional request headers for an URL
+
+        Parameters
+        ----------
+        url : str
+            the URL that is about to be requested
+
+        Returns
+        -------
+        Dict[str, str]
+            If-None-Match/If-Modified-Since headers, empty for unknown URLs
+        """
+        with self._lock:
+            entry = self._entries.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url: str, response: requests.Response) -> bool:
+        """records the validators of a (non 304) response
+
+        Parameters
+        ----------
+        url : str
+            the requested URL
+        response : requests.Response
+            the wikis response
+
+        Returns
+        -------
+        bool
+            True if the body differs from the last recorded one
+        """
+        sha256 = content_hash(response.content)
+        with self._lock:
+            changed = self._entries.get(url, {}).get("sha256") != sha256
+            self._entries.setdefault(url, {}).update({ # keeps the revid of set_revision, the API mode relies on it
+                "etag": response.headers.get("ETag", ""),
+                "last_modified": response.headers.get("Last-Modified", ""),
+                "sha256": sha256
+            })
+            self._dirty += 1
+            autosave = self.autosave and self._dirty >= self.autosave
+        if autosave:
+            self.save()
+        return changed
+
+    def revision(self, url: str) -> Optional[int]:
+        """returns the wiki revision recorded for an URL by set_revision
+
+        Parameters
+        ----------
+        url : str
+            URL of the page
+
+        Returns
+        -------
+        Optional[int]
+            the revision ID, None if the page wasn't fetched through the API yet
+        """
+        with self._lock:
+            return self._entries.get(url, {}).get("revid")
+
+    def set_revision(self, url: str, revid: int) -> None:
+        """records the wiki revision of a page fetched through the API, see wiki_api
+
+        Parameters
+        ----------
+        url : str
+            URL of the page
+        revid : int
+            the revision ID the stored page was rendered from
+        """
+        with self._lock:
+            self._entries.setdefault(url, {})["revid"] = revid
+            self._dirty += 1
+            autosave = self.autosave and self._dirty >= self.autosave
+        if autosave:
+            self.save()
+
+    def forget(self, url: str) -> None:
+        """drops an URL, e.g. because storing its page failed, so the next request fetches it in full
+
+        Parameters
+        ----------
+        url : str
+            the URL to forget
+        """
+        with self._lock:
+            if self._entries.pop(url, None) is not None:
+                self._dirty += 1
+
+    def save(self) -> None:
+        """writes the cache to disk, atomically replacing the previous file
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.dumps(self._entries)
+                self._dirty = 0
+            tmp_filename = f"{self.filename}.tmp"
+            with open(tmp_filename, "w", encoding="utf-8") as cache_file:
+                cache_file.write(snapshot)
+                cache_file.flush()
+                os.fsync(cache_file.fileno())
+            os.replace(tmp_filename, self.filename)
+
@@ -0,0 +1,311 @@
+"""Runs a job on a cron-like schedule without polling
+
+The scheduler computes the next due time from the cron expression and sleeps until then, so the process idles
+between runs. A lock file (locked with flock, which the OS releases when its owner dies) keeps two schedulers or a manual
+run of changelog_updater from overlapping, and every run is timed and appended to a JSON lines file.
+
+Cron expressions have the usual five fields, minute hour day-of-month month day-of-week, each being `*`, a value,
+a range `a-b`, a step `*/n` or `a-b/n`, or a comma separated list of those. @hourly, @daily, @weekly and @monthly are
+accepted as shortcuts. Day-of-week counts from Sunday (0 or 7).
+"""
+
+import datetime
+import json
+import os
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from metrics import get_logger
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+FIELD_NAMES = ("minute", "hour", "day of month", "month", "day of week")
+MAX_SEARCH_DAYS = 366 * 5 # Feb 29th on a monday might take a few years
+
+logger = get_logger(__name__)
+
+
+def parse_cron_field(expression: str, minimum: int, maximum: int) -> Set[int]:
+    """expands a single field of a cron expression
+
+    Parameters
+    ----------
+    expression : str
+        the field, e.g. "*/15", "1-5" or "0,30"
+    minimum : int
+        smallest allowed value
+    maximum : int
+        largest allowed value
+
+    Returns
+    -------
+    Set[int]
+        the matching values
+
+    Raises
+    ------
+    ValueError
+        malformed field or values out of range
+    """
+    values = set()
+    for part in expression.split(","):
+        value_range, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if value_range == "*":
+            start, end = minimum, maximum
+        elif "-" in value_range:
+            start, end = (int(value) for value in value_range.split("-", 1))
+        else:
+            start = int(value_range)
+            end = maximum if step > 1 else start
+        if step < 1 or start < minimum or end > maximum or start > end:
+            raise ValueError(f"invalid cron field {expression}, values must be within {minimum}-{maximum}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule():
+    """A parsed cron expression
+    """
+
+    def __init__(self, expression: str) -> None:
+        """
+        Parameters
+        ----------
+        expression : str
+            five field cron expression or one of ALIASES
+
+        Raises
+        ------
+        ValueError
+            malformed expression
+        """
+        self.expression: str = expression
+        fields = ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"expected 5 cron fields ({', '.join(FIELD_NAMES)}), got {expression!r}")
+        minutes, hours, days, months, weekdays = (
+            parse_cron_field(field, *field_range) for field, field_range in zip(fields, FIELD_RANGES)
+        )
+        self.minutes: List[int] = sorted(minutes)
+        self.hours: Set[int] = hours
+        self.days: Set[int] = days
+        self.months: Set[int] = months
+        self.weekdays: Set[int] = {weekday % 7 for weekday in weekdays}
+        # like cron: if both day fields are restricted (not starting with *, unlike */2), a day matching either of them is due
+        self._any_day: bool = not fields[2].startswith("*") and not fields[4].startswith("*")
+
+    def _day_matches(self, day: datetime.date) -> bool:
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays # python counts from monday, cron from sunday
+        return (in_days or in_weekdays) if self._any_day else (in_days and in_weekdays)
+
+    def next_run(self, after: datetime.datetime) -> datetime.datetime:
+        """finds the next due time
+
+        Parameters
+        ----------
+        after : datetime.datetime
+            the search starts at the minute after this time
+
+        Returns
+        -------
+        datetime.datetime
+            the next matching minute
+
+        Raises
+        ------
+        ValueError
+            the expression never matches (e.g. "0 0 31 2 *")
+        """
+        candidate = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = candidate.date()
+        for _ in range(MAX_SEARCH_DAYS):
+            if day.month in self.months and self._day_matches(day):
+                start_hour = candidate.hour if day == candidate.date() else 0
+                for hour in range(start_hour, 24):
+                    if hour not in self.hours:
+                        continue
+                    start_minute = candidate.minute if (day, hour) == (candidate.date(), candidate.hour) else 0
+                    for minute in self.minutes:
+                        if minute >= start_minute:
+                            return datetime.datetime.combine(day, datetime.time(hour, minute), tzinfo=after.tzinfo)
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"cron expression {self.expression!r} never matches")
+
+
+class LockFile():
+    """Exclusive lock on a file holding the pid of its owner, the OS drops the lock when its owner dies
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Parameters
+        ----------
+        filename : str
+            path of the lock file
+        """
+        self.filename: str = filename
+        self.locked: bool = False
+        self._file = None
+
+    def acquire(self) -> bool:
+        """tries to take the lock
+
+        Returns
+        -------
+        bool
+            True if the lock is held now, False if another running process (or another LockFile) holds it
+        """
+        if self.locked:
+            return True
+        lock_file = open(self.filename, "a+")
+        lock_file.seek(0) # msvcrt locks from the current position
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid())) # only informative, the lock itself is what counts
+        lock_file.flush()
+        self._file = lock_file
+        self.locked = True
+        return True
+
+    def release(self) -> None:
+        """releases the lock if it is held, the file stays so every process keeps locking the same one
+        """
+        if self.locked:
+            self.locked = False
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "LockFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class JobRun(NamedTuple):
+    """Metrics of a single run
+    """
+    started: str
+    duration: float
+    cpu_time: float
+    ok: bool
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
+def run_job(job: Callable[[], Optional[Dict[str, Any]]], lock: LockFile) -> Optional[JobRun]:
+    """runs the job once while holding the lock
+
+    Parameters
+    ----------
+    job : Callable[[], Optional[Dict[str, Any]]]
+        the job, may return a summary that is recorded with the metrics
+    lock : LockFile
+        prevents overlapping runs
+
+    Returns
+    -------
+    Optional[JobRun]
+        metrics of the run, None if the lock was held by another process
+    """
+    if not lock.acquire():
+        return None
+    started = datetime.datetime.now().isoformat(timespec="seconds")
+    start, start_cpu = time.perf_counter(), time.process_time()
+    result, error = None, None
+    try:
+        result = job()
+    except Exception as exception:
+        error = repr(exception)
+    finally:
+        lock.release()
+    return JobRun(started=started, duration=time.perf_counter() - start, cpu_time=time.process_time() - start_cpu,
+                  ok=error is None, result=result, error=error)
+
+
+def record_run(run: JobRun, filename: Optional[str]) -> None:
+    """appends the metrics of a run to a JSON lines file
+
+    Parameters
+    ----------
+    run : JobRun
+        the metrics
+    filename : Optional[str]
+        path of the metrics file, None doesn't record anything
+    """
+    if filename is None:
+        return
+    with open(filename, "a", encoding="utf-8") as metrics_file:
+        metrics_file.write(json.dumps(run._asdict()) + "\n")
+
+
+def run_scheduler(schedule: CronSchedule, job: Callable[[], Optional[Dict[str, Any]]], lock_file: str, metrics_file: Optional[str] = None,
+                  run_now: bool = False, max_runs: Optional[int] = None, stop: Optional[threading.Event] = None) -> None:
+    """runs the job whenever it is due until stopped
+
+    Parameters
+    ----------
+    schedule : CronSchedule
+        when to run the job
+    job : Callable[[], Optional[Dict[str, Any]]]
+        the job, may return a summary that is recorded with the metrics
+    lock_file : str
+        path of the lock file shared by every process running the job
+    metrics_file : Optional[str], optional
+        JSON lines file receiving the metrics of every run
+    run_now : bool, optional
+        run once right away instead of waiting for the first due time
+    max_runs : Optional[int], optional
+        stop after this many runs, None runs forever
+    stop : Optional[threading.Event], optional
+        set it to stop the scheduler, SIGINT and SIGTERM set it when the scheduler runs in the main thread
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, lambda *_: stop.set())
+    lock = LockFile(filename=lock_file)
+    runs = 0
+    due = datetime.datetime.now() if run_now else schedule.next_run(datetime.datetime.now())
+    while not stop.is_set() and (max_runs is None or runs < max_runs):
+        wait = (due - datetime.datetime.now()).total_seconds()
+        if wait > 0:
+            stop.wait(wait) # wakes up early only when stopped, the loop re-checks the time after clock jumps
+            continue
+        run = run_job(job=job, lock=lock)
+        runs += 1
+        if run is None:
+            logger.warning("skipped the run due %s, %s is held by another process", f"{due:%Y-%m-%d %H:%M}", lock_file)
+        else:
+            record_run(run=run, filename=metrics_file)
+            log = logger.info if run.ok else logger.error
+            log("run started %s took %.1fs (%.1fs CPU), %s", run.started, run.duration, run.cpu_time, "ok" if run.ok else "failed: " + run.error)
+        due = schedule.next_run(datetime.datetime.now())
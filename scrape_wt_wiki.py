@@ -9,30 +9,81 @@ _type_
 
 # TODO:
 # add argparse
-# check for changelog
 # get updates
 # get fresh data and ignore local files 
 
 
 # import DB
-from enum import Enum
 import os
-from typing import Dict, List
-import requests
-from urllib.parse import quote
-from bs4 import BeautifulSoup, SoupStrainer, Tag
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+from bs4 import SoupStrainer, Tag
+from crawl_journal import DEFAULT_JOURNAL_FILE, CrawlJournal
+from fetch_policy import FetchPolicy
+from fetcher import DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT, configure_fetcher, get_fetcher
+from html_backend import available_backends, get_backend, make_soup, selectolax_tree, set_backend, use_selectolax
+from metrics import configure_logging, get_logger, get_metrics
+from page_store import get_page_store
+from response_cache import ResponseCache
+from stream_extract import extract_element, stream_element
+from terrain import TerrainType
+from wiki_api import WikiApi
 
 if os.name == "nt":
     SLASH = "\\"
 else:
     SLASH = "/"
 
-class TerrainType(Enum):
-    GROUND = "Earth"
-    NAVAL = "Not_Fire"
-    AVIATION = "Air"
+BASE_URL = os.environ.get("WTSCRAPER_BASE_URL", "https://wiki.warthunder.com").rstrip("/") # e.g. a fixture_wiki for offline crawls
+
+NATIONS_CLASS = "wt-class-table"
+CATEGORY_CLASS = "mw-category"
+CATEGORY_LINKS_CLASS = "mw-normal-catlinks"
+STREAM_DISCOVERY = True # stop downloading the discovery pages once their element was read
+
+CHANGELOG_DAYS = 30 # how long the wiki keeps its recent changes
+CHANGELOG_TIME_FORMAT = "%Y%m%d%H%M%S"
+CHANGELOG_OVERLAP = 60 # seconds before the checkpoint that are read again, changes can show up late or within the same second
+CHANGELOG_EXCLUDED_PREFIXES = ("(", "User:", "Template:", "File:", "Update")
+CHANGELOG_EXCLUDED_PARTS = ("(Family)",)
+
+logger = get_logger(__name__)
+
+
+class ChangelogEntry(NamedTuple):
+    """A changed page of the wiki
+    """
+    title: str
+    timestamp: str # YYYYMMDDHHMMSS, UTC, like the data-mw-ts of the recent changes
+    revid: Optional[int] = None # None for log entries (moves, deletions) and the grouped changes of the enhanced list
+
+
+class ChangelogGapError(RuntimeError):
+    """The last processed change is older than the wiki keeps its changes, some changes may be gone
+    """
+
+
+def get_discovery_element(url: str, class_name: str) -> str:
+    """requests a discovery page, only the element the crawl needs is downloaded and returned when streaming
+
+    Parameters
+    ----------
+    url : str
+        the URL to request
+    class_name : str
+        class of the element the page is requested for
+
+    Returns
+    -------
+    str
+        html of the element (or the whole page with STREAM_DISCOVERY disabled)
+    """
+    if not STREAM_DISCOVERY:
+        return get_fetcher().get_text(url)
+    return stream_element(url, class_name) or ""
 
-BASE_URL = f"https://wiki.warthunder.com"
 
 def get_aviation_nations() -> Dict[str, str]:
     """Requests aviation data for further parsing
@@ -43,8 +94,7 @@ def get_aviation_nations() -> Dict[str, str]:
         Dict with nation's name as key and their aviation tech tree URL as value
     """
     aviation_url = f"{BASE_URL}/Aviation"
-    content = requests.get(aviation_url).text
-    return get_nation(content=content)
+    return get_nation(content=get_discovery_element(aviation_url, NATIONS_CLASS))
 
 
 def get_ground_nations() -> Dict[str, str]:
@@ -56,8 +106,7 @@ def get_ground_nations() -> Dict[str, str]:
         Dict with nation's name as key and their ground tech tree URL as value
     """
     ground_url = f"{BASE_URL}/Ground_vehicles"
-    content = requests.get(ground_url).text
-    return get_nation(content=content)
+    return get_nation(content=get_discovery_element(ground_url, NATIONS_CLASS))
 
 
 def get_fleet_nations() -> Dict[str, str]:
@@ -69,8 +118,7 @@ def get_fleet_nations() -> Dict[str, str]:
         Dict with nation's name as key and their fleet tech tree URL as value
     """
     fleet_url = f"{BASE_URL}/Fleet"
-    content = requests.get(fleet_url).text
-    return get_nation(content=content)
+    return get_nation(content=get_discovery_element(fleet_url, NATIONS_CLASS))
 
 
 def get_nation(content: str) -> Dict[str, str]:
@@ -85,11 +133,26 @@ def get_nation(content: str) -> Dict[str, str]:
     -------
     Dict[str, str]
         Dict with nation's name as key and their tech tree URL as value
+
+    Raises
+    ------
+    ValueError
+        the page has no nations table, with every backend
     """
-    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer(class_="wt-class-table"))
-    nations_divs = soup.find_all("tr")[0].find_all("a")[1::2]
     url_list = {}
-    for div in nations_divs:
+    if use_selectolax():
+        nations_table = selectolax_tree(content).css_first(f".{NATIONS_CLASS}")
+        first_row = nations_table.css_first("tr") if nations_table is not None else None
+        if first_row is None:
+            raise ValueError(f"no {NATIONS_CLASS} table found")
+        for div in first_row.css("a")[1::2]:
+            url_list[div.text()] = f"{BASE_URL}{div.attributes['href']}"
+        return url_list
+    soup = make_soup(content, parse_only=SoupStrainer(class_=NATIONS_CLASS))
+    first_row = soup.find("tr")
+    if first_row is None:
+        raise ValueError(f"no {NATIONS_CLASS} table found")
+    for div in first_row.find_all("a")[1::2]:
         url_list[div.string] = f"{BASE_URL}{div['href']}"
     return url_list
 
@@ -107,19 +170,111 @@ def get_vehicles_by_nation(nation_url: str) -> Dict[str, str]:
     Dict[str, str]
         Dict containing a vehicles name as key and the corresponding URL as value
     """
-    content = requests.get(nation_url).text
-    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer(class_="mw-category"))
+    return parse_vehicles_by_nation(content=get_discovery_element(nation_url, CATEGORY_CLASS))
+
+
+def parse_vehicles_by_nation(content: str) -> Dict[str, str]:
+    """Parses the vehicle list of a nations category page
+
+    Parameters
+    ----------
+    content : str
+        html of a nations category page
+
+    Returns
+    -------
+    Dict[str, str]
+        Dict containing a vehicles name as key and the corresponding URL as value
+
+    Raises
+    ------
+    ValueError
+        a group of the category has no list or an entry has no link, with every backend
+    """
     vehicle_list = {}
+    if use_selectolax():
+        for group in selectolax_tree(content).css(f".{CATEGORY_CLASS} .mw-category-group"):
+            entries = group.css_first("ul")
+            if entries is None:
+                raise ValueError("category group without a list")
+            for list_entry in entries.iter():
+                link = list_entry.css_first("a")
+                if link is None:
+                    raise ValueError("category entry without a link")
+                vehicle_list[link.text()] = f"{BASE_URL}{link.attributes['href']}"
+        return vehicle_list
+    soup = make_soup(content, parse_only=SoupStrainer(class_=CATEGORY_CLASS))
     for group in soup.find_all(class_="mw-category-group"):
+        if group.ul is None:
+            raise ValueError("category group without a list")
         for list_entry in group.ul:
             if type(list_entry) == Tag:
+                if list_entry.a is None:
+                    raise ValueError("category entry without a link")
                 vehicle_list[list_entry.a.string] = f"{BASE_URL}{list_entry.a['href']}"
     return vehicle_list
 
+
+def get_vehicles_by_nations(nation_urls: Iterable[str]) -> Dict[str, str]:
+    """Parses the vehicles of many nations, requesting the category pages concurrently
+
+    Parameters
+    ----------
+    nation_urls : Iterable[str]
+        the URLs of the nations for any given environment type (air, ground, water)
+
+    Returns
+    -------
+    Dict[str, str]
+        Dict containing a vehicles name as key and the corresponding URL as value
+    """
+    vehicle_list = {}
+    fetch = lambda nation_url: get_discovery_element(nation_url, CATEGORY_CLASS)
+    for nation_url, content, error in get_fetcher().fetch_all(nation_urls, fetch=fetch):
+        if error is not None:
+            logger.error("%s failed: %r", nation_url, error)
+            continue
+        vehicle_list.update(parse_vehicles_by_nation(content=content))
+    return vehicle_list
+
+
+def get_vehicle_url(vehicle: str) -> str:
+    """builds the wiki URL of a vehicle
+
+    Parameters
+    ----------
+    vehicle : str
+        name of the vehicle as used by the wiki
+
+    Returns
+    -------
+    str
+        URL of the vehicles wiki page
+    """
+    return f"{BASE_URL}/{quote(vehicle)}"
+
+
+def vehicle_from_url(vehicle_url: str) -> str:
+    """extracts the vehicles name from its wiki URL, the reverse of get_vehicle_url
+
+    Parameters
+    ----------
+    vehicle_url : str
+        URL of the vehicles wiki page
+
+    Returns
+    -------
+    str
+        name of the vehicle as used by the wiki
+    """
+    return unquote(urlsplit(vehicle_url).path.lstrip("/"))
+
+
 def get_vehicle_specs(vehicle: str): # WIP
     """Grabs specific vehicles from the wiki, passes them to the parser and (pushes them to the DB)
 
-    Currently just saves the data to a html file for offline prosessing during developemnt.
+    Currently just saves the data to the page store for offline prosessing during developemnt.
+    Pages that didn't change since the last request are neither downloaded again nor rewritten.
 
     Parameters
     ----------
@@ -131,88 +286,344 @@ def get_vehicle_specs(vehicle: str): # WIP
     _type_ [Vehicle]
         Model of the specified Vehicle
     """
-    vehicle_url = f"https://wiki.warthunder.com/{quote(vehicle)}"
-    content = requests.get(vehicle_url).text
-    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer(class_="mw-normal-catlinks"))
-    directory = ""
-    if "ground" in soup.ul.li.string.lower():
-        directory = TerrainType.GROUND
-    elif "aviation" in soup.ul.li.string.lower():
-        directory = TerrainType.AVIATION
-    elif "fleet" in soup.ul.li.string.lower():
-        directory = TerrainType.NAVAL
+    vehicle_url = get_vehicle_url(vehicle)
+    content = get_fetcher().get_if_changed(vehicle_url)
+    if content is None: # unchanged since the last scrape
+        get_page_store().touch(vehicle)
+        return
+    store_or_forget(vehicle_url=vehicle_url, vehicle=vehicle, content=content)
+
+
+def get_vehicles_specs(vehicles: Iterable[str]) -> List[str]:
+    """Grabs many vehicles from the wiki concurrently and stores them, see get_vehicle_specs
+
+    Parameters
+    ----------
+    vehicles : Iterable[str]
+        names of the vehicles as used by the wiki
+
+    Returns
+    -------
+    List[str]
+        the vehicles that failed, the others are processed regardless
+    """
+    vehicle_by_url = {get_vehicle_url(vehicle): vehicle for vehicle in vehicles}
+    failed = []
+    for vehicle_url, content, error in get_fetcher().fetch_all(vehicle_by_url, if_changed=True):
+        vehicle = vehicle_by_url[vehicle_url]
+        if error is not None:
+            logger.error("%s failed: %r", vehicle, error)
+            failed.append(vehicle)
+        elif content is None: # unchanged since the last scrape
+            get_page_store().touch(vehicle)
+        else:
+            try:
+                store_or_forget(vehicle_url=vehicle_url, vehicle=vehicle, content=content)
+            except Exception as error:
+                logger.error("%s failed to store: %r", vehicle, error)
+                failed.append(vehicle)
+    return failed
+
+
+def store_or_forget(vehicle_url: str, vehicle: str, content: str) -> None:
+    """stores a vehicle page, dropping it from the revalidation cache if that fails
+    so the next scrape doesn't consider the missing page as unchanged
+
+    Parameters
+    ----------
+    vehicle_url : str
+        URL of the vehicles wiki page
+    vehicle : str
+        name of the vehicle as used by the wiki
+    content : str
+        html of the vehicles wiki page
+    """
+    try:
+        store_vehicle_page(vehicle=vehicle, content=content)
+    except Exception:
+        if get_fetcher().cache is not None:
+            get_fetcher().cache.forget(vehicle_url)
+        raise
+
+
+def store_vehicle_page(vehicle: str, content: str, terrain: Optional[TerrainType] = None) -> None:
+    """Sorts a downloaded vehicle page by its terrain and saves it to the page store
+
+    Parameters
+    ----------
+    vehicle : str
+        name of the vehicle as used by the wiki
+    content : str
+        html of the vehicles wiki page
+    terrain : Optional[TerrainType], optional
+        the vehicles terrain if it was determined while downloading, see get_vehicle_page
+    """
+    if terrain is None:
+        terrain = get_vehicle_terrain(content=content)
+    if terrain is None:
+        return # I'm still not quite sure if i want to add the special pages (bombs, rockets etc...)
+    get_page_store().put(vehicle=vehicle, terrain=terrain, content=content)
+
+
+def get_vehicle_page(vehicle_url: str) -> Tuple[Optional[str], Optional[TerrainType]]:
+    """requests a vehicle page conditionally and classifies its terrain right away
+
+    Parameters
+    ----------
+    vehicle_url : str
+        URL of the vehicles wiki page
+
+    Returns
+    -------
+    Tuple[Optional[str], Optional[TerrainType]]
+        html of the page (None if it didn't change since the last request) and its terrain
+    """
+    content = get_fetcher().get_if_changed(vehicle_url)
+    if content is None:
+        return None, None
+    return content, get_vehicle_terrain(content=content)
+
+
+def get_vehicle_terrain(content: str) -> Optional[TerrainType]:
+    """Determines the terrain of a vehicle page by its categories
+
+    Only the category links are parsed, they are located without tokenizing the rest of the page.
+
+    Parameters
+    ----------
+    content : str
+        html of the vehicles wiki page
+
+    Returns
+    -------
+    Optional[TerrainType]
+        the vehicles terrain, None for special pages (bombs, rockets etc...)
+    """
+    category_links = extract_element(content, CATEGORY_LINKS_CLASS)
+    if category_links is None:
+        return None
+    if use_selectolax():
+        first_category = selectolax_tree(category_links).css_first("ul li")
+        return terrain_from_category(first_category.text() if first_category else None)
+    soup = make_soup(category_links)
+    if soup.ul is None or soup.ul.li is None:
+        return None
+    return terrain_from_category(soup.ul.li.string)
+
+
+def terrain_from_category(category: Optional[str]) -> Optional[TerrainType]:
+    """Maps the first category of a vehicle page to its terrain
+
+    Parameters
+    ----------
+    category : Optional[str]
+        name of the category, e.g. "Ground vehicles"
+
+    Returns
+    -------
+    Optional[TerrainType]
+        the vehicles terrain, None for special pages (bombs, rockets etc...)
+    """
+    if category is None:
+        return None
+    category = category.lower()
+    if "ground" in category:
+        return TerrainType.GROUND
+    elif "aviation" in category:
+        return TerrainType.AVIATION
+    elif "fleet" in category:
+        return TerrainType.NAVAL
     else:
         #directory = "Special"
-        return # I'm still not quite sure if i want to add the special pages (bombs, rockets etc...)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    with open(f"{directory}{SLASH}{string_to_ordinal(vehicle)}.html", "w", encoding="utf-8") as vec:
-        vec.write(content)
+        return None
 
-    with open("naming.lst", "a", encoding="utf-8") as name:
-        name.write(f"{vehicle} -> {directory} -> {string_to_ordinal(vehicle)}.html\n")
 
+def changelog_start(since: str) -> str:
+    """returns where to continue reading the changes, CHANGELOG_OVERLAP seconds before the last processed change
 
-def get_wiki_changelog() -> List:
-    """grabs the changelog page and iterates through the changes
+    Parameters
+    ----------
+    since : str
+        timestamp (YYYYMMDDHHMMSS, UTC) of the last processed change
 
     Returns
     -------
-    List
-        list of changed pages from the wiki
+    str
+        timestamp (YYYYMMDDHHMMSS, UTC) of the oldest change to read again
     """
-    # check on how we handle the date format and other url options
-    changelog_url = f""
-    return parse_changelog(content=requests.get(changelog_url).text)
-
-def parse_changelog(content: str) -> List:
-    # exclude following entries:
-        # starting with ()
-        # starting with User:
-        # starting with Template:
-        # starting with File:
-        # starting with Update
-        # containing (Family)
-    pass
-
-def check_local_vehicle(vehicle: str) -> bool:
-    """checks if a vehicle is present in the local FS
+    start = datetime.strptime(since, CHANGELOG_TIME_FORMAT) - timedelta(seconds=CHANGELOG_OVERLAP)
+    return start.strftime(CHANGELOG_TIME_FORMAT)
+
+def get_wiki_changelog(since: Optional[str] = None, api: Optional[WikiApi] = None) -> List[ChangelogEntry]:
+    """grabs the changes through the API, following the continuation so no change is cut off on busy days
+
+    Parameters
+    ----------
+    since : Optional[str], optional
+        timestamp (YYYYMMDDHHMMSS, UTC) of the last processed change, the changes from changelog_start(since) on are returned,
+        so the caller has to skip the ones it processed already, None lists the last CHANGELOG_DAYS days
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+
+    Returns
+    -------
+    List[ChangelogEntry]
+        list of changed pages from the wiki, oldest first
+
+    Raises
+    ------
+    ChangelogGapError
+        since is older than CHANGELOG_DAYS, the changes in between may be gone already
+    """
+    oldest = (datetime.now(timezone.utc) - timedelta(days=CHANGELOG_DAYS)).strftime(CHANGELOG_TIME_FORMAT)
+    if since is not None and since < oldest:
+        raise ChangelogGapError(f"the last processed change ({since}) is older than the {CHANGELOG_DAYS} days the wiki keeps")
+    entries = []
+    for title, timestamp, revid in (api or WikiApi()).recent_changes(start=changelog_start(since) if since is not None else oldest):
+        timestamp = "".join(filter(str.isdigit, timestamp)) # ISO 8601 -> YYYYMMDDHHMMSS
+        if is_vehicle_change(title):
+            entries.append(ChangelogEntry(title=title, timestamp=timestamp, revid=revid or None)) # log entries have revid 0
+    return entries
+
+def parse_changelog(content: str) -> List[ChangelogEntry]:
+    """extracts the changed pages from the html of Special:RecentChanges
+
+    Parameters
+    ----------
+    content : str
+        html of the recent changes, either the plain or the enhanced (grouped) list
+
+    Returns
+    -------
+    List[ChangelogEntry]
+        the changes as listed by the wiki (newest first), excluding pages that can't be vehicles
+    """
+    soup = make_soup(content)
+    entries = []
+    for link in soup.find_all("a", class_="mw-changeslist-title"):
+        line = link.find_parent(attrs={"data-mw-ts": True}) # <li> in the plain list, <tr> in the enhanced one
+        if line is None:
+            continue
+        title = link.get("title") or link.get_text()
+        if is_vehicle_change(title):
+            entries.append(ChangelogEntry(title=title, timestamp=line["data-mw-ts"], revid=int(line.get("data-mw-revid", 0)) or None))
+    return entries
+
+def is_vehicle_change(title: str) -> bool:
+    """checks if a changed page may be a vehicle
+
+    Parameters
+    ----------
+    title : str
+        title of the changed page
+
+    Returns
+    -------
+    bool
+        False for user pages, templates, files, update notes and vehicle families
+    """
+    return not title.startswith(CHANGELOG_EXCLUDED_PREFIXES) and not any(part in title for part in CHANGELOG_EXCLUDED_PARTS)
+
+def vehicle_from_title(title: str) -> str:
+    """converts a page title into the vehicle name as used in the wiki URLs
+
+    Parameters
+    ----------
+    title : str
+        title of the page, e.g. "Pz.Kpfw. Churchill (Germany)"
+
+    Returns
+    -------
+    str
+        name of the vehicle, e.g. "Pz.Kpfw._Churchill_(Germany)"
+    """
+    return title.replace(" ", "_")
+
+def check_local_vehicle(vehicle: str, max_age: Optional[float] = None) -> bool:
+    """checks if a vehicle is present in the local page store
 
     Parameters
     ----------
     vehicle : str
         name of the vehicle to check
+    max_age : Optional[float], optional
+        maximum age of the stored page in seconds, None accepts any age
 
     Returns
     -------
     bool
-        vehicle is present or not
+        vehicle is present (and fresh enough) or not
+    """
+    return get_page_store().has(vehicle, max_age=max_age)
+
+def get_missing_vehicles(vehicles: Iterable[str], max_age: Optional[float] = None) -> List[str]:
+    """filters the vehicles that aren't present in the local page store
+
+    Parameters
+    ----------
+    vehicles : Iterable[str]
+        names of the vehicles to check
+    max_age : Optional[float], optional
+        maximum age of the stored pages in seconds, None accepts any age
+
+    Returns
+    -------
+    List[str]
+        the missing (or outdated) vehicles
     """
-    vehicle_ord = ordinal_to_string(vehicle)
-    for tType in TerrainType:
-        dir_content = os.listdir(tType.value)
-        if dir_content and f"{vehicle_ord}.html" in dir_content:
-            return True
-    return False
-
-def string_to_ordinal(input_str: str, delimiter: str = "-") -> str:
-    output_str: str = ""
-    for char in input_str:
-        output_str = f"{output_str}{ord(char)}{delimiter}"
-    return output_str.rstrip(delimiter)
-
-def ordinal_to_string(input_str: str, delimiter: str = "-") -> str:
-    output_str: str = ""
-    for x in input_str.split(delimiter):
-        output_str = f"{output_str}{chr(int(x))}"
-    return output_str
+    return get_page_store().missing(vehicles, max_age=max_age)
 
 
 def __main__():
     """Main
     """
-
-    # argparsing here
+    parser = argparse.ArgumentParser(description="Scrapes the WarThunder Wiki")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="maximum amount of requests in flight")
+    parser.add_argument("--html-backend", choices=available_backends(), default=get_backend(), help="HTML parser used for the scraped pages")
+    parser.add_argument("--fresh", action="store_true", help="ignore the revalidation cache and download every page in full")
+    parser.add_argument("--max-age", type=float, metavar="HOURS", help="skip vehicles whose stored page is younger than HOURS")
+    parser.add_argument("--crawl", nargs="*", choices=[terrain.name.lower() for terrain in TerrainType], metavar="TERRAIN",
+                        help="crawl every vehicle of the given terrains (all if none given) instead of the test vehicles")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT, help="maximum requests per second towards the wiki, 0 disables the limit")
+    parser.add_argument("--timeout", type=float, default=FetchPolicy.timeout[1], help="seconds without an answer before a request is retried")
+    parser.add_argument("--retries", type=int, default=FetchPolicy.retries, help="retries of a failed request")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--metrics", metavar="FILE", help="export the request and parse metrics, *.prom as Prometheus text, else JSON")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_FILE, help="journal of the crawl, an unfinished one is resumed")
+    parser.add_argument("--restart", action="store_true", help="discard an unfinished crawl journal and crawl from scratch")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    set_backend(args.html_backend)
+    configure_fetcher(concurrency=args.concurrency, rate_limit=args.rate_limit, cache=None if args.fresh else ResponseCache(),
+                      policy=FetchPolicy(timeout=(FetchPolicy.timeout[0], args.timeout), retries=args.retries))
+    max_age = args.max_age * 3600 if args.max_age is not None else None
+
+    if args.crawl is not None:
+        from crawl_pipeline import run_crawl # the pipeline imports this module, so keep it out of the module scope
+        terrains = [TerrainType[terrain.upper()] for terrain in args.crawl] or list(TerrainType)
+        if args.restart and os.path.exists(args.journal):
+            os.remove(args.journal)
+        journal = CrawlJournal(filename=args.journal)
+        if journal.resumed:
+            logger.info("resuming the crawl of %s: %s", args.journal, ", ".join(f"{count} {state}" for state, count in journal.counts().items()))
+        try:
+            stats = run_crawl(terrains=terrains, max_age=max_age, journal=journal)
+        except BaseException: # interrupted, the journal keeps the progress
+            journal.close()
+            raise
+        print(f"Crawled {stats.nations} nations, {stats.vehicles} vehicles ({stats.skipped} skipped, {stats.unchanged} unchanged, {stats.resumed} resumed), "
+              f"stored {stats.stored} pages with {len(stats.errors)} errors")
+        for error in stats.errors:
+            logger.warning(error)
+        if stats.errors:
+            journal.close()
+            logger.warning("run the crawl again to retry the failed vehicles, %s keeps the progress", args.journal)
+        else:
+            journal.finish()
+        get_fetcher().close()
+        if args.metrics:
+            get_metrics().export(args.metrics)
+        return
 
     # add strv 103A
     # add VT1-2 Waffentraeger mit 2 cannons
@@ -250,8 +661,10 @@ def __main__():
         "M60A1_\"D.C.Ariete\"", # GE Premium
         "AUBL/74_HVG" # Marketplace Vehicle
     ]
-    for vehicle in test_vehicles:
-        get_vehicle_specs(vehicle=vehicle)
+    if max_age is not None:
+        test_vehicles = get_missing_vehicles(test_vehicles, max_age=max_age)
+    get_vehicles_specs(vehicles=test_vehicles)
+    get_fetcher().close()
 
 
 if __name__ == "__main__":
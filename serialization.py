@@ -0,0 +1,128 @@
+"""Converts parsed vehicles into plain, JSON compatible data
+"""
+
+from enum import Enum
+from typing import Any, Dict
+
+from ammunition import Ammunition
+from armament import Armament, Stabilizer
+from modes import ModeValues, SlottedModel
+from tanks import Tank, VehicleClass
+
+ENUM_FIELDS = {"vehicle_class": VehicleClass, "stabilizer": Stabilizer}
+
+
+def to_primitive(value: Any) -> Any:
+    """recursively converts a model object into dicts, lists and scalars
+
+    Parameters
+    ----------
+    value : Any
+        a Tank, Armament, Ammunition or anything they contain
+
+    Returns
+    -------
+    Any
+        the plain representation, enums are replaced by their names
+    """
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (dict, ModeValues)):
+        return {key: to_primitive(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_primitive(item) for item in value]
+    if isinstance(value, SlottedModel):
+        return to_primitive(value.as_dict())
+    return value
+
+
+def tank_to_dict(tank: Tank) -> Dict[str, Any]:
+    """converts a parsed ground vehicle including its armaments and ammunition
+
+    Parameters
+    ----------
+    tank : Tank
+        the parsed ground vehicle
+
+    Returns
+    -------
+    Dict[str, Any]
+        JSON compatible representation of the vehicle
+    """
+    return to_primitive(tank)
+
+
+def _set_fields(obj: SlottedModel, data: Dict[str, Any], skip: tuple) -> None:
+    """sets the fields of a model object from its plain representation
+
+    Parameters
+    ----------
+    obj : SlottedModel
+        the object to update
+    data : Dict[str, Any]
+        see to_primitive
+    skip : tuple
+        fields handled by the caller
+    """
+    for name, value in data.items():
+        if name in skip:
+            continue
+        if name in ENUM_FIELDS:
+            value = ENUM_FIELDS[name][value]
+        setattr(obj, name, value)
+
+
+def ammunition_from_dict(data: Dict[str, Any]) -> Ammunition:
+    """restores a round converted by to_primitive
+
+    Parameters
+    ----------
+    data : Dict[str, Any]
+        plain representation of the round
+
+    Returns
+    -------
+    Ammunition
+        the round
+    """
+    ammo = Ammunition(name=data["name"], ammo_type=data["ammo_type"], pen_at_distance=data["pen_at_distance"])
+    _set_fields(ammo, data, skip=("name", "ammo_type", "pen_at_distance"))
+    return ammo
+
+
+def armament_from_dict(data: Dict[str, Any]) -> Armament:
+    """restores an armament converted by to_primitive
+
+    Parameters
+    ----------
+    data : Dict[str, Any]
+        plain representation of the armament
+
+    Returns
+    -------
+    Armament
+        the armament including its rounds
+    """
+    armament = Armament(name=data["name"])
+    _set_fields(armament, data, skip=("name", "ammo_types"))
+    armament.ammo_types = [ammunition_from_dict(ammo) for ammo in data.get("ammo_types", [])]
+    return armament
+
+
+def tank_from_dict(data: Dict[str, Any]) -> Tank:
+    """restores a ground vehicle converted by tank_to_dict
+
+    Parameters
+    ----------
+    data : Dict[str, Any]
+        JSON compatible representation of the vehicle
+
+    Returns
+    -------
+    Tank
+        the ground vehicle including its armaments and ammunition
+    """
+    tank = Tank(name=data["name"])
+    _set_fields(tank, data, skip=("name", "armaments"))
+    tank.armaments = [armament_from_dict(armament) for armament in data.get("armaments", [])]
+    return tank
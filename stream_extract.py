@@ -0,0 +1,175 @@
+"""Extracts a single element from a page without parsing the whole page
+
+The discovery pages only matter for one element each (the nations table, the category listing), and the terrain
+of a vehicle page only depends on its category links. ElementCapture tokenizes html incrementally and records the
+markup of the first element with a given class, then ignores everything after it. stream_element feeds it while
+the response is still arriving and closes the connection once the element is complete, extract_element jumps to
+the element in an already downloaded page.
+
+The returned markup is a plain html fragment, the existing parse functions read it like the full page.
+"""
+
+import codecs
+from html.parser import HTMLParser
+from typing import Iterable, List, Optional, Tuple
+
+from fetcher import get_fetcher
+from metrics import get_metrics
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class ElementCapture(HTMLParser):
+    """Records the markup of the first element with the given class
+    """
+
+    def __init__(self, class_name: str) -> None:
+        """
+        Parameters
+        ----------
+        class_name : str
+            a single class name of the wanted element
+        """
+        super().__init__(convert_charrefs=False) # keeps entities as they are, the fragment is parsed again later
+        self.class_name: str = class_name
+        self.done: bool = False
+        self._tag: Optional[str] = None
+        self._depth: int = 0
+        self._parts: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+        if self._tag is None:
+            classes = next((value or "" for name, value in attrs if name == "class"), "").split()
+            if self.class_name not in classes:
+                return
+            self._tag = tag
+        if tag == self._tag: # only the elements own tag is counted, so unclosed <li> or <p> don't matter
+            self._depth += 1
+        self._parts.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._tag is not None and not self.done:
+            self._parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._tag is None or self.done:
+            return
+        self._parts.append(f"</{tag}>")
+        if tag == self._tag:
+            self._depth -= 1
+            self.done = self._depth == 0
+
+    def handle_data(self, data: str) -> None:
+        if self._tag is not None and not self.done:
+            self._parts.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.handle_data(f"&{name};")
+
+    def handle_charref(self, name: str) -> None:
+        self.handle_data(f"&#{name};")
+
+    def handle_comment(self, data: str) -> None:
+        self.handle_data(f"<!--{data}-->")
+
+    def feed(self, data: str) -> None:
+        if not self.done:
+            super().feed(data)
+
+    @property
+    def markup(self) -> Optional[str]:
+        """the captured element, None if it wasn't found
+
+        Returns
+        -------
+        Optional[str]
+            html of the element (as far as it was fed)
+        """
+        return "".join(self._parts) if self._tag is not None else None
+
+
+def capture_element(chunks: Iterable[str], class_name: str) -> Optional[str]:
+    """feeds html chunks until the first element with the given class is complete
+
+    Parameters
+    ----------
+    chunks : Iterable[str]
+        the html, e.g. the chunks of a response as they arrive
+    class_name : str
+        a single class name of the wanted element
+
+    Returns
+    -------
+    Optional[str]
+        html of the element, None if the chunks don't contain it
+    """
+    capture = ElementCapture(class_name=class_name)
+    for chunk in chunks:
+        capture.feed(chunk)
+        if capture.done:
+            break
+    else:
+        capture.close()
+    return capture.markup
+
+
+def extract_element(content: str, class_name: str) -> Optional[str]:
+    """extracts the first element with the given class from a downloaded page
+
+    Instead of tokenizing the page from the start, the search jumps to the first tag whose markup mentions the class.
+
+    Parameters
+    ----------
+    content : str
+        html of the page
+    class_name : str
+        a single class name of the wanted element
+
+    Returns
+    -------
+    Optional[str]
+        html of the element, None if the page doesn't contain it
+    """
+    position = content.find(class_name)
+    while position != -1:
+        tag_start = content.rfind("<", 0, position)
+        if tag_start != -1 and content.find(">", tag_start, position) == -1: # the class name is inside a tag
+            return capture_element(chunks=(content[tag_start:],), class_name=class_name)
+        position = content.find(class_name, position + len(class_name))
+    return None
+
+
+def stream_element(url: str, class_name: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Optional[str]:
+    """requests a page and extracts the first element with the given class while the response arrives,
+    the rest of the page isn't downloaded
+
+    Parameters
+    ----------
+    url : str
+        the URL to request
+    class_name : str
+        a single class name of the wanted element
+    chunk_size : int, optional
+        amount of bytes read at once
+
+    Returns
+    -------
+    Optional[str]
+        html of the element, None if the page doesn't contain it
+    """
+    received = 0
+    def decode(response):
+        nonlocal received
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            received += len(chunk)
+            yield decoder.decode(chunk)
+
+    with get_fetcher().get(url, stream=True) as response:
+        response.raise_for_status() # an error page would be searched (and not found) like a vehicle page
+        try:
+            return capture_element(chunks=decode(response), class_name=class_name)
+        finally:
+            get_metrics().increment("http_bytes", received)
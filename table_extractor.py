@@ -0,0 +1,45 @@
+"""Extracts the rows and cells of an already parsed html table
+
+Drop-in replacement for feeding str(table) into html_table_parser.HTMLTableParser: instead of serializing the Tag
+back into html and tokenizing it a second time, the existing tree is walked directly. The cells come out exactly
+like HTMLTableParser produces them (every text node stripped, joined by a single space), so the column offsets used
+by the ground parser (colspans, AoA, fire rate, ...) stay the same.
+"""
+
+from typing import List
+
+from bs4 import Tag
+
+CELL_TAGS = ["td", "th"]
+
+
+def extract_cell(cell: Tag) -> str:
+    """extracts the text of a table cell
+
+    Parameters
+    ----------
+    cell : Tag
+        a td or th element
+
+    Returns
+    -------
+    str
+        the text of the cell
+    """
+    return " ".join(text.strip() for text in cell.strings).strip()
+
+
+def extract_table(table: Tag) -> List[List[str]]:
+    """extracts every row of a table
+
+    Parameters
+    ----------
+    table : Tag
+        the table element
+
+    Returns
+    -------
+    List[List[str]]
+        rows of cell texts, just like HTMLTableParser.tables[0]
+    """
+    return [[extract_cell(cell) for cell in row.find_all(CELL_TAGS)] for row in table.find_all("tr")]
@@ -3,6 +3,7 @@
 
 from enum import Enum
 from armament import Armament
+from modes import ALL_MODES, DRIVING_MODES, ArmourSide, Gear, ModeField, SlottedModel
 from typing import Dict, Tuple, List
 
 class VehicleClass(Enum):
@@ -15,9 +16,35 @@ class VehicleClass(Enum):
     TANK_DESTROYER = 5
     SPAA = 6
 
-class Tank():
+class Tank(SlottedModel):
     """Class that represents a WarThunder Ground Vehicle
+
+    Slotted to keep the whole catalog small in memory, the per-mode values are stored as tuples (see modes.ModeField)
+    but still read and write like the dicts they used to be.
     """
+    __slots__ = (
+        "name", "vehicle_class", "nation", "is_premium", "is_squadron", "rank", "_battle_rating", "armaments", "cost", "research",
+        "_repair_cost_stock", "_repair_cost_upgraded", "total_cost_modifications_sl", "total_cost_modifications_rp", "crew_training",
+        "talisman_cost", "_rewards_sl", "_rewards_rp", "_armour_hull", "_armour_turret", "crew", "visibility", "weight", "_gears",
+        "_max_speed_forward", "_max_speed_reverse", "_power_to_weight_stock", "_power_to_weight_upgraded", "_engine_power_stock",
+        "_engine_power_upgraded", "era", "is_amphibious", "reverse_gearbox", "controlled_suspension", "smokes", "ess", "artillery",
+        "dozer_blade", "scouting", "scout_uav", "night_vision", "thermal_vision", "rangefinder", "laser_rangefinder",
+        "laser_warning_rangefinder"
+    )
+    battle_rating = ModeField(ALL_MODES, 0.0)
+    repair_cost_stock = ModeField(ALL_MODES, -1)
+    repair_cost_upgraded = ModeField(ALL_MODES, -1)
+    rewards_sl = ModeField(ALL_MODES, -1)
+    rewards_rp = ModeField(ALL_MODES, -1)
+    armour_hull = ModeField(ArmourSide, -1)
+    armour_turret = ModeField(ArmourSide, -1)
+    gears = ModeField(Gear, 0)
+    max_speed_forward = ModeField(DRIVING_MODES, 0)
+    max_speed_reverse = ModeField(DRIVING_MODES, 0)
+    power_to_weight_stock = ModeField(DRIVING_MODES, 0)
+    power_to_weight_upgraded = ModeField(DRIVING_MODES, 0)
+    engine_power_stock = ModeField(DRIVING_MODES, 0)
+    engine_power_upgraded = ModeField(DRIVING_MODES, 0)
 
     def __init__(self, name: str):
         """
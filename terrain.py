@@ -0,0 +1,10 @@
+"""Terrain types of the vehicles found on the WarThunder Wiki
+"""
+
+from enum import Enum
+
+
+class TerrainType(Enum):
+    GROUND = "Earth"
+    NAVAL = "Not_Fire"
+    AVIATION = "Air"
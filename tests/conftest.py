@@ -0,0 +1,38 @@
+"""Shared fixtures of the tests, the modules are imported from the repository root just like the scripts do
+"""
+
+import os
+import sys
+from typing import Dict
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import page_store
+from filename_encoding import decode_name
+
+FIXTURES_DIR = os.path.join(ROOT, "tests", "fixtures")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch) -> page_store.PageStore:
+    """an empty page store in a temporary directory, installed as the shared one
+    """
+    monkeypatch.setattr(page_store, "_PAGE_STORE", None)
+    store = page_store.open_page_store(str(tmp_path / "page_store"))
+    yield store
+    store.close()
+
+
+@pytest.fixture(scope="session")
+def vehicle_pages() -> Dict[str, str]:
+    """the saved vehicle pages of tests/fixtures/pages, vehicle -> html
+    """
+    pages_dir = os.path.join(FIXTURES_DIR, "pages")
+    pages = {}
+    for filename in sorted(os.listdir(pages_dir)):
+        with open(os.path.join(pages_dir, filename), "r", encoding="utf-8") as page:
+            pages[decode_name(filename[:-len(".html")])] = page.read()
+    return pages
@@ -0,0 +1,88 @@
+"""Checks that every installed HTML backend reads the sample pages the same way, see backend_parity
+"""
+
+import os
+
+import pytest
+
+from backend_parity import check_parity, load_stored_pages, parse_with
+from bench_parser import DEFAULT_CORPUS_DIR, load_corpus
+from conftest import FIXTURES_DIR, ROOT
+from html_backend import HTML_PARSER, available_backends, get_backend, set_backend
+from page_store import PageStore
+from scrape_wt_wiki import get_nation, parse_vehicles_by_nation
+from terrain import TerrainType
+
+BACKENDS = available_backends()
+
+
+def read_discovery_page(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, "discovery", f"{name}.html"), "r", encoding="utf-8") as page:
+        return page.read()
+
+
+@pytest.fixture(scope="module")
+def sample_pages(vehicle_pages):
+    return {**load_corpus(os.path.join(ROOT, DEFAULT_CORPUS_DIR)), **vehicle_pages}
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    previous = get_backend()
+    set_backend(request.param)
+    yield request.param
+    set_backend(previous)
+
+
+@pytest.mark.skipif(len(BACKENDS) < 2, reason="only html.parser is installed")
+def test_backends_parse_the_stored_sample_pages_identically(sample_pages, tmp_path):
+    store = PageStore(root=str(tmp_path / "page_store"))
+    for vehicle, content in sample_pages.items():
+        store.put(vehicle=vehicle, terrain=TerrainType.GROUND, content=content)
+    store.close()
+    pages = load_stored_pages(store_root=str(tmp_path / "page_store"))
+    assert pages.keys() == sample_pages.keys()
+
+    for vehicle, content in pages.items(): # pages failing with every backend would pass the parity check as well
+        assert not parse_with(content=content, backend=HTML_PARSER).startswith("error: "), vehicle
+    assert check_parity(pages=pages, backends=BACKENDS) == []
+
+
+def test_parity_reports_differences(sample_pages, monkeypatch):
+    monkeypatch.setattr("backend_parity.parse_with", lambda content, backend: backend)
+    assert check_parity(pages={"Maus": sample_pages["Maus"]}, backends=[HTML_PARSER, "lxml"]) == ["Maus: lxml differs from html.parser"]
+
+
+def test_backends_read_the_nations_identically(backend):
+    nations = get_nation(read_discovery_page("ground_vehicles"))
+
+    assert list(nations)[:3] == ["USA", "Germany", "USSR"] and len(nations) == 10
+    assert nations["Germany"].endswith("/Category:Germany_ground_vehicles")
+
+
+def test_backends_read_the_category_identically(backend):
+    vehicles = parse_vehicles_by_nation(read_discovery_page("germany_ground_vehicles"))
+
+    assert len(vehicles) == 32
+    assert vehicles["Pz.Kpfw. Churchill (Germany)"].endswith("/Pz.Kpfw._Churchill_(Germany)")
+    assert "Germany premium ground vehicles" not in vehicles # subcategories aren't vehicles
+
+
+def test_missing_nations_table_fails_the_same_way(backend):
+    with pytest.raises(ValueError, match="no wt-class-table table found"):
+        get_nation("")
+    with pytest.raises(ValueError, match="no wt-class-table table found"):
+        get_nation('<div class="mw-parser-output"><table class="wt-class-table"></table></div>')
+
+
+@pytest.mark.parametrize("content, message", [
+    ('<div class="mw-category"><div class="mw-category-group"><h3>M</h3></div></div>', "category group without a list"),
+    ('<div class="mw-category"><div class="mw-category-group"><h3>M</h3><ul><li>Maus</li></ul></div></div>', "category entry without a link"),
+])
+def test_broken_category_fails_the_same_way(backend, content, message):
+    with pytest.raises(ValueError, match=message):
+        parse_vehicles_by_nation(content)
+
+
+def test_empty_category_has_no_vehicles(backend):
+    assert parse_vehicles_by_nation("") == {}
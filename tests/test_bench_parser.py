@@ -0,0 +1,37 @@
+"""Guards the parsed values of the benchmark corpus, see bench_parser
+"""
+
+import os
+
+import pytest
+
+from bench_parser import DEFAULT_CORPUS_DIR, check_golden, load_corpus, write_golden
+from conftest import ROOT
+
+CORPUS_DIR = os.path.join(ROOT, DEFAULT_CORPUS_DIR)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus(CORPUS_DIR)
+
+
+def test_corpus_holds_the_naming_lst_vehicles(corpus):
+    with open(os.path.join(ROOT, "naming.lst"), "r", encoding="utf-8") as naming:
+        vehicles = {line.split(" -> ")[0] for line in naming if line.strip()}
+    assert vehicles <= corpus.keys()
+    assert os.path.exists(os.path.join(CORPUS_DIR, "baseline.json"))
+
+
+def test_parsed_values_match_the_golden_json(corpus):
+    assert check_golden(CORPUS_DIR, corpus) == []
+
+
+def test_changed_values_are_reported(corpus, tmp_path):
+    vehicle = "Maus"
+    write_golden(str(tmp_path), vehicle, corpus[vehicle])
+    changed = corpus[vehicle].replace('<div class="general_info_name">Maus</div>', '<div class="general_info_name">Maus II</div>')
+
+    failures = check_golden(str(tmp_path), {vehicle: changed})
+
+    assert failures == ["Maus: name is 'Maus II', expected 'Maus'"]
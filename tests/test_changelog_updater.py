@@ -0,0 +1,269 @@
+"""Tests of the changelog parsing and the updater against saved Special:RecentChanges pages
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Union
+
+import pytest
+
+import changelog_updater
+import scrape_wt_wiki
+from changelog_updater import changed_vehicles, load_checkpoint, load_processed, run_update, save_checkpoint
+from conftest import FIXTURES_DIR
+from response_cache import ResponseCache
+from scrape_wt_wiki import (CHANGELOG_TIME_FORMAT, ChangelogEntry, ChangelogGapError, changelog_start, get_vehicle_url, get_wiki_changelog,
+                            is_vehicle_change, parse_changelog, vehicle_from_title, vehicle_from_url)
+from terrain import TerrainType
+from vehicle_db import VehicleDB
+from wiki_api import WikiApi
+
+NEWEST_CHANGE = "20261017120000"
+PLAIN_ENTRIES = [
+    ChangelogEntry(title="Maus", timestamp="20261017120000", revid=89993),
+    ChangelogEntry(title="Maus", timestamp="20261017093000", revid=89979),
+    ChangelogEntry(title="Pz.Kpfw. Churchill (Germany)", timestamp="20261016200000", revid=89951),
+    ChangelogEntry(title="M24 (Italy)", timestamp="20261016180000", revid=89937),
+    ChangelogEntry(title="Leopard 2A7V", timestamp="20261016150000", revid=89923),
+    ChangelogEntry(title="Sho't Kal Dalet (Great Britain)", timestamp="20261016100000", revid=89916),
+]
+
+
+def read_changelog(layout: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, "changelog", f"recent_changes_{layout}.html"), "r", encoding="utf-8") as changelog:
+        return changelog.read()
+
+
+def changelog_page(entries: Iterable[ChangelogEntry]) -> str:
+    """a plain Special:RecentChanges list of the entries
+    """
+    lines = "".join(f'<li data-mw-revid="{entry.revid}" data-mw-ts="{entry.timestamp}"><a href="/{entry.title}" class="mw-changeslist-title" '
+                    f'title="{entry.title}">{entry.title}</a></li>' for entry in entries)
+    return f'<ul class="special">{lines}</ul>'
+
+
+class StubFetcher():
+    """Answers fetch_all from prepared responses instead of the wiki
+    """
+
+    def __init__(self, responses: Dict[str, Union[str, Exception, None]], cache: Optional[ResponseCache] = None) -> None:
+        self.responses = responses # vehicle -> html, None for unchanged pages or the error of a failed download
+        self.cache = cache
+        self.requested = []
+
+    def fetch_all(self, urls: Iterable[str], if_changed: bool = False, fetch=None):
+        for url in urls:
+            vehicle = vehicle_from_url(url)
+            self.requested.append(vehicle)
+            response = self.responses.get(vehicle)
+            if isinstance(response, Exception):
+                yield url, None, response
+            else:
+                yield url, response, None
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    stub = StubFetcher(responses={})
+    monkeypatch.setattr(changelog_updater, "get_fetcher", lambda: stub)
+    monkeypatch.setattr(scrape_wt_wiki, "get_fetcher", lambda: stub)
+    return stub
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = VehicleDB(filename=str(tmp_path / "vehicles.sqlite"))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def checkpoint_file(tmp_path):
+    return str(tmp_path / "changelog_checkpoint.json")
+
+
+def fill_store(store, vehicle_pages, vehicles):
+    for vehicle in vehicles:
+        store.put(vehicle=vehicle, terrain=TerrainType.GROUND, content=vehicle_pages[vehicle])
+
+
+def test_parse_plain_changelog():
+    assert parse_changelog(read_changelog("plain")) == PLAIN_ENTRIES
+
+
+def test_parse_enhanced_changelog():
+    # the enhanced list groups the changes of a page per day, the group carries the time of its newest change but no revid
+    assert parse_changelog(read_changelog("enhanced")) == [entry._replace(revid=None) for entry in PLAIN_ENTRIES if entry.timestamp != "20261017093000"]
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Maus", True),
+    ("Pz.Kpfw. Churchill (Germany)", True),
+    ("User:Editor", False),
+    ("Template:Specs-Card", False),
+    ("File:Maus 01.jpg", False),
+    ("Update \"Firebirds\"", False),
+    ("Tiger (Family)", False),
+    ("(Archived) Sandbox", False),
+])
+def test_is_vehicle_change(title, expected):
+    assert is_vehicle_change(title) == expected
+
+
+def test_vehicle_from_title():
+    assert vehicle_from_title("Pz.Kpfw. Churchill (Germany)") == "Pz.Kpfw._Churchill_(Germany)"
+    assert vehicle_from_title("Sho't Kal Dalet (Great Britain)") == "Sho't_Kal_Dalet_(Great_Britain)"
+    assert vehicle_from_title("Maus") == "Maus"
+
+
+def test_changed_vehicles_only_lists_stored_vehicles_once():
+    stored = ["Maus", "M24_(Italy)", "Sho't_Kal_Dalet_(Great_Britain)", "Object_685"]
+    assert changed_vehicles(PLAIN_ENTRIES, stored=stored) == ["Maus", "M24_(Italy)", "Sho't_Kal_Dalet_(Great_Britain)"]
+
+
+@pytest.mark.parametrize("layout", ["plain", "enhanced"])
+def test_update_moves_the_checkpoint_to_the_newest_change(layout, store, fetcher, database, checkpoint_file, vehicle_pages):
+    fill_store(store, vehicle_pages, ["Maus", "M24_(Italy)"])
+    fetcher.responses.update({"Maus": vehicle_pages["Maus"], "M24_(Italy)": vehicle_pages["M24_(Italy)"]})
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+
+    stats = run_update(changelog_content=read_changelog(layout), database=database, checkpoint_file=checkpoint_file)
+
+    assert stats.errors == []
+    assert sorted(fetcher.requested) == ["M24_(Italy)", "Maus"]
+    assert stats.parsed == 2
+    assert load_checkpoint(filename=checkpoint_file) == stats.checkpoint == NEWEST_CHANGE
+    assert database.get_metadata("last_changelog_update") == NEWEST_CHANGE
+    assert database.load_ground_vehicle("Maus") is not None
+    assert database.load_ground_vehicle("M24 (Italy)") is not None
+
+
+def test_update_skips_changes_before_the_checkpoint(store, fetcher, database, checkpoint_file, vehicle_pages):
+    fill_store(store, vehicle_pages, ["Maus", "M24_(Italy)"])
+    fetcher.responses["Maus"] = vehicle_pages["Maus"]
+    save_checkpoint("20261017000000", filename=checkpoint_file)
+
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert stats.changes == 2
+    assert fetcher.requested == ["Maus"]
+    assert load_checkpoint(filename=checkpoint_file) == NEWEST_CHANGE
+
+
+def test_failed_download_holds_back_the_checkpoint(store, fetcher, database, checkpoint_file, vehicle_pages):
+    fill_store(store, vehicle_pages, ["Maus", "M24_(Italy)"])
+    fetcher.responses.update({"Maus": vehicle_pages["Maus"], "M24_(Italy)": TimeoutError("read timed out")})
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert len(stats.errors) == 1 and stats.errors[0].startswith("M24_(Italy): download failed")
+    assert database.load_ground_vehicle("Maus") is not None # the other vehicles are processed regardless
+    assert load_checkpoint(filename=checkpoint_file) == stats.checkpoint == "20261016000000"
+
+
+def test_failed_parse_forgets_the_cached_page(store, fetcher, database, checkpoint_file, vehicle_pages, tmp_path):
+    fill_store(store, vehicle_pages, ["Maus"])
+    fetcher.cache = ResponseCache(filename=str(tmp_path / "response_cache.json"))
+    fetcher.cache.set_revision(get_vehicle_url("Maus"), 123)
+    broken = vehicle_pages["Maus"].replace('<div class="general_info_name">Maus</div>', "")
+    fetcher.responses["Maus"] = broken
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert len(stats.errors) == 1 and stats.errors[0].startswith("Maus: ")
+    assert fetcher.cache.revision(get_vehicle_url("Maus")) is None # downloaded again next time
+    assert load_checkpoint(filename=checkpoint_file) == "20261016000000"
+
+
+def test_unchanged_page_is_parsed_from_the_store(store, fetcher, database, checkpoint_file, vehicle_pages):
+    # e.g. a crawl stored the new page already, so the wiki answers 304, but it never made it into the database
+    fill_store(store, vehicle_pages, ["Maus"])
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert (stats.unchanged, stats.stored, stats.parsed) == (1, 0, 1)
+    assert database.load_ground_vehicle("Maus") is not None
+
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert (stats.unchanged, stats.parsed, stats.irrelevant) == (1, 0, 0) # the section hashes didn't change
+    assert load_checkpoint(filename=checkpoint_file) == NEWEST_CHANGE
+
+
+def test_failed_database_update_holds_back_the_checkpoint(store, fetcher, database, checkpoint_file, vehicle_pages, monkeypatch):
+    fill_store(store, vehicle_pages, ["Maus"])
+    fetcher.responses["Maus"] = vehicle_pages["Maus"]
+    save_checkpoint("20261016000000", filename=checkpoint_file)
+    def fail(tanks):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(database, "upsert_ground_vehicles", fail)
+
+    stats = run_update(changelog_content=read_changelog("plain"), database=database, checkpoint_file=checkpoint_file)
+
+    assert stats.errors == ["database update failed: RuntimeError('database is locked')"]
+    assert database.get_ground_sections("Maus") is None
+    assert load_checkpoint(filename=checkpoint_file) == "20261016000000"
+
+
+def test_changelog_follows_the_continuation():
+    requests = []
+    pages = [
+        {"continue": {"rccontinue": "20261016150000|101", "continue": "-||"},
+         "query": {"recentchanges": [{"title": "Maus", "timestamp": "2026-10-16T10:00:00Z", "revid": 89916},
+                                     {"title": "User:Editor", "timestamp": "2026-10-16T11:00:00Z", "revid": 89923}]}},
+        {"query": {"recentchanges": [{"title": "M24 (Italy)", "timestamp": "2026-10-16T15:00:00Z", "revid": 0}]}}, # a move
+    ]
+    def transport(params):
+        requests.append(params)
+        return pages[len(requests) - 1]
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).strftime(CHANGELOG_TIME_FORMAT)
+
+    entries = get_wiki_changelog(since=since, api=WikiApi(transport=transport))
+
+    assert entries == [ChangelogEntry(title="Maus", timestamp="20261016100000", revid=89916),
+                       ChangelogEntry(title="M24 (Italy)", timestamp="20261016150000", revid=None)]
+    assert requests[0]["rcstart"] == changelog_start(since) < since and requests[0]["rcdir"] == "newer"
+    assert requests[1]["rccontinue"] == "20261016150000|101"
+
+
+@pytest.mark.parametrize("late", [0, 5], ids=["same second", "shows up late"])
+def test_change_after_the_checkpoint_query_isnt_lost(late, store, fetcher, database, checkpoint_file, vehicle_pages):
+    fill_store(store, vehicle_pages, ["Maus", "M24_(Italy)"])
+    fetcher.responses.update({"Maus": vehicle_pages["Maus"], "M24_(Italy)": vehicle_pages["M24_(Italy)"]})
+    save_checkpoint("20261017000000", filename=checkpoint_file)
+    first = ChangelogEntry(title="Maus", timestamp="20261017120005", revid=90001)
+    second = ChangelogEntry(title="M24 (Italy)", timestamp=f"2026101712000{5 - late}", revid=90002) # listed after the first run read the changes
+
+    stats = run_update(changelog_content=changelog_page([first]), database=database, checkpoint_file=checkpoint_file)
+
+    assert fetcher.requested == ["Maus"]
+    assert load_checkpoint(filename=checkpoint_file) == stats.checkpoint == first.timestamp
+    assert load_processed(filename=checkpoint_file) == {90001}
+    fetcher.requested.clear()
+
+    stats = run_update(changelog_content=changelog_page([second, first]), database=database, checkpoint_file=checkpoint_file)
+
+    assert stats.errors == [] and stats.changes == 1
+    assert fetcher.requested == ["M24_(Italy)"] # the first change is skipped by its revid
+    assert database.load_ground_vehicle("M24 (Italy)") is not None
+    assert load_checkpoint(filename=checkpoint_file) == first.timestamp # a late change doesn't move the checkpoint back
+    assert load_processed(filename=checkpoint_file) == {90001, 90002}
+
+
+def test_old_checkpoint_refreshes_every_stored_vehicle(store, fetcher, database, checkpoint_file, vehicle_pages):
+    with pytest.raises(ChangelogGapError):
+        get_wiki_changelog(since="20200101000000", api=WikiApi(transport=lambda params: pytest.fail("requested the changelog")))
+
+    fill_store(store, vehicle_pages, ["Maus", "M24_(Italy)"])
+    fetcher.responses.update({"Maus": vehicle_pages["Maus"], "M24_(Italy)": vehicle_pages["M24_(Italy)"]})
+    save_checkpoint("20200101000000", filename=checkpoint_file)
+
+    stats = run_update(database=database, checkpoint_file=checkpoint_file)
+
+    assert stats.errors == []
+    assert sorted(fetcher.requested) == ["M24_(Italy)", "Maus"]
+    assert load_checkpoint(filename=checkpoint_file) > "20200101000000"
@@ -0,0 +1,93 @@
+"""Tests of the page store freshness checks and pruning, see page_store
+"""
+
+import os
+import time
+
+import pytest
+import requests
+
+import scrape_wt_wiki
+from fetcher import Fetcher
+from page_store import PageStore
+from response_cache import ResponseCache
+from scrape_wt_wiki import get_vehicle_specs
+from terrain import TerrainType
+
+HOUR = 3600
+
+
+def not_modified(url: str, **kwargs) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 304
+    response.url = url
+    return response
+
+
+@pytest.fixture
+def old_page(store, vehicle_pages, monkeypatch):
+    """the page of the Maus, stored two hours ago
+    """
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda now=time.time(): now - 2 * HOUR)
+        store.put(vehicle="Maus", terrain=TerrainType.GROUND, content=vehicle_pages["Maus"])
+    return "Maus"
+
+
+def test_old_pages_are_missing(store, old_page):
+    assert not store.has(old_page, max_age=HOUR)
+    assert store.missing(["Maus", "Object_685"], max_age=HOUR) == ["Maus", "Object_685"]
+    assert store.has(old_page)
+
+
+def test_revalidated_page_is_fresh_again(store, old_page, monkeypatch, tmp_path):
+    fetcher = Fetcher(cache=ResponseCache(filename=str(tmp_path / "response_cache.json")))
+    monkeypatch.setattr(fetcher, "get", not_modified)
+    monkeypatch.setattr(scrape_wt_wiki, "get_fetcher", lambda: fetcher)
+    sha256 = store.lookup(old_page).sha256
+
+    get_vehicle_specs(old_page) # the wiki answers 304
+
+    assert store.has(old_page, max_age=HOUR)
+    assert store.lookup(old_page).sha256 == sha256
+    reopened = PageStore(root=store.root) # the new time is in the index as well
+    assert reopened.has(old_page, max_age=HOUR)
+    reopened.close()
+
+
+def test_touch_ignores_unknown_vehicles(store):
+    assert not store.touch("Object_685")
+    assert store.vehicles() == []
+
+
+def test_prune_deletes_unreferenced_blobs(store, vehicle_pages):
+    store.put(vehicle="Maus", terrain=TerrainType.GROUND, content=vehicle_pages["Maus"])
+    sha256 = store.put(vehicle="M24_(Italy)", terrain=TerrainType.GROUND, content=vehicle_pages["M24_(Italy)"])
+    store.delete("M24_(Italy)")
+
+    assert store.prune() == 0 # still within the grace period
+    assert store.prune(grace=0) == 1
+    assert store.get("Maus") == vehicle_pages["Maus"]
+    with pytest.raises(FileNotFoundError):
+        store.read_blob(sha256)
+
+
+def test_prune_keeps_the_pages_of_other_processes(store, vehicle_pages):
+    other = PageStore(root=store.root) # e.g. a running crawl while the updater prunes
+    sha256 = other.put(vehicle="Maus", terrain=TerrainType.GROUND, content=vehicle_pages["Maus"])
+
+    assert store.prune(grace=0) == 0
+    assert other.read_blob(sha256) == vehicle_pages["Maus"]
+    other.close()
+
+
+def test_reused_blob_survives_the_grace_period(store, vehicle_pages):
+    sha256 = store.put(vehicle="Maus", terrain=TerrainType.GROUND, content=vehicle_pages["Maus"])
+    store.delete("Maus")
+    blob_path = store._blob_path(sha256)
+    os.utime(blob_path, (time.time() - 2 * HOUR,) * 2)
+
+    store.put(vehicle="Maus_(copy)", terrain=TerrainType.GROUND, content=vehicle_pages["Maus"]) # same content, the blob is reused
+
+    assert os.path.getmtime(blob_path) > time.time() - HOUR
+    assert store.prune(grace=HOUR) == 0
@@ -0,0 +1,45 @@
+"""Tests of the cron schedule and the lock file, see scheduler
+"""
+
+import datetime
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from scheduler import CronSchedule, LockFile
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("0 0 */2 * 1", datetime.datetime(2026, 11, 9)), # */2 isn't a restriction, so odd days that are mondays
+    ("0 0 * * 1", datetime.datetime(2026, 10, 26)),
+    ("0 0 1-31/2 * 1", datetime.datetime(2026, 10, 21)), # both restricted, odd days or mondays
+    ("0 0 13 * 5", datetime.datetime(2026, 10, 23)),
+    ("30 */6 * * *", datetime.datetime(2026, 10, 19, 6, 30)),
+])
+def test_next_run(expression, expected):
+    after = datetime.datetime(2026, 10, 19, 1, 0) # a monday
+    assert CronSchedule(expression).next_run(after) == expected
+
+
+def test_lock_is_exclusive(tmp_path):
+    filename = str(tmp_path / "update.lock")
+    first, second = LockFile(filename), LockFile(filename)
+
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_lock_of_a_dead_process_is_free(tmp_path):
+    filename = str(tmp_path / "update.lock")
+    # exits while holding the lock, without releasing it
+    subprocess.run([sys.executable, "-c", f"from scheduler import LockFile; assert LockFile({filename!r}).acquire()"],
+                   check=True, cwd=ROOT)
+
+    lock = LockFile(filename)
+    assert lock.acquire()
+    lock.release()
@@ -0,0 +1,128 @@
+"""Replays the recorded API responses of tests/fixtures/api, see wiki_api.RecordedTransport
+"""
+
+import os
+
+import pytest
+
+from conftest import FIXTURES_DIR
+from response_cache import ResponseCache
+from scrape_wt_wiki import get_vehicle_url
+from terrain import TerrainType
+from wiki_api import (RecordedTransport, WikiApi, WikiApiError, category_from_url, fetch_vehicle_pages, get_nations, get_vehicles_by_category,
+                      store_vehicle_pages)
+
+RECORDINGS_DIR = os.path.join(FIXTURES_DIR, "api")
+CHANGED = ["Maus", "M24_(Italy)"] # the only vehicles whose revision isn't cached
+
+
+class CountingTransport(RecordedTransport):
+    """Replays the recordings and keeps the parameters of every request
+    """
+
+    def __init__(self, directory: str) -> None:
+        super().__init__(directory)
+        self.requests = []
+
+    def __call__(self, params):
+        self.requests.append(params)
+        return super().__call__(params)
+
+
+@pytest.fixture
+def transport():
+    return CountingTransport(RECORDINGS_DIR)
+
+
+@pytest.fixture
+def api(transport):
+    return WikiApi(transport=transport)
+
+
+def list_vehicles(api):
+    vehicles = []
+    for nation_url in get_nations(TerrainType.GROUND, api=api).values():
+        vehicles += get_vehicles_by_category(category_from_url(nation_url), api=api)
+    return vehicles
+
+
+@pytest.fixture
+def cache(api, tmp_path):
+    """holds the revisions of an earlier crawl, every vehicle but the CHANGED ones is up to date
+    """
+    cache = ResponseCache(filename=str(tmp_path / "response_cache.json"))
+    vehicles = list_vehicles(api)
+    for start in range(0, len(vehicles), api.batch_size):
+        for vehicle, revision in api.revisions(vehicles[start:start + api.batch_size]).items():
+            if vehicle not in CHANGED:
+                cache.set_revision(get_vehicle_url(vehicle), revision.revid)
+    return cache
+
+
+def test_category_members_follow_the_continuation(api, transport):
+    nations = get_nations(TerrainType.GROUND, api=api)
+    assert {nation: category_from_url(url) for nation, url in nations.items()} == {
+        "Germany": "Category:Germany_ground_vehicles", "Italy": "Category:Italy_ground_vehicles"}
+    transport.requests.clear()
+
+    vehicles = list(get_vehicles_by_category("Category:Germany_ground_vehicles", api=api))
+
+    assert len(vehicles) == 32 and vehicles[0] == "Maus" and vehicles[-1] == "Flakpanzer_341"
+    assert [params.get("cmcontinue") for params in transport.requests] == [None, "page|20"]
+
+
+def test_revisions_are_requested_in_batches_of_50(api, transport, cache):
+    vehicles = list_vehicles(api)
+    transport.requests.clear()
+
+    pages = list(fetch_vehicle_pages(vehicles, api=api, cache=cache))
+
+    batches = [params["titles"].split("|") for params in transport.requests if params.get("prop") == "revisions"]
+    assert len(vehicles) == 63
+    assert [len(batch) for batch in batches] == [50, 13]
+    assert sum(batches, []) == vehicles
+    assert len(pages) == len(vehicles)
+
+
+def test_unchanged_revisions_are_not_rendered(api, transport, cache):
+    vehicles = list_vehicles(api)
+    transport.requests.clear()
+
+    pages = {page.vehicle: page for page in fetch_vehicle_pages(vehicles, api=api, cache=cache)}
+
+    assert sorted(params["page"] for params in transport.requests if params["action"] == "parse") == sorted(CHANGED)
+    assert sorted(vehicle for vehicle, page in pages.items() if page.content is not None) == sorted(CHANGED)
+    assert all(page.revid is not None and page.error is None for page in pages.values())
+    maus = pages["Maus"]
+    assert maus.terrain == TerrainType.GROUND and maus.revid == 740000
+    assert maus.content.startswith('<div class="mw-parser-output">')
+
+
+def test_store_vehicle_pages_stores_the_changed_revisions(api, cache, store):
+    vehicles = list_vehicles(api)
+
+    counts = store_vehicle_pages(vehicles, api=api, cache=cache)
+
+    assert counts == {"stored": 2, "unchanged": 61, "missing": 0, "special": 0, "failed": 0}
+    assert sorted(store.vehicles()) == sorted(CHANGED)
+    assert cache.revision(get_vehicle_url("M24_(Italy)")) == 740416
+
+
+def test_revisions_follow_normalization_and_redirects(api):
+    revisions = api.revisions(["Pz.Kpfw._VI_Tiger", "M24_(Italy)", "Object_279"])
+
+    assert set(revisions) == {"Pz.Kpfw._VI_Tiger", "M24_(Italy)"} # the missing page is left out
+    assert revisions["Pz.Kpfw._VI_Tiger"].title == "Tiger H1" # normalized to "Pz.Kpfw. VI Tiger", which redirects
+    assert revisions["M24_(Italy)"].title == "M24 (Italy)"
+    assert revisions["M24_(Italy)"].revid == 740416
+
+
+def test_api_errors_are_raised(api):
+    with pytest.raises(WikiApiError) as error:
+        api.parse("Object_279")
+    assert error.value.code == "missingtitle"
+
+
+def test_unrecorded_requests_fail(api):
+    with pytest.raises(FileNotFoundError):
+        api.parse("Object_292")
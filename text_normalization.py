@@ -0,0 +1,90 @@
+"""Normalization of the characters that keep breaking the parsers number conversions
+
+unicode_checker.py --table writes the table as JSON, {"U+00A0": " ", ...}. The parser applies the process-wide table
+(set with set_normalization_table() or the WTSCRAPER_NORMALIZATION_TABLE environment variable) to every page before
+building its tree, see normalize_page. Without a table the pages are parsed as stored.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+_normalization: Optional[Dict[int, str]] = None
+
+
+def write_normalization_table(table: Dict[str, str], filename: str) -> None:
+    """writes a normalization table as JSON, {"U+00A0": " ", ...}
+
+    Parameters
+    ----------
+    table : Dict[str, str]
+        character -> replacement
+    filename : str
+        path of the JSON file
+    """
+    with open(filename, "w", encoding="utf-8") as table_file:
+        json.dump({f"U+{ord(character):04X}": replacement for character, replacement in sorted(table.items())}, table_file, indent=2)
+
+
+def load_normalization_table(filename: str) -> Dict[str, str]:
+    """reads a normalization table written by write_normalization_table
+
+    Parameters
+    ----------
+    filename : str
+        path of the JSON file
+
+    Returns
+    -------
+    Dict[str, str]
+        character -> replacement
+    """
+    with open(filename, "r", encoding="utf-8") as table_file:
+        return {chr(int(codepoint[2:], 16)): replacement for codepoint, replacement in json.load(table_file).items()}
+
+
+def set_normalization_table(table: Optional[Dict[str, str]]) -> None:
+    """sets the process-wide normalization table of the parser
+
+    Parameters
+    ----------
+    table : Optional[Dict[str, str]]
+        character -> replacement, None (or an empty table) parses the pages as stored
+    """
+    global _normalization
+    _normalization = str.maketrans(table) if table else None
+
+
+def get_normalization_table() -> Optional[Dict[str, str]]:
+    """returns the process-wide normalization table, e.g. to hand it to worker processes
+
+    Returns
+    -------
+    Optional[Dict[str, str]]
+        character -> replacement, None if the pages are parsed as stored
+    """
+    if _normalization is None:
+        return None
+    return {chr(codepoint): replacement for codepoint, replacement in _normalization.items()}
+
+
+def normalize_page(content: str) -> str:
+    """applies the process-wide normalization table to a page
+
+    Parameters
+    ----------
+    content : str
+        html of a page
+
+    Returns
+    -------
+    str
+        the normalized html, the page itself without a table
+    """
+    if _normalization is None:
+        return content
+    return content.translate(_normalization)
+
+
+if os.environ.get("WTSCRAPER_NORMALIZATION_TABLE"):
+    set_normalization_table(load_normalization_table(os.environ["WTSCRAPER_NORMALIZATION_TABLE"]))
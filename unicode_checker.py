@@ -1,15 +1,282 @@
 # curtessy to https://www.utf8-chartable.de
+"""Scans the stored pages for unusual characters and builds the normalization table the parser applies
 
+The wiki sprinkles its values with no-break and thin spaces, minus signs and other look-alikes, which keep breaking
+the int(...) conversions of the parser.
+
+python unicode_checker.py [--store page_store] [--workers 8] [--json unicode_report.json] [--table normalization.json]
+python unicode_checker.py Object_685.html ...    # scans html files instead of the page store
+
+Every page is read in chunks of CHUNK_SIZE characters inside a process pool and searched for the characters outside
+of printable ASCII. Pages that are stored more than once are only scanned once. The report lists every found
+codepoint with its count, the pages it occurs in and the offsets (characters into the page) of its occurrences.
+
+The normalization table maps the found characters that only separate values to plain ASCII:
+
+Zs (no-break, thin, ... spaces)      -> " "
+Cf (zero width spaces, soft hyphens) -> ""
+U+2212 MINUS SIGN                    -> "-"
+
+Anything else (letters of names, →, °, ...) is left alone. The parser applies the table, see text_normalization.
+"""
+
+import argparse
+import json
+import math
+import os
 import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+from metrics import configure_logging, get_logger
+from page_store import DEFAULT_STORE_DIR, PageStore
+from text_normalization import write_normalization_table
+
+CHUNK_SIZE = 1 << 20 # characters read from a page at once
+CHUNKS_PER_WORKER = 4 # like batch_parser, more chunks than workers keeps every worker busy until the very end
+DEFAULT_MAX_OFFSETS = 10 # per codepoint and page, 0 keeps every offset
+UNUSUAL = re.compile(r"[^\t\n\r\x20-\x7e]") # anything but printable ASCII
+SEPARATOR_REPLACEMENTS = {"Zs": " ", "Cf": ""}
+CHARACTER_REPLACEMENTS = {"−": "-"}
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CharacterStats():
+    """Occurrences of a codepoint over all scanned pages
+    """
+    character: str
+    count: int = 0
+    offsets: Dict[str, List[int]] = field(default_factory=dict) # page -> offsets of the occurrences, up to the maximum per page
+
+    @property
+    def codepoint(self) -> str:
+        return f"U+{ord(self.character):04X}"
+
+    @property
+    def name(self) -> str:
+        return unicodedata.name(self.character, "<unnamed>")
+
+    @property
+    def category(self) -> str:
+        return unicodedata.category(self.character)
+
+
+def scan_stream(stream: TextIO, max_offsets: int = DEFAULT_MAX_OFFSETS) -> Dict[str, Tuple[int, List[int]]]:
+    """counts the unusual characters of a text stream, reading it in chunks
+
+    Parameters
+    ----------
+    stream : TextIO
+        the page
+    max_offsets : int, optional
+        offsets kept per character, 0 keeps every offset
+
+    Returns
+    -------
+    Dict[str, Tuple[int, List[int]]]
+        character -> (count, offsets)
+    """
+    found: Dict[str, Tuple[int, List[int]]] = {}
+    position = 0
+    while chunk := stream.read(CHUNK_SIZE):
+        for match in UNUSUAL.finditer(chunk): # single characters, so no match can be split between two chunks
+            character = match.group()
+            count, offsets = found.get(character, (0, []))
+            if not max_offsets or len(offsets) < max_offsets:
+                offsets.append(position + match.start())
+            found[character] = (count + 1, offsets)
+        position += len(chunk)
+    return found
+
+
+_WORKER_STORE: Optional[PageStore] = None
+
+def _init_worker(store_root: Optional[str]) -> None:
+    """opens the page store once per worker process
+
+    Parameters
+    ----------
+    store_root : Optional[str]
+        directory of the page store, None scans files
+    """
+    global _WORKER_STORE
+    _WORKER_STORE = PageStore(root=store_root) if store_root is not None else None
+
+
+def _scan_chunk(sources: List[str], max_offsets: int) -> List[Tuple[str, Dict[str, Tuple[int, List[int]]]]]:
+    """scans a chunk of pages inside a worker process
+
+    Parameters
+    ----------
+    sources : List[str]
+        sha256 of stored pages or paths of html files
+    max_offsets : int
+        offsets kept per character and page
+
+    Returns
+    -------
+    List[Tuple[str, Dict[str, Tuple[int, List[int]]]]]
+        the findings per source, see scan_stream
+    """
+    results = []
+    for source in sources:
+        try:
+            with _WORKER_STORE.open_blob(source) if _WORKER_STORE is not None else open(source, "r", encoding="utf-8") as stream:
+                results.append((source, scan_stream(stream, max_offsets=max_offsets)))
+        except (OSError, UnicodeDecodeError) as error:
+            logger.warning("%s can't be scanned: %r", source, error)
+    return results
+
+
+def scan_pages(pages: Dict[str, List[str]], store_root: Optional[str] = None, workers: Optional[int] = None,
+               max_offsets: int = DEFAULT_MAX_OFFSETS) -> Dict[str, CharacterStats]:
+    """scans many pages for unusual characters using a process pool
+
+    Parameters
+    ----------
+    pages : Dict[str, List[str]]
+        source -> names it is reported as; a source is the sha256 of a stored page (or the path of a html file
+        without a store), a page stored for several vehicles is only scanned once
+    store_root : Optional[str], optional
+        directory of the page store, None reads the sources as files
+    workers : Optional[int], optional
+        amount of worker processes, defaults to the amount of CPUs
+    max_offsets : int, optional
+        offsets kept per character and page, 0 keeps every offset
+
+    Returns
+    -------
+    Dict[str, CharacterStats]
+        character -> its occurrences, ordered by count
+    """
+    stats: Dict[str, CharacterStats] = {}
+    if not pages:
+        return stats
+    sources = list(pages)
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, math.ceil(len(sources) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [sources[start:start + chunk_size] for start in range(0, len(sources), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker, initargs=(store_root,)) as executor:
+        for future in as_completed([executor.submit(_scan_chunk, chunk, max_offsets) for chunk in chunks]):
+            for source, found in future.result():
+                for character, (count, offsets) in found.items():
+                    character_stats = stats.setdefault(character, CharacterStats(character=character))
+                    for name in pages[source]:
+                        character_stats.count += count
+                        character_stats.offsets[name] = offsets
+    return dict(sorted(stats.items(), key=lambda item: (-item[1].count, item[0])))
+
+
+def scan_store(store_root: str = DEFAULT_STORE_DIR, vehicles: Optional[Iterable[str]] = None, workers: Optional[int] = None,
+               max_offsets: int = DEFAULT_MAX_OFFSETS) -> Dict[str, CharacterStats]:
+    """scans the stored pages for unusual characters
+
+    Parameters
+    ----------
+    store_root : str, optional
+        directory of the page store
+    vehicles : Optional[Iterable[str]], optional
+        names of the vehicles, defaults to every stored vehicle
+    workers : Optional[int], optional
+        amount of worker processes, defaults to the amount of CPUs
+    max_offsets : int, optional
+        offsets kept per character and page, 0 keeps every offset
+
+    Returns
+    -------
+    Dict[str, CharacterStats]
+        character -> its occurrences per vehicle, ordered by count
+    """
+    store = PageStore(root=store_root)
+    pages: Dict[str, List[str]] = {}
+    for vehicle in vehicles if vehicles is not None else store.vehicles():
+        entry = store.lookup(vehicle)
+        if entry is not None:
+            pages.setdefault(entry.sha256, []).append(vehicle)
+    store.close()
+    return scan_pages(pages=pages, store_root=store_root, workers=workers, max_offsets=max_offsets)
+
+
+def build_normalization_table(characters: Iterable[str]) -> Dict[str, str]:
+    """picks the replacements of the characters that only separate values, see the module description
+
+    Parameters
+    ----------
+    characters : Iterable[str]
+        the found characters
+
+    Returns
+    -------
+    Dict[str, str]
+        character -> replacement
+    """
+    table = {}
+    for character in characters:
+        replacement = CHARACTER_REPLACEMENTS.get(character, SEPARATOR_REPLACEMENTS.get(unicodedata.category(character)))
+        if replacement is not None:
+            table[character] = replacement
+    return table
+
+
+def print_report(stats: Dict[str, CharacterStats], table: Dict[str, str], examples: int = 3, file: TextIO = sys.stdout) -> None:
+    """prints one line per codepoint: count, pages, replacement and the first occurrences
+
+    Parameters
+    ----------
+    stats : Dict[str, CharacterStats]
+        see scan_pages
+    table : Dict[str, str]
+        the normalization table
+    examples : int, optional
+        occurrences shown per codepoint
+    file : TextIO, optional
+        where to print to
+    """
+    print(f"{'codepoint':<10}{'name':<36}{'cat':<5}{'count':>9}{'pages':>7}  {'->':<5}examples", file=file)
+    for character, character_stats in stats.items():
+        replacement = json.dumps(table[character]) if character in table else ""
+        occurrences = [f"{page}@{offset}" for page, offsets in character_stats.offsets.items() for offset in offsets[:1]][:examples]
+        print(f"{character_stats.codepoint:<10}{character_stats.name[:35]:<36}{character_stats.category:<5}{character_stats.count:>9}"
+              f"{len(character_stats.offsets):>7}  {replacement:<5}{' '.join(occurrences)}", file=file)
+
+
+def __main__():
+    """scans the page store (or the given html files) and writes the report and the normalization table
+    """
+    parser = argparse.ArgumentParser(description="Finds the unusual characters of the stored pages and builds the parsers normalization table")
+    parser.add_argument("files", nargs="*", help="html files to scan instead of the page store")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--workers", type=int, help="amount of worker processes, defaults to the amount of CPUs")
+    parser.add_argument("--max-offsets", type=int, default=DEFAULT_MAX_OFFSETS, help="offsets kept per codepoint and page, 0 keeps all")
+    parser.add_argument("--json", metavar="FILE", help="write the full report with every kept offset as JSON")
+    parser.add_argument("--table", metavar="FILE", help="write the normalization table, see text_normalization")
+    parser.add_argument("--log-level", default="WARNING", help="DEBUG, INFO, WARNING or ERROR")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    if args.files:
+        stats = scan_pages(pages={filename: [filename] for filename in args.files}, workers=args.workers, max_offsets=args.max_offsets)
+    else:
+        stats = scan_store(store_root=args.store, workers=args.workers, max_offsets=args.max_offsets)
+    table = build_normalization_table(stats)
+    print_report(stats, table)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            entries = [
+                {"codepoint": character_stats.codepoint, "character": character, "name": character_stats.name, "category": character_stats.category,
+                 "count": character_stats.count, "replacement": table.get(character), "offsets": character_stats.offsets}
+                for character, character_stats in stats.items()
+            ]
+            json_file.write("[\n" + ",\n".join(json.dumps(entry, ensure_ascii=False) for entry in entries) + "\n]\n") # a line per codepoint
+    if args.table:
+        write_normalization_table(table, args.table)
+        print(f"Wrote {len(table)} replacements to {args.table}")
+
+if __name__ == "__main__":
+    __main__()
 
-filename = "Object_685.html"
-pattern = re.compile(r"[^\u0020-\u007d\s→°·]") # re search to find all non ASCII Unicode chars, excluding the arrows, degrees and llist dots
-outfile = "regex.chk"
-newline = "\n"
-utf_8_encoding = "utf-8"
-
-with open(file=outfile, mode="a", encoding=utf_8_encoding) as outf:
-    with open(file=filename, mode="r", encoding=utf_8_encoding) as fifo:
-        results = re.findall(pattern=pattern, string=fifo.read())
-        if len(results) > 2:
-            outf.write(f"{filename}: {newline}{newline.join(f'{x} -->  {bytes(x, encoding=utf_8_encoding)}'  for x in results[:-1])}{newline}{'*' * 75}{newline}")
\ No newline at end of file
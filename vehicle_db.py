@@ -0,0 +1,379 @@
+"""SQLite storage of the parsed vehicles, following the DB layout of TODO.py
+
+metadata           : key/value pairs like the last changelog update
+ground_vehicles    : one row per vehicle, the queried values as columns plus the full vehicle as JSON document
+ground_sections    : section hashes of the page each vehicle was parsed from, see page_sections
+ground_armaments   : one row per armament, references its vehicle
+ground_ammunition  : one row per round, references its armament and vehicle
+aerial_vehicles, aerial_ammunition, naval_vehicles, naval_ammunition : prepared for the upcoming parsers
+
+Whole batches of vehicles are written inside a single transaction with executemany upserts, so re-parsing the
+complete catalog commits at once instead of row by row.
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from serialization import tank_from_dict, tank_to_dict
+from tanks import Tank
+
+DEFAULT_DB_FILE = "vehicles.sqlite"
+DEFAULT_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ground_vehicles (
+    name TEXT PRIMARY KEY,
+    nation TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    vehicle_class TEXT NOT NULL,
+    br_arcade REAL NOT NULL,
+    br_realistic REAL NOT NULL,
+    br_simulator REAL NOT NULL,
+    is_premium INTEGER NOT NULL,
+    is_squadron INTEGER NOT NULL,
+    cost INTEGER NOT NULL,
+    research INTEGER NOT NULL,
+    crew INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    document TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ground_vehicles_nation ON ground_vehicles (nation);
+CREATE INDEX IF NOT EXISTS ground_vehicles_rank ON ground_vehicles (rank);
+CREATE INDEX IF NOT EXISTS ground_vehicles_class ON ground_vehicles (vehicle_class);
+CREATE INDEX IF NOT EXISTS ground_vehicles_br_arcade ON ground_vehicles (br_arcade);
+CREATE INDEX IF NOT EXISTS ground_vehicles_br_realistic ON ground_vehicles (br_realistic);
+CREATE INDEX IF NOT EXISTS ground_vehicles_br_simulator ON ground_vehicles (br_simulator);
+CREATE INDEX IF NOT EXISTS ground_vehicles_nation_rank ON ground_vehicles (nation, rank);
+
+CREATE TABLE IF NOT EXISTS ground_sections (
+    page TEXT PRIMARY KEY,
+    vehicle TEXT NOT NULL REFERENCES ground_vehicles (name) ON DELETE CASCADE,
+    hashes TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ground_sections_vehicle ON ground_sections (vehicle);
+
+CREATE TABLE IF NOT EXISTS ground_armaments (
+    id INTEGER PRIMARY KEY,
+    vehicle TEXT NOT NULL REFERENCES ground_vehicles (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    fire_rate INTEGER NOT NULL,
+    stabilizer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ground_armaments_vehicle ON ground_armaments (vehicle);
+
+CREATE TABLE IF NOT EXISTS ground_ammunition (
+    id INTEGER PRIMARY KEY,
+    armament_id INTEGER NOT NULL REFERENCES ground_armaments (id) ON DELETE CASCADE,
+    vehicle TEXT NOT NULL REFERENCES ground_vehicles (name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    ammo_type TEXT NOT NULL,
+    pen_10 INTEGER NOT NULL,
+    pen_100 INTEGER NOT NULL,
+    pen_500 INTEGER NOT NULL,
+    pen_1000 INTEGER NOT NULL,
+    pen_1500 INTEGER NOT NULL,
+    pen_2000 INTEGER NOT NULL,
+    velocity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ground_ammunition_armament ON ground_ammunition (armament_id);
+CREATE INDEX IF NOT EXISTS ground_ammunition_vehicle ON ground_ammunition (vehicle);
+CREATE INDEX IF NOT EXISTS ground_ammunition_type ON ground_ammunition (ammo_type);
+
+CREATE TABLE IF NOT EXISTS aerial_vehicles (
+    name TEXT PRIMARY KEY,
+    nation TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    vehicle_class TEXT NOT NULL,
+    br_arcade REAL NOT NULL,
+    br_realistic REAL NOT NULL,
+    br_simulator REAL NOT NULL,
+    document TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS aerial_vehicles_nation_rank ON aerial_vehicles (nation, rank);
+CREATE INDEX IF NOT EXISTS aerial_vehicles_br_realistic ON aerial_vehicles (br_realistic);
+
+CREATE TABLE IF NOT EXISTS aerial_ammunition (
+    id INTEGER PRIMARY KEY,
+    vehicle TEXT NOT NULL REFERENCES aerial_vehicles (name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS aerial_ammunition_vehicle ON aerial_ammunition (vehicle);
+
+CREATE TABLE IF NOT EXISTS naval_vehicles (
+    name TEXT PRIMARY KEY,
+    nation TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    vehicle_class TEXT NOT NULL,
+    br_arcade REAL NOT NULL,
+    br_realistic REAL NOT NULL,
+    br_simulator REAL NOT NULL,
+    document TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS naval_vehicles_nation_rank ON naval_vehicles (nation, rank);
+CREATE INDEX IF NOT EXISTS naval_vehicles_br_realistic ON naval_vehicles (br_realistic);
+
+CREATE TABLE IF NOT EXISTS naval_ammunition (
+    id INTEGER PRIMARY KEY,
+    vehicle TEXT NOT NULL REFERENCES naval_vehicles (name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS naval_ammunition_vehicle ON naval_ammunition (vehicle);
+"""
+
+_UPSERT_GROUND_VEHICLE = """
+INSERT INTO ground_vehicles (name, nation, rank, vehicle_class, br_arcade, br_realistic, br_simulator, is_premium, is_squadron,
+                             cost, research, crew, weight, document, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    nation = excluded.nation, rank = excluded.rank, vehicle_class = excluded.vehicle_class, br_arcade = excluded.br_arcade,
+    br_realistic = excluded.br_realistic, br_simulator = excluded.br_simulator, is_premium = excluded.is_premium,
+    is_squadron = excluded.is_squadron, cost = excluded.cost, research = excluded.research, crew = excluded.crew,
+    weight = excluded.weight, document = excluded.document, updated_at = excluded.updated_at
+"""
+
+
+class VehicleDB():
+    """SQLite vehicle database with bulk upserts
+    """
+
+    def __init__(self, filename: str = DEFAULT_DB_FILE) -> None:
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            path of the SQLite file, created with the schema if missing
+        """
+        self.filename: str = filename
+        self._db = sqlite3.connect(filename)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # WAL keeps the DB consistent, only the last commits are at risk on power loss
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+
+    def upsert_ground_vehicles(self, tanks: Iterable[Tank]) -> int:
+        """inserts or replaces ground vehicles including their armaments and ammunition in a single transaction
+
+        Parameters
+        ----------
+        tanks : Iterable[Tank]
+            the parsed ground vehicles, of a name listed more than once (e.g. under several nations) the last one is written
+
+        Returns
+        -------
+        int
+            amount of written vehicles
+        """
+        tanks = list({tank.name: tank for tank in tanks}.values()) # the name is the key, duplicates would duplicate the child rows
+        now = time.time()
+        vehicle_rows: List[Tuple[Any, ...]] = []
+        armament_rows: List[Tuple[Any, ...]] = []
+        ammo_rows: List[Tuple[Any, ...]] = []
+        with self._db:
+            # an immediate transaction locks out other writers, so the ids below can't be taken in the meantime
+            self._db.execute("BEGIN IMMEDIATE")
+            armament_id = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM ground_armaments").fetchone()[0]
+            ammo_id = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM ground_ammunition").fetchone()[0]
+            for tank in tanks:
+                vehicle_rows.append((
+                    tank.name, tank.nation, tank.rank, tank.vehicle_class.name, tank.battle_rating["Arcade"],
+                    tank.battle_rating["Realistic"], tank.battle_rating["Simulator"], tank.is_premium, tank.is_squadron, tank.cost,
+                    tank.research, tank.crew, tank.weight, json.dumps(tank_to_dict(tank)), now
+                ))
+                for position, armament in enumerate(tank.armaments):
+                    armament_id += 1
+                    armament_rows.append((
+                        armament_id, tank.name, position, armament.name, armament.capacity, armament.fire_rate, armament.stabilizer.name
+                    ))
+                    for ammo in armament.ammo_types:
+                        ammo_id += 1
+                        ammo_rows.append((ammo_id, armament_id, tank.name, ammo.name, ammo.ammo_type, *ammo.pen_at_distance.values(), ammo.velocity))
+            vehicle_names = [(row[0],) for row in vehicle_rows]
+            # the children are replaced as a whole, a vehicle may have lost an armament or round
+            self._db.executemany("DELETE FROM ground_ammunition WHERE vehicle = ?", vehicle_names)
+            self._db.executemany("DELETE FROM ground_armaments WHERE vehicle = ?", vehicle_names)
+            self._db.executemany(_UPSERT_GROUND_VEHICLE, vehicle_rows)
+            self._db.executemany("INSERT INTO ground_armaments (id, vehicle, position, name, capacity, fire_rate, stabilizer) VALUES (?, ?, ?, ?, ?, ?, ?)", armament_rows)
+            self._db.executemany(
+                "INSERT INTO ground_ammunition (id, armament_id, vehicle, name, ammo_type, pen_10, pen_100, pen_500, pen_1000, pen_1500, pen_2000, velocity) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", ammo_rows
+            )
+        return len(vehicle_rows)
+
+    def load_ground_vehicle(self, name: str) -> Optional[Tank]:
+        """loads a stored ground vehicle
+
+        Parameters
+        ----------
+        name : str
+            name of the vehicle
+
+        Returns
+        -------
+        Optional[Tank]
+            the vehicle including its armaments and ammunition, None if it isn't stored
+        """
+        row = self._db.execute("SELECT document FROM ground_vehicles WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return tank_from_dict(json.loads(row[0]))
+
+    def get_ground_sections(self, page: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """reads the section hashes of a page
+
+        Parameters
+        ----------
+        page : str
+            name of the vehicle as used by the wiki (and the page store)
+
+        Returns
+        -------
+        Optional[Tuple[str, Dict[str, str]]]
+            name of the vehicle parsed from the page and the section hashes, None if the page wasn't parsed yet
+        """
+        row = self._db.execute("SELECT vehicle, hashes FROM ground_sections WHERE page = ?", (page,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set_ground_sections(self, sections: Iterable[Tuple[str, str, Dict[str, str]]]) -> None:
+        """stores the section hashes of parsed pages, the vehicles have to be stored already
+
+        Parameters
+        ----------
+        sections : Iterable[Tuple[str, str, Dict[str, str]]]
+            tuples of (page, vehicle name, section hashes)
+        """
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO ground_sections (page, vehicle, hashes) VALUES (?, ?, ?) "
+                "ON CONFLICT (page) DO UPDATE SET vehicle = excluded.vehicle, hashes = excluded.hashes",
+                [(page, vehicle, json.dumps(hashes)) for page, vehicle, hashes in sections]
+            )
+
+    def delete_ground_vehicles(self, names: Iterable[str]) -> None:
+        """deletes ground vehicles, their armaments and ammunition
+
+        Parameters
+        ----------
+        names : Iterable[str]
+            names of the vehicles
+        """
+        with self._db:
+            self._db.executemany("DELETE FROM ground_vehicles WHERE name = ?", [(name,) for name in names])
+
+    def ground_vehicle_names(self) -> List[str]:
+        """lists the stored ground vehicles
+
+        Returns
+        -------
+        List[str]
+            the vehicle names
+        """
+        return [row[0] for row in self._db.execute("SELECT name FROM ground_vehicles ORDER BY name")]
+
+    def query(self, sql: str, parameters: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        """runs a read-only query
+
+        Parameters
+        ----------
+        sql : str
+            the SELECT statement
+        parameters : Tuple[Any, ...], optional
+            values of the placeholders
+
+        Returns
+        -------
+        List[Tuple[Any, ...]]
+            the result rows
+        """
+        return self._db.execute(sql, parameters).fetchall()
+
+    def set_metadata(self, values: Dict[str, str]) -> None:
+        """stores metadata like the last changelog update
+
+        Parameters
+        ----------
+        values : Dict[str, str]
+            key -> value
+        """
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO metadata (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                list(values.items())
+            )
+
+    def get_metadata(self, key: str) -> Optional[str]:
+        """reads a metadata value
+
+        Parameters
+        ----------
+        key : str
+            the metadata key
+
+        Returns
+        -------
+        Optional[str]
+            the value, None if it was never set
+        """
+        row = self._db.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        """closes the database
+        """
+        self._db.close()
+
+
+def __main__():
+    """parses every stored ground vehicle and writes them to the database in batches
+    """
+    from batch_parser import parse_batch # pulls in the whole parser, only needed for the CLI
+    from page_store import DEFAULT_STORE_DIR, PageStore
+    from terrain import TerrainType
+
+    parser = argparse.ArgumentParser(description="Parses the stored ground vehicles into the vehicle database")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the page store")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="path of the SQLite database")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="amount of vehicles written per transaction")
+    parser.add_argument("--workers", type=int, help="amount of parser processes, defaults to the amount of CPUs")
+    args = parser.parse_args()
+
+    database = VehicleDB(filename=args.db)
+    vehicles = PageStore(root=args.store).vehicles(terrain=TerrainType.GROUND)
+    batch: List[Tank] = []
+    written = failed = 0
+    write_time = 0.0
+    for result in parse_batch(vehicles=vehicles, store_root=args.store, workers=args.workers):
+        if result.tank is None:
+            failed += 1
+            print(f"Parsing failed: {result.vehicle}")
+            continue
+        batch.append(result.tank)
+        if len(batch) >= args.batch_size:
+            start = time.perf_counter()
+            written += database.upsert_ground_vehicles(batch)
+            write_time += time.perf_counter() - start
+            batch = []
+    start = time.perf_counter()
+    written += database.upsert_ground_vehicles(batch)
+    write_time += time.perf_counter() - start
+    database.close()
+    print(f"Wrote {written} vehicles in {write_time:.2f}s, {failed} failed to parse")
+
+if __name__ == "__main__":
+    __main__()
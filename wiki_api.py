@@ -0,0 +1,579 @@
+"""Fetches vehicle pages through the wikis api.php instead of the rendered pages
+
+The rendered pages carry the whole skin and navigation and every vehicle costs a request. Through the MediaWiki API
+
+action=parse         : renders the tech tree pages listing the nations
+list=categorymembers : lists the vehicles of a nations category, 500 per request, following the continuation
+list=recentchanges   : lists the changes since the last update, 500 per request, following the continuation
+prop=revisions       : returns the current revision IDs of up to API_BATCH_SIZE titles per request
+action=parse         : renders a single vehicle page without any skin, navigation, edit links or limit report
+
+so a crawl needs one revisions request per API_BATCH_SIZE vehicles to find the changed ones and only renders those.
+The revision IDs are kept in the fetchers ResponseCache, keyed by the vehicles URL like the rendered pages.
+
+Every API call goes through a transport, a callable from the request parameters to the decoded JSON response.
+FetcherTransport uses the shared fetcher, RecordingTransport saves every response to a directory and
+RecordedTransport replays them, so the whole API mode runs offline against recorded responses:
+
+python wiki_api.py --record api_recordings Maus
+python wiki_api.py --replay api_recordings Maus
+
+tests/fixtures/api holds the recordings replayed by tests/test_wiki_api.py.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from fetcher import configure_fetcher, get_fetcher
+from metrics import configure_logging, get_logger, get_metrics
+from page_store import get_page_store
+from response_cache import ResponseCache
+from terrain import TerrainType
+
+API_BATCH_SIZE = 50 # maximum amount of titles per query for clients without the apihighlimits right
+CATEGORY_LIMIT = 500
+RECENT_CHANGES_LIMIT = 500
+TECH_TREE_PAGES = {TerrainType.GROUND: "Ground_vehicles", TerrainType.AVIATION: "Aviation", TerrainType.NAVAL: "Fleet"}
+
+Transport = Callable[[Dict[str, str]], Dict[str, Any]]
+
+logger = get_logger(__name__)
+
+
+class WikiApiError(RuntimeError):
+    """The API answered with an error
+    """
+
+    def __init__(self, code: str, info: str) -> None:
+        """
+        Parameters
+        ----------
+        code : str
+            the error code, e.g. "missingtitle"
+        info : str
+            human readable description of the error
+        """
+        super().__init__(f"{code}: {info}")
+        self.code: str = code
+
+
+class Revision(NamedTuple):
+    """Current revision of a page
+    """
+    title: str # as the wiki names the page, after normalization and redirects
+    pageid: int
+    revid: int
+    timestamp: str # ISO 8601, UTC
+
+
+class ParsedPage(NamedTuple):
+    """A page rendered by action=parse
+    """
+    title: str
+    revid: int
+    content: str # html of the article, the <div class="mw-parser-output"> read by the parsers
+    categories: List[str] # in the order the page lists them
+
+
+class ApiVehiclePage(NamedTuple):
+    """Outcome of fetching a single vehicle, see fetch_vehicle_pages
+    """
+    vehicle: str
+    revid: Optional[int] # None if the wiki doesn't have the page
+    content: Optional[str] # None if the page is missing, its revision didn't change or it failed
+    terrain: Optional[TerrainType]
+    error: Optional[Exception] = None # why the page couldn't be fetched
+
+
+def get_api_url() -> str:
+    """builds the URL of the wikis API
+
+    Returns
+    -------
+    str
+        URL of api.php
+    """
+    import scrape_wt_wiki # read on every call, BASE_URL may be pointed somewhere else
+    return f"{scrape_wt_wiki.BASE_URL}/api.php"
+
+
+def recording_filename(directory: str, params: Dict[str, str]) -> str:
+    """names the file of a recorded response after its request parameters
+
+    Parameters
+    ----------
+    directory : str
+        directory of the recordings
+    params : Dict[str, str]
+        the request parameters
+
+    Returns
+    -------
+    str
+        path of the recording
+    """
+    digest = hashlib.sha256(urlencode(sorted(params.items())).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{params.get('action', 'api')}-{digest}.json")
+
+
+class FetcherTransport():
+    """Sends the API requests through the shared fetcher (pooled, rate limited, instrumented)
+    """
+
+    def __init__(self, api_url: Optional[str] = None) -> None:
+        """
+        Parameters
+        ----------
+        api_url : Optional[str], optional
+            URL of api.php, defaults to the one below scrape_wt_wiki.BASE_URL
+        """
+        self.api_url: Optional[str] = api_url
+
+    def __call__(self, params: Dict[str, str]) -> Dict[str, Any]:
+        response = get_fetcher().get(self.api_url or get_api_url(), params=params)
+        response.raise_for_status()
+        return response.json()
+
+
+class RecordingTransport():
+    """Saves every response of another transport, see RecordedTransport
+    """
+
+    def __init__(self, directory: str, transport: Optional[Transport] = None) -> None:
+        """
+        Parameters
+        ----------
+        directory : str
+            receives one JSON file per request
+        transport : Optional[Transport], optional
+            sends the requests, defaults to a FetcherTransport
+        """
+        self.directory: str = directory
+        self.transport: Transport = transport or FetcherTransport()
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, params: Dict[str, str]) -> Dict[str, Any]:
+        response = self.transport(params)
+        filename = recording_filename(self.directory, params)
+        with open(f"{filename}.tmp", "w", encoding="utf-8") as recording:
+            json.dump({"params": params, "response": response}, recording, indent=1, ensure_ascii=False)
+        os.replace(f"{filename}.tmp", filename)
+        return response
+
+
+class RecordedTransport():
+    """Answers the API requests from the responses saved by a RecordingTransport, without any network access
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Parameters
+        ----------
+        directory : str
+            directory of the recordings
+        """
+        self.directory: str = directory
+
+    def __call__(self, params: Dict[str, str]) -> Dict[str, Any]:
+        filename = recording_filename(self.directory, params)
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"no recorded response for {urlencode(sorted(params.items()))} in {self.directory}")
+        with open(filename, "r", encoding="utf-8") as recording:
+            return json.load(recording)["response"]
+
+
+class WikiApi():
+    """Client of the MediaWiki API
+    """
+
+    def __init__(self, transport: Optional[Transport] = None, batch_size: int = API_BATCH_SIZE) -> None:
+        """
+        Parameters
+        ----------
+        transport : Optional[Transport], optional
+            sends the requests, defaults to a FetcherTransport
+        batch_size : int, optional
+            titles per revisions query
+        """
+        self.transport: Transport = transport or FetcherTransport()
+        self.batch_size: int = batch_size
+
+    def request(self, **params: str) -> Dict[str, Any]:
+        """sends a single API request
+
+        Parameters
+        ----------
+        **params
+            the request parameters, format and formatversion are added
+
+        Returns
+        -------
+        Dict[str, Any]
+            the decoded response
+
+        Raises
+        ------
+        WikiApiError
+            the API answered with an error
+        """
+        response = self.transport({"format": "json", "formatversion": "2", **params})
+        get_metrics().increment("api_requests", action=params.get("action", ""))
+        if "error" in response:
+            raise WikiApiError(code=response["error"].get("code", ""), info=response["error"].get("info", ""))
+        for module, warning in response.get("warnings", {}).items():
+            logger.warning("%s: %s", module, warning.get("warnings", warning))
+        return response
+
+    def query(self, **params: str) -> Iterator[Dict[str, Any]]:
+        """runs an action=query request and its continuations
+
+        Parameters
+        ----------
+        **params
+            the query parameters
+
+        Yields
+        ------
+        Iterator[Dict[str, Any]]
+            the "query" part of every response
+        """
+        continuation: Dict[str, str] = {}
+        while True:
+            response = self.request(action="query", **params, **continuation)
+            yield response.get("query", {})
+            if "continue" not in response:
+                return
+            continuation = response["continue"]
+
+    def category_members(self, category: str) -> Iterator[str]:
+        """lists the pages of a category
+
+        Parameters
+        ----------
+        category : str
+            title of the category, e.g. "Category:Germany_ground_vehicles"
+
+        Yields
+        ------
+        Iterator[str]
+            titles of the member pages (namespace 0 only)
+        """
+        for query in self.query(list="categorymembers", cmtitle=category, cmnamespace="0", cmtype="page", cmlimit=str(CATEGORY_LIMIT)):
+            for member in query.get("categorymembers", []):
+                yield member["title"]
+
+    def recent_changes(self, start: str) -> Iterator[Tuple[str, str, int]]:
+        """lists the changed pages from a point in time on, oldest first
+
+        Parameters
+        ----------
+        start : str
+            timestamp of the oldest change to list (YYYYMMDDHHMMSS or ISO 8601, UTC), inclusive
+
+        Yields
+        ------
+        Iterator[Tuple[str, str, int]]
+            (title, ISO 8601 timestamp, revid) of every edit, new page and log entry (moves, deletions, their revid is 0)
+        """
+        for query in self.query(list="recentchanges", rcstart=start, rcdir="newer", rcprop="title|timestamp|ids",
+                                rctype="edit|new|log", rclimit=str(RECENT_CHANGES_LIMIT)):
+            for change in query.get("recentchanges", []):
+                yield change["title"], change["timestamp"], change.get("revid", 0)
+
+    def revisions(self, titles: List[str]) -> Dict[str, Revision]:
+        """returns the current revisions of some pages with a single query (plus continuations)
+
+        Parameters
+        ----------
+        titles : List[str]
+            titles of the pages, at most batch_size
+
+        Returns
+        -------
+        Dict[str, Revision]
+            requested title -> revision, missing pages are left out
+        """
+        resolved = {title: title for title in titles}
+        by_title: Dict[str, Revision] = {}
+        for query in self.query(prop="revisions", rvprop="ids|timestamp", redirects="1", titles="|".join(titles)):
+            for renames in (query.get("normalized", []), query.get("redirects", [])): # normalization happens before the redirects
+                targets = {rename["from"]: rename["to"] for rename in renames}
+                for title, current in resolved.items():
+                    resolved[title] = targets.get(current, current)
+            for page in query.get("pages", []):
+                if page.get("missing") or page.get("invalid") or not page.get("revisions"):
+                    continue
+                revision = page["revisions"][0]
+                by_title[page["title"]] = Revision(title=page["title"], pageid=page["pageid"], revid=revision["revid"], timestamp=revision["timestamp"])
+        return {title: by_title[current] for title, current in resolved.items() if current in by_title}
+
+    def parse(self, title: str) -> ParsedPage:
+        """renders the article of a page
+
+        Parameters
+        ----------
+        title : str
+            title of the page, redirects are followed
+
+        Returns
+        -------
+        ParsedPage
+            the rendered article with its revision and categories
+        """
+        parsed = self.request(action="parse", page=title, redirects="1", prop="text|revid|categories",
+                              disableeditsection="1", disablelimitreport="1", disabletoc="1")["parse"]
+        content = parsed["text"]
+        if "mw-parser-output" not in content: # older MediaWikis return the article without its wrapper
+            content = f'<div class="mw-parser-output">{content}</div>'
+        categories = [category["category"] for category in parsed.get("categories", []) if not category.get("hidden")]
+        return ParsedPage(title=parsed["title"], revid=parsed["revid"], content=content, categories=categories)
+
+
+def category_from_url(nation_url: str) -> str:
+    """extracts the category title from the URL of a nations category page
+
+    Parameters
+    ----------
+    nation_url : str
+        e.g. https://wiki.warthunder.com/Category:Germany_ground_vehicles
+
+    Returns
+    -------
+    str
+        e.g. "Category:Germany_ground_vehicles"
+    """
+    from scrape_wt_wiki import vehicle_from_url
+    return vehicle_from_url(nation_url)
+
+
+def terrain_from_categories(categories: Iterable[str]) -> Optional[TerrainType]:
+    """determines the terrain of a page by the first category that names one
+
+    Parameters
+    ----------
+    categories : Iterable[str]
+        the pages categories, see ParsedPage
+
+    Returns
+    -------
+    Optional[TerrainType]
+        the vehicles terrain, None for special pages (bombs, rockets etc...)
+    """
+    from scrape_wt_wiki import terrain_from_category
+    for category in categories:
+        terrain = terrain_from_category(category.replace("_", " "))
+        if terrain is not None:
+            return terrain
+    return None
+
+
+def get_nations(terrain: TerrainType, api: Optional[WikiApi] = None) -> Dict[str, str]:
+    """lists the nations of a terrain from its rendered tech tree page, like scrape_wt_wiki.get_ground_nations
+
+    Parameters
+    ----------
+    terrain : TerrainType
+        the environment
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+
+    Returns
+    -------
+    Dict[str, str]
+        Dict with nation's name as key and their tech tree URL as value
+    """
+    from scrape_wt_wiki import get_nation
+    api = api or WikiApi()
+    return get_nation(content=api.parse(TECH_TREE_PAGES[terrain]).content)
+
+
+def get_vehicles_by_category(category: str, api: Optional[WikiApi] = None) -> Dict[str, str]:
+    """lists the vehicles of a nations category, like scrape_wt_wiki.get_vehicles_by_nation
+
+    Parameters
+    ----------
+    category : str
+        title of the category, see category_from_url
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+
+    Returns
+    -------
+    Dict[str, str]
+        Dict containing a vehicles name as key and the corresponding URL as value
+    """
+    from scrape_wt_wiki import get_vehicle_url, vehicle_from_title
+    api = api or WikiApi()
+    return {vehicle_from_title(title): get_vehicle_url(vehicle_from_title(title)) for title in api.category_members(category)}
+
+
+def fetch_vehicle_pages(vehicles: Iterable[str], api: Optional[WikiApi] = None, cache: Optional[ResponseCache] = None,
+                        terrain: Optional[TerrainType] = None) -> Iterator[ApiVehiclePage]:
+    """fetches the rendered articles of many vehicles, skipping the ones whose revision didn't change
+
+    Parameters
+    ----------
+    vehicles : Iterable[str]
+        names of the vehicles as used by the wiki
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+    cache : Optional[ResponseCache], optional
+        holds the revisions of the stored pages, defaults to the cache of the shared fetcher, None renders every page
+    terrain : Optional[TerrainType], optional
+        terrain of the vehicles if known (e.g. from their category), otherwise it is taken from the pages categories
+
+    Yields
+    ------
+    Iterator[ApiVehiclePage]
+        one result per vehicle, the rendered ones in the order of completion
+    """
+    from scrape_wt_wiki import get_vehicle_url
+    api = api or WikiApi()
+    cache = cache if cache is not None else get_fetcher().cache
+    vehicles = list(vehicles)
+    for start in range(0, len(vehicles), api.batch_size):
+        batch = vehicles[start:start + api.batch_size]
+        revisions = api.revisions(batch)
+        changed = []
+        for vehicle in batch:
+            revision = revisions.get(vehicle)
+            if revision is None:
+                yield ApiVehiclePage(vehicle=vehicle, revid=None, content=None, terrain=None)
+            elif cache is not None and cache.revision(get_vehicle_url(vehicle)) == revision.revid:
+                yield ApiVehiclePage(vehicle=vehicle, revid=revision.revid, content=None, terrain=None)
+            else:
+                changed.append(vehicle)
+        for vehicle, page, error in get_fetcher().fetch_all(changed, fetch=lambda title: _parse_if_exists(api, title)):
+            if error is not None:
+                yield ApiVehiclePage(vehicle=vehicle, revid=revisions[vehicle].revid, content=None, terrain=None, error=error)
+            elif page is None:
+                yield ApiVehiclePage(vehicle=vehicle, revid=None, content=None, terrain=None)
+            else:
+                yield ApiVehiclePage(vehicle=vehicle, revid=page.revid, content=page.content, terrain=terrain or terrain_from_categories(page.categories))
+
+
+def _parse_if_exists(api: WikiApi, title: str) -> Optional[ParsedPage]:
+    try:
+        return api.parse(title)
+    except WikiApiError as error:
+        if error.code != "missingtitle": # deleted since its revision was queried
+            raise
+        return None
+
+
+def store_vehicle_pages(vehicles: Iterable[str], api: Optional[WikiApi] = None, cache: Optional[ResponseCache] = None,
+                        terrain: Optional[TerrainType] = None) -> Dict[str, int]:
+    """fetches vehicles through the API and stores the changed pages, like scrape_wt_wiki.get_vehicles_specs
+
+    Parameters
+    ----------
+    vehicles : Iterable[str]
+        names of the vehicles as used by the wiki
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+    cache : Optional[ResponseCache], optional
+        holds the revisions of the stored pages, defaults to the cache of the shared fetcher
+    terrain : Optional[TerrainType], optional
+        terrain of the vehicles if known
+
+    Returns
+    -------
+    Dict[str, int]
+        amount of stored, unchanged, missing, special (no vehicle terrain) and failed pages
+    """
+    from scrape_wt_wiki import get_vehicle_url
+    cache = cache if cache is not None else get_fetcher().cache
+    counts = {"stored": 0, "unchanged": 0, "missing": 0, "special": 0, "failed": 0}
+    for page in fetch_vehicle_pages(vehicles=vehicles, api=api, cache=cache, terrain=terrain):
+        if page.error is not None:
+            logger.error("%s failed: %r", page.vehicle, page.error)
+            counts["failed"] += 1
+        elif page.revid is None:
+            logger.warning("%s doesn't exist on the wiki", page.vehicle)
+            counts["missing"] += 1
+        elif page.content is None:
+            get_page_store().touch(page.vehicle) # same revision, restarts its max_age
+            counts["unchanged"] += 1
+        elif page.terrain is None: # I'm still not quite sure if i want to add the special pages (bombs, rockets etc...)
+            counts["special"] += 1
+        else:
+            get_page_store().put(vehicle=page.vehicle, terrain=page.terrain, content=page.content)
+            if cache is not None: # only once the page is stored, a failed write gets rendered again next time
+                cache.set_revision(get_vehicle_url(page.vehicle), page.revid)
+            counts["stored"] += 1
+    return counts
+
+
+def crawl_via_api(terrains: Iterable[TerrainType], api: Optional[WikiApi] = None, max_age: Optional[float] = None) -> Dict[str, int]:
+    """crawls every vehicle of the given terrains through the API
+
+    Parameters
+    ----------
+    terrains : Iterable[TerrainType]
+        the environments to crawl
+    api : Optional[WikiApi], optional
+        the API client, defaults to one using the shared fetcher
+    max_age : Optional[float], optional
+        vehicles stored less than max_age seconds ago aren't requested again, None requests every vehicle
+
+    Returns
+    -------
+    Dict[str, int]
+        amount of nations, vehicles, skipped, stored, unchanged, missing, special and failed pages
+    """
+    from scrape_wt_wiki import get_missing_vehicles
+    api = api or WikiApi()
+    counts = {"nations": 0, "vehicles": 0, "skipped": 0}
+    for terrain in terrains:
+        vehicles: Dict[str, None] = {} # vehicles can be listed by several nations, keeps the order
+        for nation_url in get_nations(terrain=terrain, api=api).values():
+            counts["nations"] += 1
+            vehicles.update(dict.fromkeys(get_vehicles_by_category(category_from_url(nation_url), api=api)))
+        counts["vehicles"] += len(vehicles)
+        wanted = get_missing_vehicles(vehicles, max_age=max_age) if max_age is not None else list(vehicles)
+        counts["skipped"] += len(vehicles) - len(wanted)
+        for name, count in store_vehicle_pages(vehicles=wanted, api=api, terrain=terrain).items():
+            counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+def __main__():
+    """Main
+    """
+    parser = argparse.ArgumentParser(description="Scrapes the WarThunder Wiki through its API")
+    parser.add_argument("vehicles", nargs="*", help="vehicles to fetch")
+    parser.add_argument("--crawl", nargs="*", choices=[terrain.name.lower() for terrain in TerrainType], metavar="TERRAIN",
+                        help="crawl every vehicle of the given terrains (all if none given) instead of the given vehicles")
+    parser.add_argument("--max-age", type=float, metavar="HOURS", help="skip vehicles whose stored page is younger than HOURS")
+    parser.add_argument("--batch-size", type=int, default=API_BATCH_SIZE, help="titles per revisions query")
+    recordings = parser.add_mutually_exclusive_group()
+    recordings.add_argument("--record", metavar="DIRECTORY", help="save every API response into DIRECTORY")
+    recordings.add_argument("--replay", metavar="DIRECTORY", help="answer the API requests from the responses saved in DIRECTORY, offline")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--metrics", metavar="FILE", help="export the request metrics, *.prom as Prometheus text, else JSON")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    configure_fetcher(cache=ResponseCache())
+
+    transport = None
+    if args.record:
+        transport = RecordingTransport(directory=args.record)
+    elif args.replay:
+        transport = RecordedTransport(directory=args.replay)
+    api = WikiApi(transport=transport, batch_size=args.batch_size)
+    if args.crawl is not None:
+        terrains = [TerrainType[terrain.upper()] for terrain in args.crawl] or list(TerrainType)
+        counts = crawl_via_api(terrains=terrains, api=api, max_age=args.max_age * 3600 if args.max_age is not None else None)
+    else:
+        counts = store_vehicle_pages(vehicles=args.vehicles, api=api)
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    get_fetcher().close()
+    if args.metrics:
+        get_metrics().export(args.metrics)
+
+if __name__ == "__main__":
+    __main__()
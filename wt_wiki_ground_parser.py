@@ -1,27 +1,39 @@
 """Parsing of Ground Vehicles using data provided by the WarThunder Wiki
 """
 
+import logging
 import os
-from bs4 import BeautifulSoup, SoupStrainer, Tag
+from bs4 import SoupStrainer, Tag
 from ammunition import Ammunition
 from armament import Armament, Stabilizer
+from dom_index import ClassIndex
+from html_backend import make_soup
+from metrics import configure_logging, get_logger, get_metrics, profile_vehicle
+from page_store import get_page_store
 from tanks import Tank, VehicleClass
-from typing import Dict, List
-from html_table_parser import HTMLTableParser
+from terrain import TerrainType
+from table_extractor import extract_table
+from text_normalization import normalize_page
+from typing import Dict, List, Optional
 
 if os.name == "nt":
     SLASH = "\\"
 else:
     SLASH = "/"
 
-def parse_ground_vehicle(response_content: str) -> Tank:
+logger = get_logger(__name__)
+
+def parse_ground_vehicle(response_content: str, index_dom: bool = True, backend: Optional[str] = None) -> Tank:
     """parses the wiki entry of a ground vehicle
 
     Parameters
     ----------
     response_content : str
         scraped but unparsed html of a ground vehicles wiki entry
-
+    index_dom : bool, optional
+        index the page by class names in a single pass, False scans the whole tree on every lookup (only for benchmarking)
+    backend : Optional[str], optional
+        HTML parser to use, defaults to the process-wide one of html_backend
 
     Returns
     -------
@@ -35,21 +47,40 @@ def parse_ground_vehicle(response_content: str) -> Tank:
     # Composite armour
     # Predator Drone ?
 
-    soup = BeautifulSoup(response_content, "html.parser", parse_only=SoupStrainer(class_="mw-parser-output"))
+    metrics = get_metrics()
+    with metrics.timer("parse", stage="index"):
+        index = index_ground_page(response_content=response_content, index_dom=index_dom, backend=backend)
 
     # General Tank Parsing (Name, VehicleClass, Premium, Squadron)
-    parsed_tank = Tank(name=soup.find(class_="general_info_name").text.strip())
-    parse_vehicle_general_info(tank=parsed_tank, soup=soup)
-    parse_vehicle_cost(tank=parsed_tank, soup=soup)
-    parse_vehicle_specs(tank=parsed_tank, soup=soup)
-    parse_vehicle_armaments(tank=parsed_tank, soup=soup)
-    parse_vehicles_fetures(tank=parsed_tank, soup=soup)
-    parse_vehicle_modification_features(tank=parsed_tank, soup=soup)
-
-    print(parsed_tank.__str__())
-    print(parsed_tank.__dict__)
-
-def parse_vehicle_general_info(tank: Tank, soup: BeautifulSoup) -> None:
+    parsed_tank = Tank(name=index.find("general_info_name").text.strip())
+    with profile_vehicle(parsed_tank.name):
+        for sub_parser in SUB_PARSERS:
+            with metrics.timer("parse", stage=sub_parser.__name__):
+                sub_parser(tank=parsed_tank, index=index)
+    metrics.increment("parsed_vehicles")
+    return parsed_tank
+
+def index_ground_page(response_content: str, index_dom: bool = True, backend: Optional[str] = None) -> ClassIndex:
+    """parses the wiki entry of a ground vehicle into the class index used by the sub-parsers
+
+    Parameters
+    ----------
+    response_content : str
+        scraped but unparsed html of a ground vehicles wiki entry, the normalization table of text_normalization is applied to it
+    index_dom : bool, optional
+        index the page by class names in a single pass, False scans the whole tree on every lookup (only for benchmarking)
+    backend : Optional[str], optional
+        HTML parser to use, defaults to the process-wide one of html_backend
+
+    Returns
+    -------
+    ClassIndex
+        the article of the page, indexed by class
+    """
+    soup = make_soup(normalize_page(response_content), parse_only=SoupStrainer(class_="mw-parser-output"), backend=backend)
+    return ClassIndex(soup, scan=not index_dom) # the page is walked once, every sub-parser looks its classes up here
+
+def parse_vehicle_general_info(tank: Tank, index: ClassIndex) -> None:
     """parses an vehilces general info
     Rank
     BattleRating
@@ -60,17 +91,19 @@ def parse_vehicle_general_info(tank: Tank, soup: BeautifulSoup) -> None:
     ----------
     tank : Tank
         the updating ground vehicle
-    soup : BeautifulSoup
-        wiki data on the specific ground vehicle
+    index : ClassIndex
+        wiki data on the specific ground vehicle, indexed by class
     """
 
-    tank.is_squadron = True if soup.find(class_="squadron") else False
-    tank.is_premium = True if soup.find(class_="premium") else False
+    squadron = index.find("squadron")
+    premium = index.find("premium")
+    tank.is_squadron = True if squadron else False
+    tank.is_premium = True if premium else False
     if tank.is_squadron:
-        soup.find(class_="squadron").extract()
+        index.extract(squadron)
     if tank.is_premium:
-        soup.find(class_="premium").extract()
-    vehicle_class = soup.find(class_="general_info_class").find("a").text.strip() # checking if the vehicle is of a certiain class and/or premium/squadron
+        index.extract(premium)
+    vehicle_class = index.find("general_info_class").find("a").text.strip() # checking if the vehicle is of a certiain class and/or premium/squadron
     if vehicle_class == "Light tank":
         tank.vehicle_class = VehicleClass.LIGHT
     elif vehicle_class == "Medium tank":
@@ -82,11 +115,12 @@ def parse_vehicle_general_info(tank: Tank, soup: BeautifulSoup) -> None:
     elif vehicle_class == "Tank destroyer":
         tank.vehicle_class = VehicleClass.TANK_DESTROYER
     else:
-        print(f"{tank.name}: {vehicle_class}")
+        logger.warning("%s: unknown vehicle class %s", tank.name, vehicle_class)
+        get_metrics().increment("parser_warnings", kind="vehicle_class", text=vehicle_class)
 
     # Battle Rating, Rank, Nation
-    tank.nation = soup.find(class_="general_info_nation").find_all("a")[-1].text.strip()
-    text_rank = soup.find(class_="general_info_rank").a.text.strip().split(" ")[0] # "V Rank"
+    tank.nation = index.find("general_info_nation").find_all("a")[-1].text.strip()
+    text_rank = index.find("general_info_rank").a.text.strip().split(" ")[0] # "V Rank"
     if text_rank == "I": # maybe I won't need to touch this for the next 5-10 years
         tank.rank = 1
     elif text_rank == "II":
@@ -107,11 +141,11 @@ def parse_vehicle_general_info(tank: Tank, soup: BeautifulSoup) -> None:
         tank.rank = 9
     elif text_rank == "X":
         tank.rank = 10
-    battle_rating  = [float(br.text.strip()) for br in soup.find(class_="general_info_br").find_all("td")[3:]]# grab all table entries, use only the last 3 as they contain the BR 
+    battle_rating  = [float(br.text.strip()) for br in index.find("general_info_br").find_all("td")[3:]]# grab all table entries, use only the last 3 as they contain the BR 
     tank.battle_rating = {"Arcade": battle_rating[0], "Realistic": battle_rating[1], "Simulator": battle_rating[2]}
 
 
-def parse_vehicle_cost(tank: Tank, soup: BeautifulSoup) -> None:
+def parse_vehicle_cost(tank: Tank, index: ClassIndex) -> None:
     """parses the vehicles costs
     (Squadron)Research/SL/GE
 
@@ -119,44 +153,48 @@ def parse_vehicle_cost(tank: Tank, soup: BeautifulSoup) -> None:
     ----------
     tank : Tank
         the updating ground vehicle
-    soup : BeautifulSoup
-        data from the wiki
+    index : ClassIndex
+        data from the wiki, indexed by class
     """
 
     # Vehicle cost
     # some vehicles like pack premiums don't have both RP/SL cost, but GE Premiums have a GE cost and 
     # Squadron vehicles have both SquadronRP and SL cost
-    if soup.find(class_="general_info_price_research"):
-        tank.research = int(soup.find(class_="general_info_price_research").find(class_="value").text.strip().replace(" ", ""))
-    if soup.find(class_="general_info_price_buy"):
-        if not soup.find(class_="general_info_price_buy").find(class_="value small"): # "value small" indicates a bundle or gift premium
-            tank.cost= int(soup.find(class_="general_info_price_buy").find(class_="value").text.strip().replace(" ", ""))
+    price_research = index.find("general_info_price_research")
+    price_buy = index.find("general_info_price_buy")
+    if price_research:
+        tank.research = int(price_research.find(class_="value").text.strip().replace(" ", ""))
+    if price_buy:
+        if not price_buy.find(class_="value small"): # "value small" indicates a bundle or gift premium
+            tank.cost= int(price_buy.find(class_="value").text.strip().replace(" ", ""))
     if tank.is_premium and tank.research == -1: # no premium vehicle has a research kost
         tank.research = 0
 
 
-def parse_vehicle_specs(tank: Tank, soup: BeautifulSoup) -> None:
+def parse_vehicle_specs(tank: Tank, index: ClassIndex) -> None:
     """parses the specs of an ground vehicle
 
     Parameters
     ----------
     tank : Tank
         the tank to be updated
-    soup : BeautifulSoup
-        BeautifulSoup obj containing all wiki data
+    index : ClassIndex
+        all wiki data, indexed by class
     """
 
     # parse Armour[Hull, turret], crew, visibility
-    specs = list(soup.find_all(class_="specs_info"))
+    specs = index.find_all("specs_info")
     vehicle_specs = [spec for spec in specs if len(spec["class"]) == 1 ] # specs_info
     for spec in vehicle_specs:
-        if spec.find(class_="name") and spec.find(class_="name").text.strip() == "Armour":
+        spec_name = spec.find(class_="name")
+        spec_name = spec_name.text.strip() if spec_name else ""
+        if spec_name == "Armour":
             elems = [x.text.strip() for x in spec.find_all(class_="value")]
             tank.armour_hull = dict(zip(["front", "side", "back"], [int(num) for num in elems[1].split(" / ")]))
             tank.armour_turret = dict(zip(["front", "side", "back"], [int(num) for num in elems[2].split(" / ")]))
             tank.crew = int(elems[3].split(" ")[0])
             tank.visibility = int(elems[4].replace("\xa0", " ").split(" ")[0])
-        elif spec.find(class_="name") and spec.find(class_="name").text.strip() == "Repair cost":
+        elif spec_name == "Repair cost":
             elems = [x.text.strip() for x in spec.find_all(class_="value")]
             if not tank.is_premium: # this is a non-premium vehicle, because you can't remove modifications from premium vehicles
                 # gaijin wtf ???
@@ -186,7 +224,7 @@ def parse_vehicle_specs(tank: Tank, soup: BeautifulSoup) -> None:
                 tank.crew_training = int(elems[4].replace(" ", ""))
                 tank.rewards_sl = dict(zip(["Arcade", "Realistic", "Simulator"], [int(x) for x in elems[9].rstrip("\xa0%").lstrip("2 ×\xa0").split(" / ")]))
                 tank.rewards_rp = dict(zip(["Arcade", "Realistic", "Simulator"], [int(x) for x in elems[10].rstrip("\xa0%").lstrip("2 ×\xa0").split(" / ")]))
-        elif spec.find(class_="name") and spec.find(class_="name").text.strip() == "Speed":
+        elif spec_name == "Speed":
             # parse weight and gears
             elems = [x.text.strip() for x in spec.find_all(class_="value")]
             tank.gears = {
@@ -196,12 +234,10 @@ def parse_vehicle_specs(tank: Tank, soup: BeautifulSoup) -> None:
             tank.weight = float(elems[5].split(" ")[0])
 
     # parse speed, engine power, power/weight
-    tables = [x for x in soup.find_all(class_="wikitable") if x.find("th")] # we only need "real" tables with [th] elems
+    tables = [x for x in index.find_all("wikitable") if x.find("th")] # we only need "real" tables with [th] elems
     for specs_table in tables:
         if specs_table.find_all("th")[1].text.strip() == "Max Speed (km/h)":
-            table = HTMLTableParser()
-            table.feed(str(specs_table))
-            specs_table = table.tables[0]
+            specs_table = extract_table(specs_table)
             aoa = 1 if "AoA" in specs_table[1] else 0 # AoA is Add-on Armour that can be added dynamically
             arcade = specs_table[2]
             realistic = specs_table[3][:3] + arcade[3:4+aoa] + specs_table[3][3:]
@@ -231,30 +267,29 @@ def parse_vehicle_specs(tank: Tank, soup: BeautifulSoup) -> None:
                 }
 
 
-def parse_vehicle_armaments(tank: Tank, soup: BeautifulSoup) -> None:
+def parse_vehicle_armaments(tank: Tank, index: ClassIndex) -> None:
     """parses the armaments of the ground vehicle
 
     Parameters
     ----------
     tank : Tank
         the updated tank
-    soup : BeautifulSoup
-        wiki data as BS
+    index : ClassIndex
+        wiki data as BS, indexed by class
     """
     # Armament Name Parsing
-    specs = list(soup.find_all(class_="specs_info"))
+    specs = index.find_all("specs_info")
     unparsed_armaments = [spec for spec in specs if len(spec["class"]) == 2] # specs_info weapons
     for armament in unparsed_armaments:
         tank.armaments.append(parse_ground_armament_name(armament))
   
     # Armament/Ammunitions Parsing
-    tables = [x for x in soup.find_all(class_="wikitable") if x.find("th")] # we only need "real" tables with [th] elems
+    tables = [x for x in index.find_all("wikitable") if x.find("th")] # we only need "real" tables with [th] elems
     ammunitions: List[Ammunition] = []
     for iterator in range(0, len(tables)):
         if len(tables[iterator]["class"]) == 2:
             if tables[iterator - 1].find("tr").find("th").find("a"):
                 armament_name = tables[iterator - 1].find("tr").find("th").find("a").text.strip()
-            #print(bytes(armament_name, encoding="utf-8"))
             if tables[iterator].find("tr").find("th").text.strip() == "Penetration statistics":
                 ammunitions = parse_ground_ammunitions_pen(ammo_pen_specs=tables[iterator])
             elif tables[iterator].find("tr").find("th").text.strip() == "Shell details" and len(ammunitions):
@@ -269,24 +304,24 @@ def parse_vehicle_armaments(tank: Tank, soup: BeautifulSoup) -> None:
             if tables[iterator].find("th").find("a") and "mm" in tables[iterator].find("th").text: # searching for the link of an armament and "mm" in the text
                 armament_name = tables[iterator].find("th").text.strip()
                 for armament in tank.armaments:
-                    print(f"Armament:{bytes(armament.name, encoding='utf-8')}:{bytes(armament_name, encoding='utf-8')}")
+                    logger.debug("%s: matching armament %a against %a", tank.name, armament.name, armament_name)
                     if armament_name in armament.name:
                         parse_ground_armament(armament, tables[iterator])
 
 
-def parse_vehicles_fetures(tank: Tank, soup: BeautifulSoup) -> None:
+def parse_vehicles_fetures(tank: Tank, index: ClassIndex) -> None:
     """parses an vehicles features
 
     Parameters
     ----------
     tank : Tank
         the tank to be updated
-    soup : BeautifulSoup
-        the data as BS
+    index : ClassIndex
+        the data as BS, indexed by class
     """
 
     # Non-Modification Feature Parsing
-    for feature in [elem.text.strip() for elem in soup.find_all(class_="feature_name")]:
+    for feature in [elem.text.strip() for elem in index.find_all("feature_name")]:
         if feature == "Amphibious":
             tank.is_amphibious = True
         elif feature == "ERA":
@@ -300,22 +335,23 @@ def parse_vehicles_fetures(tank: Tank, soup: BeautifulSoup) -> None:
         elif feature in ["Smoke grenades", "ESS", "Laser rangefinder", "Night vision device", "Rangefinder", "Self-entrenching equipment", "LWS"]: # we got those parsed already, so no need for warnings
             pass
         else:
-            print(f"Feature WARN: {feature}") # add logging here
+            logger.warning("%s: unknown feature %s", tank.name, feature)
+            get_metrics().increment("parser_warnings", kind="feature", text=feature)
 
-def parse_vehicle_modification_features(tank: Tank, soup: BeautifulSoup) -> None:
+def parse_vehicle_modification_features(tank: Tank, index: ClassIndex) -> None:
     """parses a tanks modification and by extend thier features
 
     Parameters
     ----------
     tank : Tank
         the tank to be updated
-    soup : BeautifulSoup
-        the wiki data as BS
+    index : ClassIndex
+        the wiki data as BS, indexed by class
     """
 
     # Vehicle Modification Parsing
     # ----- Get Modifications -> get specs (smokes, ess, nvd, tvd, lws, lr, rangefinder, etc...) | <div class="specs_mod">
-    for mod in soup.find_all(class_="specs_mod_name"):
+    for mod in index.find_all("specs_mod_name"):
         if mod.text.strip() == "Smoke grenade":
             tank.smokes = True
         elif mod.text.strip() == "ESS":
@@ -372,7 +408,7 @@ def parse_ground_ammunitions_stats(ammo_specs: Tag, ammunitions: List[Ammunition
             if not round_data[4+atgm_offset].text.strip() == "N/A":
                 ammo.fuse_delay = float(round_data[4+atgm_offset].text.strip())
             if not round_data[5+atgm_offset].text.strip() == "N/A":
-                ammo.fuse_sensetivity = float(round_data[5+atgm_offset].text.strip())
+                ammo.fuse_sensitivity = float(round_data[5+atgm_offset].text.strip())
             if not round_data[6+atgm_offset].text.strip() == "N/A":
                 ammo.explosive_mass = int(round_data[6+atgm_offset].text.strip().replace(",", "").replace(".", ""))
 
@@ -449,9 +485,7 @@ def parse_ground_armament(armament: Armament, specs_table: Tag):
     specs_table : Tag
         the spces of the armament as an unparsed/unprocessed html table
     """
-    table = HTMLTableParser()
-    table.feed(str(specs_table))
-    specs = table.tables[0]
+    specs = extract_table(specs_table)
     arcade = specs[2]
     fr_offset = 0 # there's a offset for auto-cannons as they have a fire rate
     for iterator in range(0, len(specs[1])):
@@ -500,7 +534,8 @@ def parse_ground_armament(armament: Armament, specs_table: Tag):
             "aces": float(arcade[7+fr_offset])
             }
 
-    print(armament.__dict__)
+    if logger.isEnabledFor(logging.DEBUG): # as_dict is too expensive to build for nothing
+        logger.debug("parsed armament %s", armament.as_dict())
 
 def get_stabilizer_type(stablizer_string: str) -> Stabilizer:
     """parses the stabilizer type for an armament
@@ -524,7 +559,8 @@ def get_stabilizer_type(stablizer_string: str) -> Stabilizer:
     elif stablizer_string == "N/A":
         return Stabilizer.NONE
     else:
-        print(f"Armament Feature WARN: {stablizer_string}") # add logging here
+        logger.warning("unknown stabilizer %s", stablizer_string)
+        get_metrics().increment("parser_warnings", kind="stabilizer", text=stablizer_string)
         return Stabilizer.NONE
 
         
@@ -550,17 +586,27 @@ def parse_vertical_guidance(guidance_value: str) -> Dict[str, int]:
         return {"positive": guidances[1], "negative": guidances[0]}
 
     
+# in parsing order, the costs and specs depend on the premium flag of the general info
+SUB_PARSERS = (
+    parse_vehicle_general_info,
+    parse_vehicle_cost,
+    parse_vehicle_specs,
+    parse_vehicle_armaments,
+    parse_vehicles_fetures,
+    parse_vehicle_modification_features
+)
+
+
 def __main__():
     """Main-ly used for standalone testing during developemnt
     """
-    content: str
-    for line in open("naming.lst", mode="r", encoding="utf-8"):
-        name, directory, filename = line.rstrip("\n").split(" -> ")
-        test_tank_file_name = f"{directory}{SLASH}{filename}"
-        with open(test_tank_file_name, "r", encoding="utf-8") as data:
-            content = data.read()
+    configure_logging()
+    store = get_page_store()
+    for name in store.vehicles(terrain=TerrainType.GROUND):
         print(f"\n\nParsing: {name}")
-        parse_ground_vehicle(response_content=content)
+        parsed_tank = parse_ground_vehicle(response_content=store.get(name))
+        print(parsed_tank.__str__())
+        print(parsed_tank.as_dict())
 
 if __name__ == "__main__":
     __main__()
\ No newline at end of file